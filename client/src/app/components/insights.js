@@ -1,7 +1,6 @@
 "use client";
 
 import React, { useState } from 'react';
-import axios from 'axios';
 import ReactMarkdown from 'react-markdown';
 
 function Insights({ token }) {
@@ -10,14 +9,43 @@ function Insights({ token }) {
 
   const fetchInsights = async () => {
     setLoading(true);
+    setInsights(null);
     try {
-      const response = await axios.get(`${process.env.NEXT_PUBLIC_API_URL}:${process.env.NEXT_PUBLIC_PORT}/insights`, {
+      const response = await fetch(`${process.env.NEXT_PUBLIC_API_URL}:${process.env.NEXT_PUBLIC_PORT}/insights/stream`, {
         headers: {
           Authorization: `Bearer ${token}`
         }
       });
-      setInsights(response.data.insights);
-      console.log(response.data);
+      if (!response.ok) {
+        throw new Error(`HTTP error! status: ${response.status}`);
+      }
+
+      // Relay the tokens as they arrive instead of waiting for the full text
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      let text = '';
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const events = buffer.split('\n\n');
+        buffer = events.pop();
+        for (const event of events) {
+          const name = event.match(/^event: (.*)$/m)?.[1];
+          const data = event.match(/^data: (.*)$/m)?.[1];
+          if (!data) continue;
+          const payload = JSON.parse(data);
+          if (name === 'token') {
+            text += payload.token;
+            setInsights(text);
+          } else if (name === 'done') {
+            setInsights(payload.insights);
+          } else if (name === 'error') {
+            throw new Error(payload.detail);
+          }
+        }
+      }
     } catch (error) {
       console.error('Error fetching insights:', error);
       setInsights('Error fetching insights');
@@ -18,7 +18,6 @@ ChartJS.register(ArcElement, Tooltip, Legend);
 export default function FinancePage() {
   const [isOCRModalOpen, setIsOCRModalOpen] = useState(false);
   const [income, setIncome] = useState(1000);
-  const [expenses, setExpenses] = useState([]);
   const [token, setToken] = useState(null);
   const router = useRouter();
 
@@ -47,35 +46,17 @@ export default function FinancePage() {
   }, [router]);
 
   useEffect(() => {
-    if (token) fetchExpenses();
+    if (token) fetchSummary();
   }, [token]);
 
-  useEffect(() => {
-    updatePieChart();
-  }, [expenses]);
-
-  const updatePieChart = () => {
-    const totalNecessitySpent = expenses
-      .filter(expense => expense['expense-type'] === 'needs')
-      .reduce((acc, expense) => acc + parseFloat(expense.expenseTotal), 0);
-    const totalWantSpent = expenses
-      .filter(expense => expense['expense-type'] === 'wants')
-      .reduce((acc, expense) => acc + parseFloat(expense.expenseTotal), 0);
-    const totalSavingSpent = expenses
-      .filter(expense => expense['expense-type'] === 'savings')
-      .reduce((acc, expense) => acc + parseFloat(expense.expenseTotal), 0);
-
-    const totalSpent = totalNecessitySpent + totalWantSpent + totalSavingSpent;
-
-    const necessityPercentage = totalSpent ? (totalNecessitySpent / totalSpent) * 100 : 0;
-    const wantPercentage = totalSpent ? (totalWantSpent / totalSpent) * 100 : 0;
-    const savingPercentage = totalSpent ? (totalSavingSpent / totalSpent) * 100 : 0;
+  const updatePieChart = (summary) => {
+    const { needs, wants, savings } = summary.categories;
 
     setPieData({
       labels: ['Necessity', 'Want', 'Saving'],
       datasets: [
         {
-          data: [necessityPercentage, wantPercentage, savingPercentage],
+          data: [needs.percentage, wants.percentage, savings.percentage],
           backgroundColor: ['#FF6384', '#36A2EB', '#FFCE56'],
           borderColor: ['#FF6384', '#36A2EB', '#FFCE56'],
           borderWidth: 2,
@@ -84,20 +65,20 @@ export default function FinancePage() {
     });
   };
 
-  const fetchExpenses = async () => {
+  const fetchSummary = async () => {
     try {
       const response = await axios.get(
-        `${process.env.NEXT_PUBLIC_API_URL}:${process.env.NEXT_PUBLIC_PORT}/expenses`,
+        `${process.env.NEXT_PUBLIC_API_URL}:${process.env.NEXT_PUBLIC_PORT}/expenses/summary`,
         {
           headers: {
             Authorization: `Bearer ${token}`
           }
         }
       );
-      setExpenses(response.data);
-      console.log('Fetched expenses:', response.data);
+      updatePieChart(response.data);
+      console.log('Fetched summary:', response.data);
     } catch (error) {
-      console.error('Error fetching expenses:', error);
+      console.error('Error fetching summary:', error);
     }
   };
 
@@ -112,7 +93,7 @@ export default function FinancePage() {
           }
         }
       );
-      setExpenses(prevExpenses => [...prevExpenses, response.data]);
+      fetchSummary();
       console.log('Added new expense:', response.data);
     } catch (error) {
       console.error('Error adding expense:', error);
@@ -122,7 +103,7 @@ export default function FinancePage() {
   const openOCR = () => setIsOCRModalOpen(true);
   const closeOCR = () => {
     setIsOCRModalOpen(false);
-    fetchExpenses();
+    fetchSummary();
   };
 
   const openAddIncomeModal = () => setIsAddIncomeModalOpen(true);
@@ -64,30 +64,9 @@ export default function MovingPigsFarmGame() {
   const [isOCRModalOpen, setIsOCRModalOpen] = useState(false);
 
   useEffect(() => {
-      const validateToken = async () => {
-      if (token) {
-        try {
-          const response = await axios.get(
-            `${process.env.NEXT_PUBLIC_API_URL}:${process.env.NEXT_PUBLIC_PORT}/user`,
-            { 
-              headers: { 
-                Authorization: `Bearer ${token}` 
-              } 
-            }
-          );
-        } catch (error) {
-          console.error("Token validation failed:", error);
-          if (error.response && error.response.status === 401) {
-              handleLogout();
-              router.push("/");
-          }
-        }
-      }
-    };
     const storedToken = localStorage.getItem('token');
     if (storedToken) {
       setToken(storedToken);
-      validateToken();
       fetchUserData(storedToken);
     }
     else {
@@ -97,20 +76,19 @@ export default function MovingPigsFarmGame() {
 
   const fetchUserData = async (token) => {
     try {
-      const [levelResponse, coinsResponse] = await Promise.all([
-        axios.get(`${process.env.NEXT_PUBLIC_API_URL}:${process.env.NEXT_PUBLIC_PORT}/level`, {
-          headers: { Authorization: `Bearer ${token}` }
-        }),
-        axios.get(`${process.env.NEXT_PUBLIC_API_URL}:${process.env.NEXT_PUBLIC_PORT}/coins`, {
-          headers: { Authorization: `Bearer ${token}` }
-        })
-      ]);
-      console.log('Level response:', levelResponse.data);
-      console.log('Coins response:', coinsResponse.data);
-      setFarmLevel(levelResponse.data);
-      setCoins(coinsResponse.data);
+      // One snapshot instead of separate /user, /level and /coins calls
+      const response = await axios.get(`${process.env.NEXT_PUBLIC_API_URL}:${process.env.NEXT_PUBLIC_PORT}/me/state`, {
+        headers: { Authorization: `Bearer ${token}` }
+      });
+      console.log('State response:', response.data);
+      setFarmLevel(response.data.level);
+      setCoins(response.data.coins);
     } catch (error) {
       console.error("Error fetching user data:", error);
+      if (error.response && error.response.status === 401) {
+          localStorage.removeItem('token');
+          router.push("/");
+      }
     }
   };
 
@@ -204,25 +182,17 @@ export default function MovingPigsFarmGame() {
 
     if (coins >= cost && farmLevel < PIG_VARIANTS.length) {
       try {
-        console.log('Sending use_coins request. Coins to use:', cost);
-        const useCoinsResponse = await axios.post(
-          `${process.env.NEXT_PUBLIC_API_URL}:${process.env.NEXT_PUBLIC_PORT}/use_coins?coins=${cost}`,
+        console.log('Sending farm upgrade request');
+        const upgradeResponse = await axios.post(
+          `${process.env.NEXT_PUBLIC_API_URL}:${process.env.NEXT_PUBLIC_PORT}/farm/upgrade`,
           {},  // Empty body
           { headers: { Authorization: `Bearer ${token}` } }
         );
-        console.log('use_coins response:', useCoinsResponse.data);
-        
-        // Update local coin state with the new value from the server
-        setCoins(useCoinsResponse.data.remaining_coins);
-        
-        console.log('Sending level_up request');
-        const levelUpResponse = await axios.get(
-          `${process.env.NEXT_PUBLIC_API_URL}:${process.env.NEXT_PUBLIC_PORT}/level_up`,
-          { headers: { Authorization: `Bearer ${token}` } }
-        );
-        console.log('level_up response:', levelUpResponse.data);
+        console.log('farm upgrade response:', upgradeResponse.data);
 
-        setFarmLevel(prev => prev + 1);
+        // Update local state with the new values from the server
+        setCoins(upgradeResponse.data.coins);
+        setFarmLevel(upgradeResponse.data.level);
         
         if (isExpanding && currentScene < TOTAL_SCENES - 1) {
           setCurrentScene(prev => prev + 1);
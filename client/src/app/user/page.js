@@ -44,7 +44,7 @@ export default function UserPage() {
 
   const fetchUserData = async (token) => {
     try {
-      const response = await fetch(`${process.env.NEXT_PUBLIC_API_URL}:${process.env.NEXT_PUBLIC_PORT}/user`, {
+      const response = await fetch(`${process.env.NEXT_PUBLIC_API_URL}:${process.env.NEXT_PUBLIC_PORT}/me/state`, {
         method: 'GET',
         headers: {
           'Authorization': `Bearer ${token}`,
@@ -85,6 +85,10 @@ export default function UserPage() {
         }),
       });
       if (response.ok) {
+        // Older tokens stop working after a password change; keep the fresh one
+        const data = await response.json();
+        localStorage.setItem('token', data.access_token);
+        setToken(data.access_token);
         alert('Password updated successfully');
         setPassword('');
         setNewPassword('');
@@ -1,8 +1,86 @@
-from ..utils.model import process_receipt_data
+from ..utils.model import process_receipt_data, ReceiptBatcher
+from ..utils.ocr_pool import run_ocr, OCR_WORKERS
+from ..utils.receipt_cache import receipt_cache, receipt_cache_counters, image_key, text_key
+from ..utils.jobs import job_queue, public_job, PermanentJobError, TERMINAL_STATUSES, OCR_JOB_POLL_SECONDS
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import nullcontext
+from datetime import datetime
 from fastapi import HTTPException
-import pytesseract
-from PIL import Image
-import io
+from fastapi.responses import StreamingResponse
+import asyncio
+import json
+import os
+
+# CONSTANT: The name process_receipt falls back to when the LLM output can't be parsed
+UNPARSED_EXPENSE_NAME = "Unknown Expense"
+
+# CONSTANT: The largest number of images accepted by POST /ocr/batch
+OCR_BATCH_MAX_FILES = int(os.getenv("OCR_BATCH_MAX_FILES", "25"))
+
+"""Decide whether parsed receipt data may be cached
+
+Unparsed receipts are left out so a retry can do better. So are receipts
+dated today: that is also the date the parsers fall back to when the
+receipt has none, and a cached fallback would keep returning a stale date
+when the same receipt is uploaded on a later day.
+
+Args:
+    receipt_data (dict): The receipt data
+
+Returns:
+    bool: True when the result can be reused for identical images or text
+"""
+def is_cacheable(receipt_data: dict):
+    return (
+        receipt_data.get("expense-name") != UNPARSED_EXPENSE_NAME
+        and receipt_data.get("date") != datetime.now().strftime("%Y-%m-%d")
+    )
+
+"""Parse OCR text into receipt data, reusing the result for identical text
+
+Args:
+    text (str): The OCR text
+    parser (callable): Turns OCR text into receipt data
+
+Returns:
+    dict: The receipt data
+"""
+async def parse_receipt_text(text: str, parser=process_receipt_data):
+    key = text_key(text)
+    cached = await receipt_cache.get(key)
+    if cached is not None:
+        receipt_cache_counters["text_hits"] += 1
+        return cached
+
+    receipt_data = await parser(text)
+    if is_cacheable(receipt_data):
+        await receipt_cache.set(key, receipt_data)
+    return receipt_data
+
+"""Turn image bytes into receipt data, reusing the result for identical images
+
+Args:
+    image_bytes (bytes): The uploaded image
+    parser (callable): Turns OCR text into receipt data
+    slots (asyncio.Semaphore, optional): Held while the image is in OCR, released before parsing
+
+Returns:
+    dict: The receipt data
+"""
+async def process_image(image_bytes: bytes, parser=process_receipt_data, slots: asyncio.Semaphore = None):
+    key = image_key(image_bytes)
+    cached = await receipt_cache.get(key)
+    if cached is not None:
+        receipt_cache_counters["image_hits"] += 1
+        return cached
+
+    receipt_cache_counters["misses"] += 1
+    async with slots or nullcontext():
+        extracted_text = await run_ocr(image_bytes)
+    receipt_data = await parse_receipt_text(extracted_text, parser)
+    if is_cacheable(receipt_data):
+        await receipt_cache.set(key, receipt_data)
+    return receipt_data
 
 """Process the image
 
@@ -14,9 +92,176 @@ Returns:
 """
 async def process_ocr(file):
     try:
-        image = Image.open(io.BytesIO(await file.read()))
-        extracted_text = pytesseract.image_to_string(image)
-        receipt_data = await process_receipt_data(extracted_text)
-        return receipt_data
+        return await process_image(await file.read())
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing image: {str(e)}")
+
+"""Process one image of a batch into an NDJSON result
+
+Args:
+    index (int): The position of the image in the upload
+    filename (str): The name of the uploaded file
+    image_bytes (bytes): The uploaded image
+    batcher (ReceiptBatcher): Coalesces the receipts that need the LLM
+    slots (asyncio.Semaphore): Limits how many images of the batch are in OCR at once
+
+Returns:
+    dict: The result line for this image
+"""
+async def process_batch_item(index: int, filename: str, image_bytes: bytes, batcher: ReceiptBatcher, slots: asyncio.Semaphore):
+    try:
+        # Only OCR holds a slot, so images waiting on the LLM batch don't block
+        # the others from reaching Tesseract, and a batch can fill past OCR_WORKERS
+        receipt_data = await process_image(image_bytes, batcher.parse, slots)
+        return {"index": index, "filename": filename, "status": 200, "receipt": receipt_data}
+    except HTTPException as e:
+        return {"index": index, "filename": filename, "status": e.status_code, "error": e.detail}
+    except Exception as e:
+        return {"index": index, "filename": filename, "status": 500, "error": f"Error processing image: {str(e)}"}
+
+"""Stream the results of a batch as each image finishes
+
+Args:
+    uploads (list): (filename, image bytes) pairs
+
+Yields:
+    str: One JSON line per image, in completion order
+"""
+async def stream_batch(uploads: list):
+    batcher = ReceiptBatcher()
+    slots = asyncio.Semaphore(OCR_WORKERS)
+    tasks = [
+        asyncio.create_task(process_batch_item(index, filename, image_bytes, batcher, slots))
+        for index, (filename, image_bytes) in enumerate(uploads)
+    ]
+    try:
+        for task in asyncio.as_completed(tasks):
+            yield json.dumps(await task) + "\n"
+    finally:
+        for task in tasks:
+            task.cancel()
+
+"""Process a batch of receipt images
+
+OCR fans out across the worker pool, receipts that need the LLM are sent
+in batched prompts, and each result is streamed back as NDJSON as soon as
+it is ready.
+
+Args:
+    files (list): The uploaded images
+
+Returns:
+    StreamingResponse: One JSON line per image
+"""
+async def process_ocr_batch(files):
+    if len(files) > OCR_BATCH_MAX_FILES:
+        raise HTTPException(status_code=413, detail=f"At most {OCR_BATCH_MAX_FILES} images per batch")
+
+    # Read every upload now: the files are closed once the handler returns
+    uploads = [(file.filename, await file.read()) for file in files]
+    return StreamingResponse(stream_batch(uploads), media_type="application/x-ndjson")
+
+"""Queue an image for background processing
+
+Args:
+    file (UploadFile): The image to process
+
+Returns:
+    dict: The queued job, including the job_id to poll
+"""
+async def create_ocr_job(file):
+    job = await job_queue.enqueue(await file.read())
+    return public_job(job)
+
+"""Process a queued OCR job
+
+The OCR text is saved on the job before calling the LLM, so a retry after
+an LLM failure doesn't run Tesseract again.
+
+Args:
+    job (dict): The claimed job
+
+Returns:
+    dict: The receipt data
+"""
+async def run_ocr_job(job: dict):
+    text = job.get("text")
+    if text is None:
+        key = image_key(job["image"])
+        cached = await receipt_cache.get(key)
+        if cached is not None:
+            receipt_cache_counters["image_hits"] += 1
+            return cached
+
+        receipt_cache_counters["misses"] += 1
+        try:
+            text = await run_ocr(job["image"])
+        except (HTTPException, BrokenProcessPool):
+            # The pool is saturated or restarting: try again later
+            raise
+        except Exception as e:
+            raise PermanentJobError(f"Error processing image: {str(e)}")
+        await job_queue.save_text(job["_id"], text)
+    else:
+        key = None
+
+    receipt_data = await parse_receipt_text(text)
+    if key is not None and is_cacheable(receipt_data):
+        await receipt_cache.set(key, receipt_data)
+    return receipt_data
+
+"""Get the status of an OCR job
+
+Args:
+    job_id (str): The id returned when the job was created
+
+Returns:
+    dict: The job status, and its result once done
+"""
+async def get_ocr_job(job_id: str):
+    job = await job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return public_job(job)
+
+"""Stream the status of an OCR job as server-sent events
+
+Args:
+    job_id (str): The id returned when the job was created
+
+Yields:
+    str: A "status" event on every change, ending once the job is done or dead
+"""
+async def stream_job_events(job_id: str):
+    last = None
+    while True:
+        job = await job_queue.get(job_id)
+        if job is None:
+            yield "event: error\ndata: " + json.dumps({"detail": "Job not found"}) + "\n\n"
+            return
+        view = public_job(job)
+        if view != last:
+            yield "event: status\ndata: " + json.dumps(view) + "\n\n"
+            last = view
+        if job["status"] in TERMINAL_STATUSES:
+            return
+        await job_queue.wait(job_id, OCR_JOB_POLL_SECONDS)
+
+"""Subscribe to an OCR job's status
+
+Args:
+    job_id (str): The id returned when the job was created
+
+Returns:
+    StreamingResponse: The server-sent event stream
+"""
+async def ocr_job_events(job_id: str):
+    if await job_queue.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return StreamingResponse(
+        stream_job_events(job_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
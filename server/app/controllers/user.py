@@ -1,23 +1,63 @@
 from fastapi import HTTPException, Depends, status, Query
+from fastapi.responses import JSONResponse, StreamingResponse, Response
 from app.models.user import UserCreate, User, Token, Expense, ExpenseCreate, ChangePasswordRequest
 from app.models.auth import EmailPasswordRequestForm
 from app.utils.auth import create_access_token, get_current_user
+from app.utils.users import find_user, invalidate_user
+from app.utils.passwords import hash_password, verify_password, needs_rehash
 from app.db import db
-from datetime import timedelta, datetime
-import bcrypt
+from datetime import timedelta, datetime, date
 from dotenv import load_dotenv
 import os
 from bson import ObjectId
-from app.utils.model import get_insights_data
-from datetime import datetime, timedelta
-
-one_month_ago = datetime.now() - timedelta(days=30)
+import base64
+import hashlib
+import json
+from app.utils.model import get_insights_data, stream_insights, EXPENSE_TYPES, INSIGHTS_TOP_EXPENSES
+from app.utils.classifier import suggest_expense_type
+from app.utils.insights_cache import insights_fingerprint, get_cached_insights, store_insights, invalidate_insights
+from app.utils.rollups import apply_rollups, get_rollups, rebuild_rollups
+from app.utils.expense_io import EXPENSE_IO_FORMATS, EXPENSE_IO_MEDIA_TYPES, parse_rows, validate_row, format_rows
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
 
 load_dotenv()
 
 # CONSANT: Signifies the time in minutes after which the access token expires
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES"))
 
+# CONSTANT: Fields returned to clients for an expense (the owner and type source stay server-side)
+EXPENSE_PROJECTION = {"user": 0, "expense-type-source": 0}
+
+# CONSTANT: Rows written per bulk_write by POST /expenses/bulk, and the most rows one import may hold
+EXPENSE_IMPORT_CHUNK = int(os.getenv("EXPENSE_IMPORT_CHUNK", "500"))
+EXPENSE_IMPORT_MAX_ROWS = int(os.getenv("EXPENSE_IMPORT_MAX_ROWS", "100000"))
+
+# CONSTANT: Per-row errors reported by an import; the rest are only counted
+EXPENSE_IMPORT_MAX_ERRORS = 100
+
+# CONSTANT: Expenses fetched per cursor batch by GET /expenses/export
+EXPENSE_EXPORT_BATCH = 500
+
+# CONSTANT: User fields returned by GET /me/state
+STATE_PROJECTION = {"_id": 0, "first_name": 1, "last_name": 1, "email": 1, "level": 1, "coins": 1, "budget": 1}
+
+# CONSTANT: Farm progression, matching PIG_VARIANTS and PIGS_PER_SCENE in client/src/app/game/page.js
+FARM_MAX_LEVEL = 15
+FARM_PIGS_PER_SCENE = 5
+FARM_UPGRADE_COST = 3
+FARM_EXPAND_COST = 5
+
+# CONSTANT: Fields a client may request with the fields= projection
+EXPENSE_FIELDS = ["_id", "expense-type", "expenseDate", "expenseTotal", "expense-name"]
+
+# CONSTANT: How many days of spending the insights are based on
+INSIGHTS_WINDOW_DAYS = 30
+
+# CONSTANT: Default and maximum page sizes for GET /expenses
+EXPENSE_PAGE_DEFAULT = int(os.getenv("EXPENSE_PAGE_DEFAULT", "100"))
+EXPENSE_PAGE_MAX = int(os.getenv("EXPENSE_PAGE_MAX", "500"))
+
 """Register a new user
 
 Args:
@@ -36,29 +76,22 @@ async def register(user: UserCreate):
             detail="Email already registered"
             )
     
-    hashed_password = bcrypt.hashpw(
-        user.password.encode(os.getenv("ENCODING_TYPE")),
-        bcrypt.gensalt()
-        )
+    hashed_password = await hash_password(user.password)
 
     new_user = {
         "first_name": user.first_name,
         "last_name": user.last_name,
         "email": user.email, 
         "hashed_password": hashed_password,
-        "expenses": [],
         "coins": 0,
         "level": 1,
         "budget": 0
     }
     result = await db.users.insert_one(new_user)
 
-    user = await db.users.find_one({
-        "email": user.email
-        })
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user["email"]}, expires_delta=access_token_expires
+        data={"sub": new_user["email"], "ep": 0}, expires_delta=access_token_expires
     )
     
     return {
@@ -76,17 +109,24 @@ Returns:
     dict: The login user
 """
 async def login(form_data: EmailPasswordRequestForm):
-    user = await db.users.find_one({"email": form_data.email})
-    if not user or not bcrypt.checkpw(form_data.password.encode('utf-8'), user["hashed_password"]):
+    user = await db.users.find_one({"email": form_data.email}, {"email": 1, "hashed_password": 1, "token_epoch": 1})
+    if not user or not await verify_password(form_data.password, user["hashed_password"]):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
     
+    if needs_rehash(user["hashed_password"]):
+        # Upgrade hashes made with an older work factor while we have the password
+        await db.users.update_one(
+            {"email": user["email"], "hashed_password": user["hashed_password"]},
+            {"$set": {"hashed_password": await hash_password(form_data.password)}}
+        )
+    
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user["email"]}, expires_delta=access_token_expires
+        data={"sub": user["email"], "ep": user.get("token_epoch", 0)}, expires_delta=access_token_expires
     )
     return {
         "access_token": access_token,
@@ -104,6 +144,89 @@ Returns:
 async def get_user(current_user: User = Depends(get_current_user)):
     return current_user
 
+"""Build the aggregation that reads a user's dashboard state
+
+The profile and the current month's rollups come back from one
+aggregation on users, so the snapshot costs a single round trip.
+
+Args:
+    email (str): The user to read
+    month (str): The month to total, in YYYY-MM format
+
+Returns:
+    list: The aggregation pipeline
+"""
+def build_state_pipeline(email: str, month: str):
+    return [
+        {"$match": {"email": email}},
+        {"$project": STATE_PROJECTION},
+        {"$lookup": {
+            "from": "expense_rollups",
+            "let": {"email": "$email"},
+            "pipeline": [
+                {"$match": {"$expr": {"$and": [
+                    {"$eq": ["$user", "$$email"]},
+                    {"$eq": ["$month", month]}
+                ]}}},
+                {"$project": {"_id": 0, "expense-type": 1, "total": 1, "count": 1}}
+            ],
+            "as": "rollups"
+        }}
+    ]
+
+"""Format the state snapshot returned by build_state_pipeline
+
+Args:
+    user (dict): The aggregated user document
+    month (str): The month that was totaled
+
+Returns:
+    dict: The profile, level, coins, budget and month totals
+"""
+def format_state(user: dict, month: str):
+    categories = {expense_type: 0.0 for expense_type in EXPENSE_TYPES}
+    total = 0.0
+    count = 0
+    for rollup in user.get("rollups", []):
+        categories[rollup["expense-type"]] = round(categories.get(rollup["expense-type"], 0.0) + rollup["total"], 2)
+        total += rollup["total"]
+        count += rollup["count"]
+    return {
+        "first_name": user.get("first_name"),
+        "last_name": user.get("last_name"),
+        "email": user["email"],
+        "level": user.get("level", 1),
+        "coins": user.get("coins", 0),
+        "budget": user.get("budget", 0),
+        "month": {"month": month, "total": round(total, 2), "count": count, "categories": categories}
+    }
+
+"""Get a snapshot of the current user's dashboard state
+
+The response carries an ETag of the snapshot, so a poll with a matching
+If-None-Match is answered with an empty 304.
+
+Args:
+    current_user (User): The current user
+    if_none_match (str, optional): The ETag the client already has
+
+Returns:
+    Response: The state as JSON, or 304 when it is unchanged
+"""
+async def get_state(current_user: User, if_none_match: str = None):
+    month = date.today().strftime("%Y-%m")
+    users = await db.users.aggregate(build_state_pipeline(current_user.email, month)).to_list(length=1)
+    if not users:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    state = format_state(users[0], month)
+    body = json.dumps(state, separators=(",", ":"), default=str)
+    etag = '"' + hashlib.sha256(body.encode()).hexdigest()[:32] + '"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if if_none_match and etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
 
 """Delete the current user
 
@@ -112,13 +235,17 @@ async def delete_user(current_user: User = Depends(get_current_user)):
     return await user_controller.delete_user(current_user)
 """
 async def delete_user(current_user: User = Depends(get_current_user)):
-    user = await db.users.find_one({"email": current_user.email})
+    user = await find_user(current_user.email)
     if not user:
         raise HTTPException(
             status_code=400, 
             detail="Email wasn't registered"
             )
     await db.users.delete_one({"email": current_user.email})
+    invalidate_user(current_user.email)
+    await db.expenses.delete_many({"user": current_user.email})
+    await db.expense_rollups.delete_many({"user": current_user.email})
+    await db.insights.delete_one({"_id": current_user.email})
     return {
         "message": "User deleted successfully"
         }
@@ -130,7 +257,7 @@ async def update_user(current_user: User = Depends(get_current_user)):
 """
 
 async def update_user (updated_user: UserCreate, current_user: User = Depends(get_current_user)):
-    user = await db.users.find_one({"email": current_user.email})
+    user = await find_user(current_user.email)
     if not user:
         raise HTTPException(
             status_code=404, 
@@ -139,25 +266,53 @@ async def update_user (updated_user: UserCreate, current_user: User = Depends(ge
     
     update_data = updated_user.dict(exclude_unset=True)
     
+    update = {"$set": update_data}
     if "password" in update_data:
-        hashed_password = bcrypt.hashpw(
-            update_data["password"].encode(os.getenv("ENCODING_TYPE", "utf-8")),
-            bcrypt.gensalt()
-        )
-        update_data["password"] = hashed_password
+        update_data["hashed_password"] = await hash_password(update_data.pop("password"))
+        # Like change_password, a new password invalidates every earlier token
+        update["$inc"] = {"token_epoch": 1}
     
     result = await db.users.update_one(
         {"email": current_user.email},
-        {"$set": update_data}
+        update
     )
+    invalidate_user(current_user.email)
     
     if result.modified_count == 0:
         raise HTTPException(status_code=400, detail="User update failed")
     
+    if update_data.get("email", current_user.email) != current_user.email:
+        await db.expenses.update_many(
+            {"user": current_user.email},
+            {"$set": {"user": update_data["email"]}}
+        )
+        await db.expense_rollups.delete_many({"user": current_user.email})
+        await rebuild_rollups(update_data["email"])
+        await db.insights.delete_one({"_id": current_user.email})
+    
     return {
         "message": "User updated successfully"
     }
 
+"""Classify an expense that was submitted without an expense type
+
+The expense-type-source field records whether the type was picked by the
+user or inferred here, so the classifier is only retrained on user labels.
+
+Args:
+    expense_dict (dict): The expense, keyed by alias
+
+Returns:
+    dict: The same expense with its expense-type and expense-type-source set
+"""
+def fill_expense_type(expense_dict: dict):
+    if expense_dict.get('expense-type') in EXPENSE_TYPES:
+        expense_dict['expense-type-source'] = "user"
+    else:
+        expense_dict['expense-type'] = suggest_expense_type(expense_dict.get('expense-name', ''), default="needs")
+        expense_dict['expense-type-source'] = "auto"
+    return expense_dict
+
 """Create an expense for the current user
 
 Args:
@@ -168,41 +323,436 @@ Returns:
     dict: The created expense
 """
 async def create_expense(current_user: User, expense: ExpenseCreate):
-    user = await db.users.find_one({"email": current_user.email})
+    user = await find_user(current_user.email)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    expense_dict = expense.dict(by_alias=True)
+    expense_dict = fill_expense_type(expense.dict(by_alias=True))
     expense_dict['_id'] = str(ObjectId())
+    expense_dict['user'] = current_user.email
     
     # Ensure the expenseDate is stored as a string in ISO format
     expense_dict['expenseDate'] = expense_dict['expenseDate']
     
-    result = await db.users.update_one(
-        {"email": current_user.email},
-        {"$push": {"expenses": expense_dict}},
-    )
+    result = await db.expenses.insert_one(expense_dict)
     
-    if result.modified_count == 1:
+    if result.inserted_id:
+        await apply_rollups(current_user.email, added=[expense_dict])
+        await invalidate_insights(current_user.email)
         await add_coin(current_user)
         return {"message": "Expense created successfully", "expense_id": expense_dict['_id']}
     else:
         raise HTTPException(status_code=400, detail="Failed to create expense")
 
-"""Get the expenses for the current user
+"""Write one chunk of imported expenses
+
+Rows are upserted with $setOnInsert on (_id, user), so re-importing an
+export skips the expenses that already exist instead of duplicating them.
+
+Args:
+    email (str): The owner of the expenses
+    chunk (list): (row number, expense dict) pairs
+
+Returns:
+    tuple: The number inserted, the number skipped, and the per-row errors
+"""
+async def write_expense_chunk(email: str, chunk: list):
+    operations = [
+        UpdateOne({"_id": expense["_id"], "user": email}, {"$setOnInsert": expense}, upsert=True)
+        for _, expense in chunk
+    ]
+    errors = []
+    try:
+        result = await db.expenses.bulk_write(operations, ordered=False)
+        upserted = result.upserted_ids
+    except BulkWriteError as e:
+        upserted = {item["index"]: item["_id"] for item in e.details.get("upserted", [])}
+        for error in e.details.get("writeErrors", []):
+            message = "duplicate _id" if error.get("code") == 11000 else error.get("errmsg", "write failed")
+            errors.append({"row": chunk[error["index"]][0], "error": message})
+
+    added = [chunk[index][1] for index in upserted]
+    await apply_rollups(email, added=added)
+    return len(added), len(chunk) - len(added) - len(errors), errors
+
+"""Import expenses from a streamed CSV or NDJSON body
+
+The body is parsed line by line and written in chunks of
+EXPENSE_IMPORT_CHUNK rows with unordered bulk writes, so a large import
+never sits in memory. Imported expenses don't award coins.
 
 Args:
     current_user (User): The current user
+    chunks (AsyncIterator[bytes]): The request body
+    format (str): csv or ndjson
 
 Returns:
-    list: The expenses for the current user
+    dict: Counts of the rows received, inserted, skipped and failed, with the per-row errors
 """
-async def get_expenses(current_user: User):
-    user = await db.users.find_one({"email": current_user.email})
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    return user.get("expenses", [])
+async def import_expenses(current_user: User, chunks, format: str):
+    if format not in EXPENSE_IO_FORMATS:
+        raise HTTPException(status_code=415, detail="Send text/csv or application/x-ndjson, or pass format=csv|ndjson")
+
+    received = inserted = skipped = failed = 0
+    errors = []
+    chunk = []
+
+    def record_error(row_number: int, message: str):
+        nonlocal failed
+        failed += 1
+        if len(errors) < EXPENSE_IMPORT_MAX_ERRORS:
+            errors.append({"row": row_number, "error": message})
+
+    async def flush():
+        nonlocal inserted, skipped
+        chunk_inserted, chunk_skipped, chunk_errors = await write_expense_chunk(current_user.email, chunk)
+        inserted += chunk_inserted
+        skipped += chunk_skipped
+        for error in chunk_errors:
+            record_error(error["row"], error["error"])
+        chunk.clear()
+
+    async for row_number, row in parse_rows(chunks, format):
+        if received >= EXPENSE_IMPORT_MAX_ROWS:
+            # Earlier chunks are already written, so report the cut-off instead of failing the request
+            record_error(row_number, f"import limit of {EXPENSE_IMPORT_MAX_ROWS} rows reached, remaining rows ignored")
+            break
+        received += 1
+        if isinstance(row, str):
+            record_error(row_number, row)
+            continue
+        validated, error = validate_row(row)
+        if error:
+            record_error(row_number, error)
+            continue
+        expense_dict, expense_id = validated
+        expense_dict = fill_expense_type(expense_dict)
+        expense_dict["_id"] = expense_id or str(ObjectId())
+        expense_dict["user"] = current_user.email
+        chunk.append((row_number, expense_dict))
+        if len(chunk) >= EXPENSE_IMPORT_CHUNK:
+            await flush()
+
+    if chunk:
+        await flush()
+    if inserted:
+        await invalidate_insights(current_user.email)
+
+    return {"received": received, "inserted": inserted, "skipped": skipped, "failed": failed, "errors": errors}
+
+"""Stream the expenses of the current user as CSV or NDJSON
+
+Expenses are read from the cursor in batches of EXPENSE_EXPORT_BATCH and
+written out as they arrive, so the full list is never buffered.
+
+Args:
+    current_user (User): The current user
+    format (str): csv or ndjson
+    start (str, optional): The earliest expenseDate to include (YYYY-MM-DD)
+    end (str, optional): The latest expenseDate to include (YYYY-MM-DD)
+
+Returns:
+    StreamingResponse: The exported expenses, newest first
+"""
+async def export_expenses(current_user: User, format: str = "csv", start: str = None, end: str = None):
+    if format not in EXPENSE_IO_FORMATS:
+        raise HTTPException(status_code=400, detail="format must be 'csv' or 'ndjson'")
+
+    query = {"user": current_user.email}
+    date_range = build_date_range(start, end)
+    if date_range:
+        query["expenseDate"] = date_range
+
+    async def rows():
+        cursor = db.expenses.find(query, EXPENSE_PROJECTION).sort([("expenseDate", -1), ("_id", -1)]).batch_size(EXPENSE_EXPORT_BATCH)
+        if format == "csv":
+            yield format_rows([], format, header=True)
+        batch = []
+        async for expense in cursor:
+            batch.append(expense)
+            if len(batch) >= EXPENSE_EXPORT_BATCH:
+                yield format_rows(batch, format)
+                batch = []
+        if batch:
+            yield format_rows(batch, format)
+
+    return StreamingResponse(
+        rows(),
+        media_type=EXPENSE_IO_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="expenses.{format}"'}
+    )
+
+"""Encode a keyset pagination cursor for an expense
+
+Args:
+    expense (dict): The last expense of the current page
+
+Returns:
+    str: An opaque cursor pointing after the given expense
+"""
+def encode_expense_cursor(expense: dict):
+    raw = json.dumps([expense.get("expenseDate"), expense["_id"]])
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+"""Decode a keyset pagination cursor
+
+Args:
+    cursor (str): The cursor returned by a previous page
+
+Returns:
+    tuple: The expenseDate and _id of the last expense of the previous page
+"""
+def decode_expense_cursor(cursor: str):
+    try:
+        expense_date, expense_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return expense_date, expense_id
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+"""Validate an ISO date query parameter
+
+Args:
+    value (str): The date to validate
+    name (str): The name of the query parameter
+
+Returns:
+    str: The date in YYYY-MM-DD format
+"""
+def parse_date_param(value: str, name: str):
+    try:
+        return date.fromisoformat(value).isoformat()
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"{name} must be a date in YYYY-MM-DD format")
+
+"""Build the expenseDate filter of a date window
+
+The end day is matched with $lt on the next day, so expenseDate values
+that carry a time ("2024-10-31T18:00:00") still count on the end day, as
+they do in the monthly rollups.
+
+Args:
+    start (str, optional): The first day to include (YYYY-MM-DD)
+    end (str, optional): The last day to include (YYYY-MM-DD)
+
+Returns:
+    dict: The range filter, or None when neither bound is given
+"""
+def build_date_range(start: str = None, end: str = None):
+    date_range = {}
+    if start:
+        date_range["$gte"] = parse_date_param(start, "start")
+    if end:
+        last_day = date.fromisoformat(parse_date_param(end, "end"))
+        date_range["$lt"] = (last_day + timedelta(days=1)).isoformat()
+    return date_range or None
+
+"""Get the expenses for the current user, newest first
+
+Only one page is returned: callers that never pass limit get at most
+EXPENSE_PAGE_DEFAULT expenses and must follow the X-Next-Cursor header
+(sent back as after=) to read the rest. The header is listed in the CORS
+expose headers so browser clients can read it.
+
+Args:
+    current_user (User): The current user
+    limit (int): The maximum number of expenses to return
+    after (str, optional): The cursor returned by the previous page
+    start (str, optional): The earliest expenseDate to include (YYYY-MM-DD)
+    end (str, optional): The latest expenseDate to include (YYYY-MM-DD)
+    expense_type (str, optional): Only include expenses of this type
+    fields (str, optional): Comma separated list of fields to return
+
+Returns:
+    JSONResponse: The page of expenses, with the next cursor in the X-Next-Cursor header
+"""
+async def get_expenses(current_user: User, limit: int = EXPENSE_PAGE_DEFAULT, after: str = None, start: str = None, end: str = None, expense_type: str = None, fields: str = None):
+    query = {"user": current_user.email}
+
+    date_range = build_date_range(start, end)
+    if date_range:
+        query["expenseDate"] = date_range
+
+    if expense_type:
+        query["expense-type"] = expense_type
+
+    if after:
+        after_date, after_id = decode_expense_cursor(after)
+        query["$or"] = [
+            {"expenseDate": {"$lt": after_date}},
+            {"expenseDate": after_date, "_id": {"$lt": after_id}}
+        ]
+
+    projection = EXPENSE_PROJECTION
+    requested = None
+    if fields:
+        requested = [field.strip() for field in fields.split(",") if field.strip()]
+        unknown = [field for field in requested if field not in EXPENSE_FIELDS]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+        # expenseDate and _id are always fetched because the cursor is built from them
+        projection = {field: 1 for field in set(requested) | {"_id", "expenseDate"}}
+
+    limit = max(1, min(limit, EXPENSE_PAGE_MAX))
+    cursor = db.expenses.find(query, projection).sort([("expenseDate", -1), ("_id", -1)]).limit(limit + 1)
+    expenses = await cursor.to_list(length=limit + 1)
+
+    headers = {}
+    if len(expenses) > limit:
+        expenses = expenses[:limit]
+        headers["X-Next-Cursor"] = encode_expense_cursor(expenses[-1])
+
+    if requested is not None:
+        expenses = [{field: expense[field] for field in requested if field in expense} for expense in expenses]
+
+    return JSONResponse(content=expenses, headers=headers)
+
+"""Build the aggregation pipeline behind the spending summary
+
+Args:
+    query (dict): The $match stage filter
+    series (str): Either "month" or "week", or None for the category totals only
+
+Returns:
+    list: The aggregation pipeline
+"""
+def build_summary_pipeline(query: dict, series: str = None):
+    facets = {
+        "categories": [
+            {"$group": {"_id": "$expense-type", "total": {"$sum": "$amount"}, "count": {"$sum": 1}}}
+        ]
+    }
+    amount = {"$convert": {"input": "$expenseTotal", "to": "double", "onError": 0, "onNull": 0}}
+    if series is None:
+        return [
+            {"$match": query},
+            {"$project": {"expense-type": 1, "amount": amount}},
+            {"$facet": facets}
+        ]
+
+    if series == "week":
+        period = {"$dateToString": {
+            "format": "%G-W%V",
+            "date": {"$dateFromString": {"dateString": "$expenseDate", "onError": None, "onNull": None}},
+            "onNull": "unknown"
+        }}
+    else:
+        period = {"$substrBytes": ["$expenseDate", 0, 7]}
+
+    facets["series"] = [
+        {"$group": {"_id": {"period": "$period", "type": "$expense-type"}, "total": {"$sum": "$amount"}}},
+        {"$sort": {"_id.period": 1}}
+    ]
+    return [
+        {"$match": query},
+        {"$project": {"expense-type": 1, "period": period, "amount": amount}},
+        {"$facet": facets}
+    ]
+
+"""Shape category totals and per-period totals into the summary response
+
+Args:
+    categories (list): Documents with _id (the expense type), total and count
+    series_rows (list): Documents with _id.period, _id.type and total
+    start (str): The first day of the window, or None
+    end (str): The last day of the window, or None
+    series (str): Either "month" or "week"
+
+Returns:
+    dict: The spending summary
+"""
+def format_summary(categories: list, series_rows: list, start: str, end: str, series: str):
+    totals = {expense_type: {"total": 0.0, "count": 0, "percentage": 0.0} for expense_type in EXPENSE_TYPES}
+    for row in categories:
+        bucket = totals.setdefault(row["_id"], {"total": 0.0, "count": 0, "percentage": 0.0})
+        bucket["total"] += row["total"]
+        bucket["count"] += row["count"]
+
+    grand_total = sum(bucket["total"] for bucket in totals.values())
+    for bucket in totals.values():
+        bucket["total"] = round(bucket["total"], 2)
+        bucket["percentage"] = round(bucket["total"] / grand_total * 100, 2) if grand_total else 0.0
+
+    periods = {}
+    for row in series_rows:
+        period = periods.setdefault(row["_id"]["period"], {expense_type: 0.0 for expense_type in EXPENSE_TYPES})
+        period[row["_id"]["type"]] = period.get(row["_id"]["type"], 0.0) + row["total"]
+
+    return {
+        "start": start,
+        "end": end,
+        "total": round(grand_total, 2),
+        "count": sum(bucket["count"] for bucket in totals.values()),
+        "categories": totals,
+        "series_type": series,
+        "series": [
+            {"period": key, **{k: round(v, 2) for k, v in values.items()}, "total": round(sum(values.values()), 2)}
+            for key, values in sorted(periods.items())
+        ]
+    }
+
+"""Check whether a window only covers whole calendar months
+
+Args:
+    start (str): The first day of the window (YYYY-MM-DD), or None
+    end (str): The last day of the window (YYYY-MM-DD), or None
+
+Returns:
+    bool: True if the window can be served from the monthly rollups
+"""
+def is_month_aligned(start: str, end: str):
+    if start and not start.endswith("-01"):
+        return False
+    if end:
+        last_day = date.fromisoformat(end) + timedelta(days=1)
+        if last_day.day != 1:
+            return False
+    return True
+
+"""Get a spending breakdown for the current user
+
+Args:
+    current_user (User): The current user
+    start (str, optional): The earliest expenseDate to include (YYYY-MM-DD)
+    end (str, optional): The latest expenseDate to include (YYYY-MM-DD)
+    series (str): Group the series per "month" or per "week"
+
+Returns:
+    dict: Per-category totals and percentages, and a per-period series
+"""
+async def get_expense_summary(current_user: User, start: str = None, end: str = None, series: str = "month"):
+    if series not in ("month", "week"):
+        raise HTTPException(status_code=400, detail="series must be 'month' or 'week'")
+
+    query = {"user": current_user.email}
+    if start:
+        start = parse_date_param(start, "start")
+    if end:
+        end = parse_date_param(end, "end")
+    date_range = build_date_range(start, end)
+    if date_range:
+        query["expenseDate"] = date_range
+
+    if series == "month" and is_month_aligned(start, end):
+        # Whole months can be answered from the rollups without touching the expenses
+        rollups = await get_rollups(
+            current_user.email,
+            start[:7] if start else None,
+            end[:7] if end else None
+        )
+        categories = [
+            {"_id": rollup["expense-type"], "total": rollup["total"], "count": rollup["count"]}
+            for rollup in rollups
+        ]
+        series_rows = [
+            {"_id": {"period": rollup["month"], "type": rollup["expense-type"]}, "total": rollup["total"]}
+            for rollup in rollups
+        ]
+        return format_summary(categories, series_rows, start, end, series)
+
+    result = await db.expenses.aggregate(build_summary_pipeline(query, series)).to_list(length=1)
+    facets = result[0] if result else {"categories": [], "series": []}
+
+    return format_summary(facets["categories"], facets["series"], start, end, series)
 
 """Get an expense for the current user
 
@@ -214,11 +764,10 @@ Returns:
     dict: The expense with the given ID
 """
 async def get_expense(current_user: User, expense_id: str):
-    user = await db.users.find_one({"email": current_user.email})
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    expense = next((exp for exp in user.get("expenses", []) if exp['_id'] == expense_id), None)
+    expense = await db.expenses.find_one(
+        {"_id": expense_id, "user": current_user.email},
+        EXPENSE_PROJECTION
+    )
     if not expense:
         raise HTTPException(status_code=404, detail="Expense not found")
     
@@ -229,25 +778,20 @@ async def get_expense(current_user: User, expense_id: str):
 Args:
     current_user (User): The current user
     expense_id (str): The ID of the expense to update
-    updated_expense (Expense): The updated expense
+    updated_expense (ExpenseCreate): The updated expense
 
 """
-async def update_expense(current_user: User, expense_id: str, updated_expense: Expense):
-    user = await db.users.find_one({"email": current_user.email})
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    result = await db.users.update_one(
-        {"email": current_user.email, "expenses._id": expense_id},
-        {"$set": {
-            "expenses.$.expense_type": updated_expense.expense_type,
-            "expenses.$.date": updated_expense.date,
-            "expenses.$.total": updated_expense.total,
-            "expenses.$.expense_name": updated_expense.expense_name
-        }}
+async def update_expense(current_user: User, expense_id: str, updated_expense: ExpenseCreate):
+    changes = fill_expense_type(updated_expense.dict(by_alias=True))
+    previous = await db.expenses.find_one_and_update(
+        {"_id": expense_id, "user": current_user.email},
+        {"$set": changes},
+        return_document=ReturnDocument.BEFORE
     )
     
-    if result.modified_count == 1:
+    if previous:
+        await apply_rollups(current_user.email, added=[{**previous, **changes}], removed=[previous])
+        await invalidate_insights(current_user.email)
         return {"message": "Expense updated successfully"}
     else:
         raise HTTPException(status_code=404, detail="Expense not found or not updated")
@@ -262,16 +806,13 @@ Returns:
     dict: The deleted expense
 """
 async def delete_expense(current_user: User, expense_id: str):
-    user = await db.users.find_one({"email": current_user.email})
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    result = await db.users.update_one(
-        {"email": current_user.email},
-        {"$pull": {"expenses": {"_id": expense_id}}}
+    deleted = await db.expenses.find_one_and_delete(
+        {"_id": expense_id, "user": current_user.email}
     )
     
-    if result.modified_count == 1:
+    if deleted:
+        await apply_rollups(current_user.email, removed=[deleted])
+        await invalidate_insights(current_user.email)
         return {"message": "Expense deleted successfully"}
     else:
         raise HTTPException(status_code=404, detail="Expense not found or not deleted")
@@ -286,7 +827,7 @@ Returns:
     int: The level for the current user
 """
 async def get_level(current_user: User):
-    user = await db.users.find_one({"email": current_user.email})
+    user = await find_user(current_user.email)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
@@ -302,19 +843,15 @@ Returns:
     dict: The updated level
 """
 async def update_level(current_user: User, level: int):
-    user = await db.users.find_one({"email": current_user.email})
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
     result = await db.users.update_one(
         {"email": current_user.email},
         {"$set": {"level": level}}
     )
+    if result.matched_count == 0:
+        raise HTTPException(status_code=404, detail="User not found")
+    invalidate_user(current_user.email)
 
-    if result.modified_count == 1:
-        return {"message": "Level updated successfully"}
-    else:
-        raise HTTPException(status_code=400, detail="Failed to update level")
+    return {"message": "Level updated successfully", "level": level}
 
 """Level up the current user
 
@@ -325,17 +862,82 @@ Returns:
     dict: The leveled up user
 """
 async def level_up(current_user: User):
-    user = await db.users.find_one({"email": current_user.email})
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    level = user.get("level", 1)
-    if level >= 10:
+    # Users stored without a level are at level 1, as in upgrade_farm
+    level = {"$ifNull": ["$level", 1]}
+    user = await db.users.find_one_and_update(
+        {"email": current_user.email, "$expr": {"$lt": [level, FARM_MAX_LEVEL]}},
+        [{"$set": {"level": {"$add": [level, 1]}}}],
+        projection={"level": 1},
+        return_document=ReturnDocument.AFTER
+    )
+    if user is None:
+        if not await find_user(current_user.email):
+            raise HTTPException(status_code=404, detail="User not found")
         return {"message": "User has reached the maximum level"}
-    
-    new_level = level + 1
-    await update_level(current_user, new_level)
-    return {"message": "User leveled up successfully"}
+    invalidate_user(current_user.email)
+
+    return {"message": "User leveled up successfully", "level": user["level"]}
+
+"""Get the cost of the next farm upgrade
+
+Args:
+    level (int): The current farm level
+
+Returns:
+    int: The coins the upgrade costs (more when it opens a new scene)
+"""
+def farm_upgrade_cost(level: int):
+    return FARM_EXPAND_COST if level % FARM_PIGS_PER_SCENE == 0 else FARM_UPGRADE_COST
+
+"""Upgrade the farm of the current user
+
+The cost check, coin debit and level increment are a single conditional
+find_one_and_update: the cost is computed from the stored level inside an
+update pipeline, so concurrent upgrades can't overspend or skip a level.
+
+Args:
+    current_user (User): The current user
+
+Returns:
+    dict: The new level and coins, and the coins spent
+"""
+async def upgrade_farm(current_user: User):
+    level = {"$ifNull": ["$level", 1]}
+    cost = {"$cond": [
+        {"$eq": [{"$mod": [level, FARM_PIGS_PER_SCENE]}, 0]},
+        FARM_EXPAND_COST,
+        FARM_UPGRADE_COST
+    ]}
+    user = await db.users.find_one_and_update(
+        {"email": current_user.email, "$expr": {"$and": [
+            {"$lt": [level, FARM_MAX_LEVEL]},
+            {"$gte": [{"$ifNull": ["$coins", 0]}, cost]}
+        ]}},
+        [{"$set": {
+            "coins": {"$subtract": [{"$ifNull": ["$coins", 0]}, cost]},
+            "level": {"$add": [level, 1]}
+        }}],
+        projection={"level": 1, "coins": 1},
+        return_document=ReturnDocument.AFTER
+    )
+    if user is None:
+        # Only the failure path pays for a second read, to explain the refusal
+        user = await find_user(current_user.email)
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+        if user.get("level", 1) >= FARM_MAX_LEVEL:
+            raise HTTPException(status_code=400, detail="Farm is already at the maximum level")
+        raise HTTPException(status_code=400, detail="Not enough coins")
+    invalidate_user(current_user.email)
+
+    spent = farm_upgrade_cost(user["level"] - 1)
+    return {
+        "message": "Farm upgraded successfully",
+        "level": user["level"],
+        "coins": user["coins"],
+        "cost": spent,
+        "expanded": spent == FARM_EXPAND_COST
+    }
 
 """Get the coins for the current user
 
@@ -346,7 +948,7 @@ Returns:
     int: The coins for the current user
 """
 async def get_coins(current_user: User):
-    user = await db.users.find_one({"email": current_user.email})
+    user = await find_user(current_user.email)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
@@ -363,21 +965,15 @@ Returns:
     dict: The updated coins
 """
 async def update_coins(current_user: User, coins: int):
-    user = await db.users.find_one({"email": current_user.email})
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
     result = await db.users.update_one(
         {"email": current_user.email},
         {"$set": {"coins": coins}}
     )
+    if result.matched_count == 0:
+        raise HTTPException(status_code=404, detail="User not found")
+    invalidate_user(current_user.email)
 
-    if result.modified_count == 1:
-        return {"message": "Coins updated successfully"}
-    else:
-        raise HTTPException(status_code=400, detail="Failed to update coins")
-
-
+    return {"message": "Coins updated successfully", "coins": coins}
 
 """Add 1 coin to the current user
 
@@ -388,19 +984,17 @@ Returns:
     dict: The updated coins
 """
 async def add_coin(current_user: User):
-    user = await db.users.find_one({"email": current_user.email})
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    result = await db.users.update_one(
+    user = await db.users.find_one_and_update(
         {"email": current_user.email},
-        {"$inc": {"coins": 1}}
+        {"$inc": {"coins": 1}},
+        projection={"coins": 1},
+        return_document=ReturnDocument.AFTER
     )
+    if user is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    invalidate_user(current_user.email)
 
-    if result.modified_count == 1:
-        return {"message": "Coin added successfully"}
-    else:
-        raise HTTPException(status_code=400, detail="Failed to add coin")
+    return {"message": "Coin added successfully", "coins": user["coins"]}
 
 """Get the budget for the current user
 
@@ -411,7 +1005,7 @@ Returns:
     float: The budget for the current user
 """
 async def get_budget(current_user: User):
-    user = await db.users.find_one({"email": current_user.email})
+    user = await find_user(current_user.email)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
@@ -427,7 +1021,7 @@ Returns:
     dict: The updated budget
 """
 async def update_budget(current_user: User, budget: float):
-    user = await db.users.find_one({"email": current_user.email})
+    user = await find_user(current_user.email)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
@@ -439,6 +1033,9 @@ async def update_budget(current_user: User, budget: float):
             {"email": current_user.email},
             {"$set": {"budget": budget}}
         )
+        invalidate_user(current_user.email)
+        if result.modified_count == 1:
+            await invalidate_insights(current_user.email)
 
         if result.modified_count == 1:
             return {"message": "Budget updated successfully", "budget": budget}
@@ -457,30 +1054,19 @@ Returns:
     dict: The updated coins
 """
 async def use_coins(current_user: User, coins: int = Query(..., description="Number of coins to use")):
-    print(f"Attempting to use {coins} coins for user {current_user.email}")
-    
-    user = await db.users.find_one({"email": current_user.email})
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    print(f"User's current coins: {user['coins']}")
-    
-    if user['coins'] < coins:
-        print(f"Not enough coins. User has {user['coins']}, trying to use {coins}")
-        raise HTTPException(status_code=400, detail="Not enough coins")
-    
-    result = await db.users.update_one(
+    user = await db.users.find_one_and_update(
         {"email": current_user.email, "coins": {"$gte": coins}},
-        {"$inc": {"coins": -coins}}
+        {"$inc": {"coins": -coins}},
+        projection={"coins": 1},
+        return_document=ReturnDocument.AFTER
     )
+    if user is None:
+        if not await find_user(current_user.email):
+            raise HTTPException(status_code=404, detail="User not found")
+        raise HTTPException(status_code=400, detail="Not enough coins")
+    invalidate_user(current_user.email)
 
-    if result.modified_count == 1:
-        updated_user = await db.users.find_one({"email": current_user.email})
-        print(f"Updated user's coins to {updated_user['coins']}")
-        return {"message": "Coins used successfully", "remaining_coins": updated_user['coins']}
-    else:
-        raise HTTPException(status_code=400, detail="Failed to use coins")
-
+    return {"message": "Coins used successfully", "remaining_coins": user["coins"]}
 
 """Set the default values for the current user
 
@@ -491,7 +1077,7 @@ Returns:
     dict: The updated user
 """
 async def set_user_default(current_user: User):
-    user = await db.users.find_one({"email": current_user.email})
+    user = await find_user(current_user.email)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
@@ -499,6 +1085,8 @@ async def set_user_default(current_user: User):
         {"email": current_user.email},
         {"$set": {"level": 1, "coins": 0, "budget": 0}}
     )
+    invalidate_user(current_user.email)
+    await invalidate_insights(current_user.email)
 
     if result.modified_count == 1:
         return {"message": "User default values set successfully"}
@@ -514,18 +1102,121 @@ Returns:
     dict: The insights for the current user
 """
 async def get_insights(current_user: User):
-    user = await db.users.find_one({"email": current_user.email})
+    data = await build_insights_input(current_user.email)
+    fingerprint = insights_fingerprint(data)
+
+    cached = await get_cached_insights(current_user.email, fingerprint)
+    if cached is not None:
+        return {"insights": cached}
+
+    insights = await get_insights_data(data)
+    await store_insights(current_user.email, fingerprint, insights["insights"])
+
+    return insights
+
+"""Regenerate and store the insights of a user
+
+Used by the off-peak precompute to refresh stale insights.
+
+Args:
+    email (str): The user
+
+Returns:
+    None
+"""
+async def refresh_insights(email: str):
+    data = await build_insights_input(email)
+    insights = await get_insights_data(data)
+    await store_insights(email, insights_fingerprint(data), insights["insights"])
+
+"""Gather the data the insights are generated from
+
+Args:
+    email (str): The user
+
+Returns:
+    dict: The budget, category totals and largest expenses of the last 30 days
+"""
+async def build_insights_input(email: str):
+    user = await find_user(email)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    data = {
-        "expenses": list(filter(lambda expense: datetime.fromisoformat(expense['expenseDate']) >= one_month_ago, user.get("expenses", []))),
+    one_month_ago = (date.today() - timedelta(days=INSIGHTS_WINDOW_DAYS)).isoformat()
+    query = {"user": email, "expenseDate": {"$gte": one_month_ago}}
+
+    result = await db.expenses.aggregate(build_summary_pipeline(query)).to_list(length=1)
+    facets = result[0] if result else {"categories": []}
+    summary = format_summary(facets["categories"], [], one_month_ago, None, "month")
+
+    top_expenses = await db.expenses.find(
+        query,
+        {"_id": 0, "expense-type": 1, "expenseDate": 1, "expenseTotal": 1, "expense-name": 1}
+    ).sort([("expenseTotal", -1), ("expenseDate", -1)]).limit(INSIGHTS_TOP_EXPENSES).to_list(length=INSIGHTS_TOP_EXPENSES)
+    
+    return {
+        "window_days": INSIGHTS_WINDOW_DAYS,
         "budget": user.get("budget", 0),
+        "total": summary["total"],
+        "categories": summary["categories"],
+        "top_expenses": top_expenses,
     }
 
-    insights = await get_insights_data(data)
+"""Format one server-sent event
 
-    return insights
+Args:
+    event (str): The event name
+    data (dict): The event payload
+
+Returns:
+    str: The encoded event
+"""
+def sse_event(event: str, data: dict):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+"""Relay the insight tokens as server-sent events
+
+Args:
+    email (str): The user
+    data (dict): The data the insights are generated from
+
+Yields:
+    str: A "token" event per piece of text, then a "done" event with the full text
+"""
+async def stream_insight_events(email: str, data: dict):
+    fingerprint = insights_fingerprint(data)
+    cached = await get_cached_insights(email, fingerprint)
+    if cached is not None:
+        yield sse_event("token", {"token": cached})
+        yield sse_event("done", {"insights": cached})
+        return
+
+    generated = []
+    try:
+        async for token in stream_insights(data):
+            generated.append(token)
+            yield sse_event("token", {"token": token})
+    except Exception as e:
+        yield sse_event("error", {"detail": f"Failed to generate insights: {str(e)}"})
+        return
+    await store_insights(email, fingerprint, "".join(generated))
+    yield sse_event("done", {"insights": "".join(generated)})
+
+"""Stream the insights for the current user
+
+Args:
+    current_user (User): The current user
+
+Returns:
+    StreamingResponse: Server-sent events relaying the LLM output as it is generated
+"""
+async def get_insights_stream(current_user: User):
+    data = await build_insights_input(current_user.email)
+    return StreamingResponse(
+        stream_insight_events(current_user.email, data),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 """Change the password for the current user
 
@@ -535,24 +1226,35 @@ Args:
     new_password (str): The new password
 
 Returns:
-    dict: The updated user
+    dict: A fresh access token; tokens issued before the change stop working
 """
 async def change_password(current_user: User, current_password: str, new_password: str):
-    user = await db.users.find_one({"email": current_user.email})
+    user = await db.users.find_one({"email": current_user.email}, {"hashed_password": 1})
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    if not bcrypt.checkpw(current_password.encode('utf-8'), user["hashed_password"]):
+    if not await verify_password(current_password, user["hashed_password"]):
         raise HTTPException(status_code=400, detail="Current password is incorrect")
     
-    hashed_password = bcrypt.hashpw(new_password.encode('utf-8'), bcrypt.gensalt())
+    hashed_password = await hash_password(new_password)
     
-    result = await db.users.update_one(
+    # Bumping the token epoch invalidates every token issued before the change
+    user = await db.users.find_one_and_update(
         {"email": current_user.email},
-        {"$set": {"hashed_password": hashed_password}}
+        {"$set": {"hashed_password": hashed_password}, "$inc": {"token_epoch": 1}},
+        projection={"token_epoch": 1},
+        return_document=ReturnDocument.AFTER
     )
-    
-    if result.modified_count == 1:
-        return {"message": "Password changed successfully"}
-    else:
-        raise HTTPException(status_code=400, detail="Failed to change password")
\ No newline at end of file
+    invalidate_user(current_user.email)
+    if user is None:
+        raise HTTPException(status_code=400, detail="Failed to change password")
+
+    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    access_token = create_access_token(
+        data={"sub": current_user.email, "ep": user["token_epoch"]}, expires_delta=access_token_expires
+    )
+    return {
+        "message": "Password changed successfully",
+        "access_token": access_token,
+        "token_type": "bearer"
+    }
\ No newline at end of file
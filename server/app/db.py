@@ -1,5 +1,10 @@
+from collections import defaultdict
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import monitoring
+from app.utils.metrics import LatencyStats
 import os
+import threading
+import time
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -10,5 +15,132 @@ DB_NAME = os.getenv("DB_NAME")
 if not MONGO_URL:
     raise ValueError("MONGO_URL environment variable is not set")
 
-client = AsyncIOMotorClient(MONGO_URL, serverSelectionTimeoutMS=5000)
+# Connection pool tuning; unset values keep the driver defaults
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+MONGO_MAX_IDLE_TIME_MS = os.getenv("MONGO_MAX_IDLE_TIME_MS")
+MONGO_WAIT_QUEUE_TIMEOUT_MS = os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS")
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+# e.g. "zstd,snappy,zlib"; the server picks the first one it also supports
+MONGO_COMPRESSORS = os.getenv("MONGO_COMPRESSORS")
+MONGO_READ_PREFERENCE = os.getenv("MONGO_READ_PREFERENCE", "primary")
+
+class PoolStatsListener(monitoring.ConnectionPoolListener):
+    """Tracks connection pool usage from pymongo's pool monitoring events.
+
+    checkouts_in_progress counts every checkout that hasn't finished, including
+    ones served at once by an idle connection. Waiting for the pool shows up in
+    wait_time and in checkouts_at_capacity, the checkouts that started while
+    every connection to their server was already checked out.
+
+    The events fire on Motor's worker threads, so counters are guarded by a lock.
+    """
+    def __init__(self):
+        self.open = 0
+        self.checked_out = 0
+        self.checkouts_in_progress = 0
+        self.checkouts_at_capacity = 0
+        self.checkout_failures = 0
+        self.cleared = 0
+        self.wait_time = LatencyStats()
+        self._checked_out_by_server = defaultdict(int)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self.cleared += 1
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        with self._lock:
+            self.open += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.open -= 1
+
+    def connection_check_out_started(self, event):
+        self._local.started = time.perf_counter()
+        with self._lock:
+            self.checkouts_in_progress += 1
+            if self._checked_out_by_server[event.address] >= MONGO_MAX_POOL_SIZE:
+                self.checkouts_at_capacity += 1
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.checkouts_in_progress -= 1
+            self.checkout_failures += 1
+
+    def connection_checked_out(self, event):
+        # Newer drivers report the wait on the event itself
+        duration = getattr(event, "duration", None)
+        if duration is None:
+            duration = time.perf_counter() - getattr(self._local, "started", time.perf_counter())
+        self.wait_time.observe(duration)
+        with self._lock:
+            self.checkouts_in_progress -= 1
+            self.checked_out += 1
+            self._checked_out_by_server[event.address] += 1
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_out -= 1
+            self._checked_out_by_server[event.address] -= 1
+
+    def stats(self):
+        return {
+            "max_pool_size": MONGO_MAX_POOL_SIZE,
+            "min_pool_size": MONGO_MIN_POOL_SIZE,
+            "open": self.open,
+            "checked_out": self.checked_out,
+            "checkouts_in_progress": self.checkouts_in_progress,
+            "checkouts_at_capacity": self.checkouts_at_capacity,
+            "checkout_failures": self.checkout_failures,
+            "cleared": self.cleared,
+            "wait_time": self.wait_time.stats()
+        }
+
+pool_stats = PoolStatsListener()
+
+"""Build the client options from the MONGO_* settings
+
+Returns:
+    dict: Keyword arguments for AsyncIOMotorClient
+"""
+def client_options():
+    options = {
+        "maxPoolSize": MONGO_MAX_POOL_SIZE,
+        "minPoolSize": MONGO_MIN_POOL_SIZE,
+        "serverSelectionTimeoutMS": MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        "readPreference": MONGO_READ_PREFERENCE,
+        "event_listeners": [pool_stats]
+    }
+    if MONGO_MAX_IDLE_TIME_MS:
+        options["maxIdleTimeMS"] = int(MONGO_MAX_IDLE_TIME_MS)
+    if MONGO_WAIT_QUEUE_TIMEOUT_MS:
+        options["waitQueueTimeoutMS"] = int(MONGO_WAIT_QUEUE_TIMEOUT_MS)
+    if MONGO_COMPRESSORS:
+        options["compressors"] = MONGO_COMPRESSORS
+    return options
+
+# Motor connects lazily, so building the client at import is cheap and keeps
+# `from app.db import db` working everywhere. The lifespan closes it.
+client = AsyncIOMotorClient(MONGO_URL, **client_options())
 db = client[DB_NAME]
+
+"""Close the Mongo client and its connection pool
+"""
+def close_client():
+    client.close()
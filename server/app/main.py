@@ -1,5 +1,7 @@
-from fastapi import FastAPI, Depends, UploadFile, File, Path, HTTPException
+from fastapi import FastAPI, Depends, UploadFile, File, Path, HTTPException, Query, Request, Header
 from fastapi.middleware.cors import CORSMiddleware as CORS
+from contextlib import asynccontextmanager
+from typing import List
 import os
 from dotenv import load_dotenv
 
@@ -7,11 +9,43 @@ from app.models.auth import EmailPasswordRequestForm
 from app.controllers import user as user_controller
 from app.controllers import ocr as ocr_controller
 from app.models.user import UserCreate, Token, User, ExpenseCreate, Expense, ChangePasswordRequest, BudgetUpdate
-from app.utils.auth import get_current_user
+from app.utils.auth import get_current_user, token_cache
+from app.db import close_client, pool_stats
+from app.utils.indexes import ensure_indexes
+from app.utils.log import configure_logging, shutdown_logging, RequestIdMiddleware
+from app.utils.expense_io import detect_format
+from app.utils.users import begin_identity_map, end_identity_map, user_cache
+from app.utils.model import start_llm_session, close_llm_session, receipt_parse_counters
+from app.utils.ocr_pool import start_ocr_pool, shutdown_ocr_pool, ocr_pool_stats
+from app.utils.receipt_cache import receipt_cache_stats
+from app.utils.jobs import start_job_workers, stop_job_workers
+from app.utils.passwords import shutdown_password_executor
+from app.utils.insights_cache import precompute_insights_loop, INSIGHTS_PRECOMPUTE_HOURS
+import asyncio
 
 load_dotenv()
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    configure_logging()
+    await ensure_indexes()
+    await start_llm_session()
+    start_ocr_pool()
+    start_job_workers(ocr_controller.run_ocr_job)
+    precompute = None
+    if INSIGHTS_PRECOMPUTE_HOURS:
+        precompute = asyncio.create_task(precompute_insights_loop(user_controller.refresh_insights))
+    yield
+    if precompute is not None:
+        precompute.cancel()
+    await stop_job_workers()
+    shutdown_ocr_pool()
+    shutdown_password_executor()
+    await close_llm_session()
+    close_client()
+    shutdown_logging()
+
+app = FastAPI(lifespan=lifespan)
 
 # CORS
 origins = os.getenv("CORS_ORIGINS", "").split(",")
@@ -20,9 +54,33 @@ app.add_middleware(
     allow_origins=origins,
     allow_credentials=True,
     allow_methods=["*"],
-    allow_headers=["*"]
+    allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "X-Request-ID"]
 )
 
+@app.middleware("http")
+async def user_identity_map(request: Request, call_next):
+    token = begin_identity_map()
+    try:
+        return await call_next(request)
+    finally:
+        end_identity_map(token)
+
+app.add_middleware(RequestIdMiddleware)
+
+# METRICS ROUTE
+
+@app.get("/metrics")
+async def get_metrics():
+    return {
+        "mongo_pool": pool_stats.stats(),
+        "user_cache": user_cache.stats(),
+        "token_cache": token_cache.stats(),
+        "ocr": ocr_pool_stats(),
+        "receipt_cache": receipt_cache_stats(),
+        "receipt_parsing": receipt_parse_counters
+    }
+
 # USER ROUTES
 
 @app.post("/register", status_code=201)
@@ -37,6 +95,10 @@ async def login_for_access_token(form_data: EmailPasswordRequestForm = Depends()
 async def get_user(current_user: User = Depends(get_current_user)):
     return await user_controller.get_user(current_user)
 
+@app.get("/me/state")
+async def get_state(if_none_match: str | None = Header(None), current_user: User = Depends(get_current_user)):
+    return await user_controller.get_state(current_user, if_none_match)
+
 @app.delete("/delete")
 async def delete_user(current_user: User = Depends(get_current_user)):
     return await user_controller.delete_user(current_user)
@@ -55,21 +117,77 @@ async def change_password(request: ChangePasswordRequest, current_user: User = D
 async def ocr_endpoint(image: UploadFile = File(...)):
     return await ocr_controller.process_ocr(image)
 
+@app.post("/ocr/jobs", status_code=202)
+async def create_ocr_job(image: UploadFile = File(...)):
+    return await ocr_controller.create_ocr_job(image)
+
+@app.get("/ocr/jobs/{job_id}")
+async def get_ocr_job(job_id: str = Path(...)):
+    return await ocr_controller.get_ocr_job(job_id)
+
+@app.get("/ocr/jobs/{job_id}/events")
+async def ocr_job_events(job_id: str = Path(...)):
+    return await ocr_controller.ocr_job_events(job_id)
+
+@app.post("/ocr/batch")
+async def ocr_batch_endpoint(images: List[UploadFile] = File(...)):
+    return await ocr_controller.process_ocr_batch(images)
+
 # Insights Route
 
 @app.get("/insights")
 async def get_insights(current_user: User = Depends(get_current_user)):
     return await user_controller.get_insights(current_user)
 
+@app.get("/insights/stream")
+async def get_insights_stream(current_user: User = Depends(get_current_user)):
+    return await user_controller.get_insights_stream(current_user)
+
 # EXPENSE ROUTES
 
 @app.post("/expenses")
 async def create_expense(expense: ExpenseCreate, current_user: User = Depends(get_current_user)):
     return await user_controller.create_expense(current_user, expense)
 
-@app.get("/expenses")
-async def get_expenses(current_user: User = Depends(get_current_user)):
-    return await user_controller.get_expenses(current_user)
+@app.get("/expenses", description=(
+    "Returns one page of expenses, newest first: at most `limit` (default "
+    f"{user_controller.EXPENSE_PAGE_DEFAULT}, max {user_controller.EXPENSE_PAGE_MAX}). "
+    "When more remain, the X-Next-Cursor response header holds the cursor to pass as `after`; "
+    "clients that ignore it only see the first page."
+))
+async def get_expenses(
+    limit: int = Query(user_controller.EXPENSE_PAGE_DEFAULT, ge=1, le=user_controller.EXPENSE_PAGE_MAX),
+    after: str | None = None,
+    start: str | None = None,
+    end: str | None = None,
+    expense_type: str | None = Query(None, alias="expense-type"),
+    fields: str | None = None,
+    current_user: User = Depends(get_current_user)
+):
+    return await user_controller.get_expenses(current_user, limit, after, start, end, expense_type, fields)
+
+@app.post("/expenses/bulk")
+async def import_expenses(request: Request, format: str | None = None, current_user: User = Depends(get_current_user)):
+    format = detect_format(format, request.headers.get("content-type"))
+    return await user_controller.import_expenses(current_user, request.stream(), format)
+
+@app.get("/expenses/export")
+async def export_expenses(
+    format: str = "csv",
+    start: str | None = None,
+    end: str | None = None,
+    current_user: User = Depends(get_current_user)
+):
+    return await user_controller.export_expenses(current_user, format, start, end)
+
+@app.get("/expenses/summary")
+async def get_expense_summary(
+    start: str | None = None,
+    end: str | None = None,
+    series: str = "month",
+    current_user: User = Depends(get_current_user)
+):
+    return await user_controller.get_expense_summary(current_user, start, end, series)
 
 @app.get("/expenses/{expense_id}")
 async def get_expense(expense_id: str = Path(...), current_user: User = Depends(get_current_user)):
@@ -97,6 +215,10 @@ async def update_level(level: int, current_user: User = Depends(get_current_user
 async def level_up(current_user: User = Depends(get_current_user)):
     return await user_controller.level_up(current_user)
 
+@app.post("/farm/upgrade")
+async def upgrade_farm(current_user: User = Depends(get_current_user)):
+    return await user_controller.upgrade_farm(current_user)
+
 # BUDGET ROUTES
 
 @app.get("/budget")
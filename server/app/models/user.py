@@ -3,8 +3,11 @@ from typing import List
 from datetime import date
 from bson import ObjectId
 
+EXPENSE_TYPES = ["needs", "wants", "savings"]
+
 class ExpenseCreate(BaseModel):
-    expenseType: str = Field(..., alias="expense-type")
+    # Left out by manual entry to let the expense classifier pick it
+    expenseType: str | None = Field(None, alias="expense-type")
     expenseDate: str  # Keep this as a string
     expenseTotal: float
     expenseName: str = Field(..., alias="expense-name")
@@ -40,7 +43,6 @@ class User(BaseModel):
     first_name: str
     last_name: str
     email: EmailStr
-    expenses: List[Expense] = []
     level: int = 1
     coins: int = 0
     budget: float = 0
@@ -0,0 +1,61 @@
+"""Benchmark login throughput with bcrypt on and off the event loop.
+
+Simulates a burst of concurrent logins (password checks only, no database)
+and reports throughput plus the worst event loop stall seen by a 10ms
+heartbeat task, which is what other requests experience during the burst.
+
+Usage (from the server directory):
+    python -m app.scripts.bench_login [--logins 50] [--rounds 12] [--workers 4]
+"""
+from app.utils import passwords
+import argparse
+import asyncio
+import bcrypt
+import time
+
+async def heartbeat(stalls: list, stop: asyncio.Event, interval: float = 0.01):
+    while not stop.is_set():
+        started_at = time.perf_counter()
+        await asyncio.sleep(interval)
+        stalls.append(time.perf_counter() - started_at - interval)
+
+async def inline_login(password: bytes, hashed: bytes):
+    # What the controllers did before: checkpw on the event loop
+    return bcrypt.checkpw(password, hashed)
+
+async def executor_login(password: bytes, hashed: bytes):
+    return await passwords.verify_password(password.decode(), hashed)
+
+async def run(login, logins: int, password: bytes, hashed: bytes):
+    stalls = []
+    stop = asyncio.Event()
+    ticker = asyncio.create_task(heartbeat(stalls, stop))
+    await asyncio.sleep(0)
+    started_at = time.perf_counter()
+    results = await asyncio.gather(*(login(password, hashed) for _ in range(logins)))
+    elapsed = time.perf_counter() - started_at
+    stop.set()
+    await ticker
+    assert all(results)
+    return {
+        "logins_per_second": round(logins / elapsed, 1),
+        "total_seconds": round(elapsed, 3),
+        "max_loop_stall_ms": round(max(stalls, default=0.0) * 1000, 1)
+    }
+
+async def main(logins: int, rounds: int):
+    password = b"correct horse battery staple"
+    hashed = bcrypt.hashpw(password, bcrypt.gensalt(rounds))
+    print(f"{logins} concurrent logins, bcrypt cost {rounds}, {passwords.BCRYPT_WORKERS} workers")
+    print("inline:  ", await run(inline_login, logins, password, hashed))
+    print("executor:", await run(executor_login, logins, password, hashed))
+    passwords.shutdown_password_executor()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark bcrypt login throughput")
+    parser.add_argument("--logins", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=passwords.BCRYPT_ROUNDS)
+    parser.add_argument("--workers", type=int, default=passwords.BCRYPT_WORKERS)
+    args = parser.parse_args()
+    passwords.BCRYPT_WORKERS = args.workers
+    asyncio.run(main(args.logins, args.rounds))
@@ -0,0 +1,99 @@
+"""Benchmark OCR speed and accuracy with and without preprocessing.
+
+Point it at a directory of receipt photos. When a `<name>.txt` file sits next
+to `<name>.jpg`, its content is used as the expected text and the similarity
+of each OCR variant to it is reported.
+
+Usage (from the server directory):
+    python -m app.scripts.bench_ocr path/to/receipts [--repeat 3] [--dpi 300] [--psm 6]
+"""
+from PIL import Image
+from app.utils.preprocess import preprocess_image, tesseract_config
+import argparse
+import difflib
+import pathlib
+import pytesseract
+import time
+
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".webp", ".tif", ".tiff", ".bmp"}
+
+"""Time one OCR variant on an image
+
+Args:
+    path (Path): The image to read
+    repeat (int): How many times to run OCR, the best time is kept
+    preprocess (dict, optional): Keyword arguments for preprocess_image, None to skip it
+    config (str): The Tesseract config string
+
+Returns:
+    tuple: The best time in seconds and the extracted text
+"""
+def time_variant(path: pathlib.Path, repeat: int, preprocess: dict = None, config: str = ""):
+    best = None
+    text = ""
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        image = Image.open(path)
+        if preprocess is not None:
+            image = preprocess_image(image, **preprocess)
+        text = pytesseract.image_to_string(image, config=config)
+        elapsed = time.perf_counter() - started_at
+        best = elapsed if best is None else min(best, elapsed)
+    return best, text
+
+"""Score extracted text against the expected text
+
+Args:
+    text (str): The OCR output
+    expected (str): The expected text, or None
+
+Returns:
+    float: A similarity ratio between 0 and 1, or None when nothing is expected
+"""
+def similarity(text: str, expected: str):
+    if expected is None:
+        return None
+    normalize = lambda value: " ".join(value.lower().split())
+    return difflib.SequenceMatcher(None, normalize(text), normalize(expected)).ratio()
+
+def main(directory: str, repeat: int, dpi: int, psm: int):
+    variants = {
+        "raw": (None, ""),
+        "preprocessed": ({"target_dpi": dpi}, tesseract_config(psm=psm, whitelist="")),
+        "preprocessed+whitelist": ({"target_dpi": dpi}, tesseract_config(psm=psm)),
+    }
+    totals = {name: {"seconds": 0.0, "similarity": [], "images": 0} for name in variants}
+
+    paths = sorted(path for path in pathlib.Path(directory).iterdir() if path.suffix.lower() in IMAGE_SUFFIXES)
+    for path in paths:
+        expected_path = path.with_suffix(".txt")
+        expected = expected_path.read_text() if expected_path.exists() else None
+        row = [path.name]
+        for name, (preprocess, config) in variants.items():
+            seconds, text = time_variant(path, repeat, preprocess, config)
+            score = similarity(text, expected)
+            totals[name]["seconds"] += seconds
+            totals[name]["images"] += 1
+            if score is not None:
+                totals[name]["similarity"].append(score)
+            row.append(f"{name}={seconds * 1000:.0f}ms" + (f"/{score:.2f}" if score is not None else ""))
+        print("  ".join(row))
+
+    print()
+    print(f"{'variant':<24}{'avg ms':>10}{'avg similarity':>16}")
+    for name, total in totals.items():
+        if not total["images"]:
+            continue
+        average_ms = total["seconds"] / total["images"] * 1000
+        scores = total["similarity"]
+        average_score = f"{sum(scores) / len(scores):.3f}" if scores else "n/a"
+        print(f"{name:<24}{average_ms:>10.0f}{average_score:>16}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark OCR preprocessing on sample receipts")
+    parser.add_argument("directory")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--dpi", type=int, default=300)
+    parser.add_argument("--psm", type=int, default=6)
+    args = parser.parse_args()
+    main(args.directory, args.repeat, args.dpi, args.psm)
@@ -0,0 +1,69 @@
+"""A stand-in for the LLM host, for exercising the API without a model.
+
+It answers POST /prompt like the real host: a JSON list holding one
+generated_text. When the request has "stream": true, the text is sent as
+server-sent events, one word at a time (or as chunked plain text with
+--plain), to exercise GET /insights/stream.
+
+Usage (from the server directory):
+    python -m app.scripts.fake_llm [--port 8888] [--delay 0.05] [--plain]
+
+then start the API with LLM_HOST=127.0.0.1 LLM_PORT=8888.
+"""
+from aiohttp import web
+import argparse
+import asyncio
+import json
+import re
+
+RECEIPT_RESPONSE = '{"expense-type": "needs", "date": "2024-10-05", "total": "12.34", "expense-name": "Groceries"}'
+INSIGHTS_RESPONSE = (
+    "You spent most of your money on needs this month, which is great! "
+    "Try to put a little more into savings each week, even a few dollars adds up. "
+    "Before buying a want, wait a day and see if you still want it."
+)
+
+def build_app(delay: float, plain: bool):
+    async def prompt(request):
+        body = await request.json()
+        prompt_text = body.get("prompt", "")
+        if "Receipts:" in prompt_text:
+            count = len(re.findall(r"^Receipt \d+:", prompt_text, re.MULTILINE))
+            text = "[" + ", ".join([RECEIPT_RESPONSE] * max(1, count)) + "]"
+        elif "Receipt data:" in prompt_text:
+            text = RECEIPT_RESPONSE
+        else:
+            text = INSIGHTS_RESPONSE
+
+        if not body.get("stream"):
+            await asyncio.sleep(delay * len(text.split()))
+            return web.json_response([{"generated_text": text}])
+
+        response = web.StreamResponse(headers={
+            "Content-Type": "text/plain; charset=utf-8" if plain else "text/event-stream"
+        })
+        await response.prepare(request)
+        for index, word in enumerate(text.split(" ")):
+            token = word if index == 0 else " " + word
+            await asyncio.sleep(delay)
+            if plain:
+                await response.write(token.encode("utf-8"))
+            else:
+                await response.write(f"data: {json.dumps({'token': token})}\n\n".encode("utf-8"))
+        if not plain:
+            await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    app = web.Application()
+    app.router.add_post("/prompt", prompt)
+    return app
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a fake LLM host")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8888)
+    parser.add_argument("--delay", type=float, default=0.05, help="Seconds per generated word")
+    parser.add_argument("--plain", action="store_true", help="Stream chunked plain text instead of SSE")
+    args = parser.parse_args()
+    web.run_app(build_app(args.delay, args.plain), host=args.host, port=args.port)
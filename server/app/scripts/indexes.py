@@ -0,0 +1,44 @@
+"""Create, verify and explain the indexes the API relies on.
+
+Usage (from the server directory):
+    python -m app.scripts.indexes create
+    python -m app.scripts.indexes verify
+    python -m app.scripts.indexes explain [--user EMAIL]
+
+verify exits with status 1 when an index is missing; explain exits with
+status 1 when a hot query falls back to a collection scan.
+"""
+from app.db import db
+from app.utils.indexes import ensure_indexes, verify_indexes, explain_hot_queries
+import argparse
+import asyncio
+import json
+import sys
+
+async def main(command: str, email: str = None):
+    if command == "create":
+        result = await ensure_indexes()
+        print(json.dumps(result, indent=2))
+        return 1 if result["failed"] else 0
+
+    if command == "verify":
+        problems = await verify_indexes()
+        print(json.dumps(problems, indent=2))
+        return 1 if problems else 0
+
+    if email is None:
+        user = await db.users.find_one({}, {"email": 1})
+        if user is None:
+            print("No users to explain queries for; pass --user")
+            return 1
+        email = user["email"]
+    reports = await explain_hot_queries(email)
+    print(json.dumps(reports, indent=2))
+    return 1 if any(report["collection_scan"] for report in reports) else 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the API's Mongo indexes")
+    parser.add_argument("command", choices=["create", "verify", "explain"])
+    parser.add_argument("--user", default=None, help="The user to explain the hot queries for")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args.command, args.user)))
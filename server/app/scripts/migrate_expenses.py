@@ -0,0 +1,95 @@
+"""Move embedded `users.expenses` arrays into the `expenses` collection.
+
+The migration is safe to run while the API is serving traffic: each expense is
+upserted by its `_id` (so re-running is idempotent) and only the ids that were
+copied are pulled from the user document afterwards. The user's spending
+rollups are rebuilt once their expenses have moved.
+
+Usage (from the server directory):
+    python -m app.scripts.migrate_expenses [--batch-size 500] [--dry-run]
+"""
+from bson import ObjectId
+from pymongo import UpdateOne
+from app.db import db
+from app.utils.indexes import ensure_indexes
+from app.utils.rollups import rebuild_rollups
+import argparse
+import asyncio
+
+"""Migrate the embedded expenses of a single user
+
+Args:
+    user (dict): The user document, projected to email and expenses
+    batch_size (int): The number of expenses written per bulk_write
+    dry_run (bool): Only count the expenses that would be moved
+
+Returns:
+    int: The number of expenses moved
+"""
+async def migrate_user(user: dict, batch_size: int, dry_run: bool = False):
+    embedded = user.get("expenses") or []
+    moved = 0
+    for start in range(0, len(embedded), batch_size):
+        batch = embedded[start:start + batch_size]
+        operations = []
+        ids = []
+        without_ids = []
+        for expense in batch:
+            document = dict(expense)
+            if "_id" in expense:
+                ids.append(expense["_id"])
+            else:
+                without_ids.append(expense)
+            document["_id"] = str(expense.get("_id") or ObjectId())
+            document["user"] = user["email"]
+            operations.append(UpdateOne({"_id": document["_id"]}, {"$setOnInsert": document}, upsert=True))
+
+        if not dry_run:
+            await db.expenses.bulk_write(operations, ordered=False)
+            # Only pull what was copied, so expenses pushed meanwhile are kept
+            if ids:
+                await db.users.update_one(
+                    {"_id": user["_id"]},
+                    {"$pull": {"expenses": {"_id": {"$in": ids}}}}
+                )
+            if without_ids:
+                await db.users.update_one(
+                    {"_id": user["_id"]},
+                    {"$pullAll": {"expenses": without_ids}}
+                )
+        moved += len(batch)
+    if moved and not dry_run:
+        await rebuild_rollups(user["email"])
+    return moved
+
+"""Migrate every user that still has embedded expenses
+
+Args:
+    batch_size (int): The number of expenses written per bulk_write
+    dry_run (bool): Only count the expenses that would be moved
+
+Returns:
+    dict: The number of users and expenses migrated
+"""
+async def migrate(batch_size: int = 500, dry_run: bool = False):
+    await ensure_indexes()
+    users = 0
+    expenses = 0
+    cursor = db.users.find(
+        {"expenses.0": {"$exists": True}},
+        {"email": 1, "expenses": 1}
+    )
+    async for user in cursor:
+        expenses += await migrate_user(user, batch_size, dry_run)
+        users += 1
+    if not dry_run:
+        # Drop the now-empty arrays so user documents stay small
+        await db.users.update_many({"expenses": {"$size": 0}}, {"$unset": {"expenses": ""}})
+    return {"users": users, "expenses": expenses, "dry_run": dry_run}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move embedded user expenses into the expenses collection")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+    print(asyncio.run(migrate(args.batch_size, args.dry_run)))
@@ -0,0 +1,33 @@
+"""Verify or rebuild the materialized expense rollups.
+
+Usage (from the server directory):
+    python -m app.scripts.rollups verify [--user EMAIL]
+    python -m app.scripts.rollups rebuild [--user EMAIL]
+
+verify exits with status 1 when any rollup drifts from the expenses.
+"""
+from app.utils.rollups import verify_rollups, rebuild_rollups
+from app.utils.indexes import ensure_indexes
+import argparse
+import asyncio
+import json
+import sys
+
+async def main(command: str, email: str = None):
+    await ensure_indexes()
+    if command == "rebuild":
+        print(json.dumps(await rebuild_rollups(email)))
+        return 0
+
+    drift = await verify_rollups(email)
+    for entry in drift:
+        print(json.dumps(entry))
+    print(json.dumps({"drifting": len(drift)}))
+    return 1 if drift else 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Verify or rebuild the expense rollups")
+    parser.add_argument("command", choices=["verify", "rebuild"])
+    parser.add_argument("--user", default=None, help="Only process this user's rollups")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args.command, args.user)))
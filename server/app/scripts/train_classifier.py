@@ -0,0 +1,42 @@
+"""Train the local expense classifier from users' labelled expenses.
+
+Usage (from the server directory):
+    python -m app.scripts.train_classifier [--output expense_classifier.json] [--min-merchant-count 3]
+
+Restart the API (or call set_model) to pick up the new model.
+"""
+from app.db import db
+from app.utils.classifier import fit, save_model, CLASSIFIER_MODEL_PATH
+import argparse
+import asyncio
+import json
+
+# Expenses whose type was inferred by the classifier are left out, so the
+# model doesn't learn from its own guesses. Older expenses have no source
+# and were always labelled by hand.
+TRAINING_FILTER = {"expense-type-source": {"$ne": "auto"}}
+
+async def load_samples():
+    samples = []
+    cursor = db.expenses.find(TRAINING_FILTER, {"_id": 0, "expense-name": 1, "expense-type": 1})
+    async for expense in cursor:
+        samples.append((expense.get("expense-name", ""), expense.get("expense-type")))
+    return samples
+
+async def main(output: str, min_merchant_count: int):
+    model = fit(await load_samples(), min_merchant_count=min_merchant_count)
+    save_model(model, output)
+    print(json.dumps({
+        "output": output,
+        "samples": model["samples"],
+        "classes": model["classes"],
+        "merchants": len(model["merchants"]),
+        "vocabulary_size": model["vocabulary_size"]
+    }))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the expense classifier")
+    parser.add_argument("--output", default=CLASSIFIER_MODEL_PATH)
+    parser.add_argument("--min-merchant-count", type=int, default=3)
+    args = parser.parse_args()
+    asyncio.run(main(args.output, args.min_merchant_count))
@@ -1,13 +1,15 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from app.models.user import User, TokenData, Expense
-from app.db import db
+from app.models.user import User, TokenData
+from app.utils.users import find_user
+from app.utils.cache import TTLCache
 from datetime import datetime, timedelta
 import jwt as pyjwt
+import hashlib
 import os
+import time
 import logging
 
-logging.basicConfig(level=logging.WARNING)
 logger = logging.getLogger(__name__)
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
@@ -16,6 +18,25 @@ SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES"))
 
+# CONSTANT: Size of the verified token cache, and the longest a verification is reused
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+TOKEN_CACHE_TTL_SECONDS = float(os.getenv("TOKEN_CACHE_TTL_SECONDS", "300"))
+
+# CONSTANT: The response of every authentication failure
+CREDENTIALS_DETAIL = "Could not validate credentials"
+CREDENTIALS_HEADERS = {"WWW-Authenticate": "Bearer"}
+
+class CredentialsException(HTTPException):
+    """The 401 raised when a token can't be validated; a fresh one per failure."""
+    def __init__(self):
+        super().__init__(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=CREDENTIALS_DETAIL,
+            headers=dict(CREDENTIALS_HEADERS),
+        )
+
+token_cache = TTLCache(TOKEN_CACHE_SIZE, TOKEN_CACHE_TTL_SECONDS)
+
 """Create a JWT access token for a given user
 
 Args:
@@ -35,8 +56,84 @@ def create_access_token(data: dict, expires_delta: timedelta = None):
     encoded_jwt = pyjwt.encode(to_encode, str(SECRET_KEY), algorithm=ALGORITHM)
     return encoded_jwt
 
+"""Get the digest a token is cached under
+
+Args:
+    token (str): The JWT access token
+
+Returns:
+    str: The SHA-256 hex digest of the token
+"""
+def token_digest(token: str):
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+"""Verify a JWT access token, reusing earlier verifications
+
+A verified token's claims are cached by digest until the token expires
+(at most TOKEN_CACHE_TTL_SECONDS), so repeat requests skip the signature
+check. Invalid tokens are never cached.
+
+Args:
+    token (str): The JWT access token
+
+Returns:
+    dict: The token claims
+"""
+def verify_token(token: str):
+    key = token_digest(token)
+    claims = token_cache.get(key)
+    if claims is not None:
+        return claims
+
+    try:
+        claims = pyjwt.decode(token, str(SECRET_KEY), algorithms=[ALGORITHM])
+    except pyjwt.PyJWTError as e:
+        logger.warning("JWT decode error: %s", e)
+        raise CredentialsException()
+    if claims.get("sub") is None:
+        raise CredentialsException()
+
+    ttl = TOKEN_CACHE_TTL_SECONDS
+    if "exp" in claims:
+        ttl = min(ttl, claims["exp"] - time.time())
+    if ttl > 0:
+        token_cache.set(key, claims, ttl=ttl)
+    return claims
+
+"""Get the token epoch of a set of claims
+
+Tokens issued before epochs existed carry none and count as epoch 0.
+
+Args:
+    claims (dict): The token claims
+
+Returns:
+    int: The token epoch
+"""
+def token_epoch(claims: dict):
+    return claims.get("ep", 0)
+
+"""Check a token against the user's current token epoch
+
+Args:
+    claims (dict): The token claims
+    user (dict): The user document
+
+Returns:
+    bool: Whether the token was issued after the user's last password change
+"""
+def token_is_current(claims: dict, user: dict):
+    return token_epoch(claims) == user.get("token_epoch", 0)
+
 """Get the current user from the JWT access token
 
+The user document comes from the request identity map or the user cache
+when possible; expenses are loaded by the endpoints that need them from the
+expenses collection. Tokens issued before the user's last password change
+(an older token epoch) are rejected; the epoch lives on the user document,
+so every process sees a revocation once its cached copy is invalidated or
+expires.
+
 Args:
     token (str): The JWT access token
 
@@ -45,54 +142,24 @@ Returns:
 """
 async def get_current_user(token: str = Depends(oauth2_scheme)):
     try:
-        credentials_exception = HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Could not validate credentials",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-        try:
-            payload = pyjwt.decode(token, str(SECRET_KEY), algorithms=[ALGORITHM])
-            email: str = payload.get("sub")
-            if email is None:
-                raise credentials_exception
-            token_data = TokenData(email=email)
-        except pyjwt.PyJWTError as e:
-            logger.error(f"JWT decode error: {str(e)}")
-            raise credentials_exception
-
-        user = await db.users.find_one({"email": token_data.email})
+        claims = verify_token(token)
+        user = await find_user(claims["sub"])
         if user is None:
-            logger.error(f"User not found for email: {token_data.email}")
-            raise credentials_exception
-        
-        # Convert the expenses to the correct format
-        expenses = []
-        for expense in user.get("expenses", []):
-            try:
-                expense_date = datetime.fromisoformat(expense.get('expenseDate')).date()
-                expense_amount = float(expense.get('expenseAmount', 0))
-                expenses.append(Expense(
-                    expense_type=expense.get('expense-type', ''),
-                    date=expense_date,
-                    total=expense_amount,
-                    expense_name=expense.get('expenseName', '')
-                ))
-            except Exception as e:
-                logger.warning(f"Error processing expense: {str(e)}")
-                logger.warning(f"Problematic expense data: {expense}")
-                continue
-        
-        logger.info(f"Processed {len(expenses)} valid expenses for user {email}")
+            logger.error(f"User not found for email: {claims['sub']}")
+            raise CredentialsException()
+        if not token_is_current(claims, user):
+            raise CredentialsException()
         
         return User(
             first_name=user.get("first_name", ""),
             last_name=user.get("last_name", ""),
             email=user["email"],
-            expenses=expenses,
             level=user.get("level", 1),
             coins=user.get("coins", 0),
             budget=user.get("budget", 0.0)
         )
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Unexpected error in get_current_user: {str(e)}")
-        raise HTTPException(status_code=500, detail="Internal server error")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="Internal server error")
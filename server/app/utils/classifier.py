@@ -0,0 +1,201 @@
+from collections import Counter, defaultdict
+from dotenv import load_dotenv
+from app.models.user import EXPENSE_TYPES
+import json
+import math
+import os
+import re
+
+load_dotenv()
+
+# CONSTANT: Where the trained model is read from; written by app.scripts.train_classifier
+CLASSIFIER_MODEL_PATH = os.getenv("CLASSIFIER_MODEL_PATH", "expense_classifier.json")
+# Predictions below this probability are not trusted
+CLASSIFIER_MIN_CONFIDENCE = float(os.getenv("CLASSIFIER_MIN_CONFIDENCE", "0.7"))
+
+# Well-known merchants, used even before a model has been trained. A name
+# matches when it is the merchant or starts with it, so keys that are also
+# common words or parts of other names ("bell", "shell", "a w") are left out.
+MERCHANT_CATEGORIES = {
+    "walmart": "needs", "costco": "needs", "safeway": "needs", "kroger": "needs",
+    "save on foods": "needs", "no frills": "needs", "loblaws": "needs", "superstore": "needs",
+    "t t supermarket": "needs", "shoppers drug mart": "needs", "london drugs": "needs",
+    "walgreens": "needs", "cvs": "needs", "whole foods": "needs", "trader joes": "needs",
+    "starbucks": "wants", "tim hortons": "wants", "mcdonalds": "wants", "subway": "wants",
+    "cineplex": "wants", "amc": "wants", "netflix": "wants",
+    "spotify": "wants", "best buy": "wants", "eb games": "wants", "gamestop": "wants",
+    "esso": "savings", "chevron": "savings", "petro canada": "savings",
+    "bc hydro": "savings", "fortisbc": "savings", "telus": "savings", "rogers": "savings",
+    "shaw communications": "savings", "bell canada": "savings",
+}
+
+TOKEN_PATTERN = re.compile(r"[a-z]{2,}")
+
+"""Normalize a merchant or expense name for dictionary lookups
+
+Args:
+    name (str): The merchant or expense name
+
+Returns:
+    str: The lowercase name with punctuation collapsed to single spaces
+"""
+def normalize_name(name: str):
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", name.lower().replace("'", "")).split())
+
+"""Split a name into model tokens
+
+Args:
+    name (str): The merchant or expense name
+
+Returns:
+    list: The tokens
+"""
+def tokenize(name: str):
+    return TOKEN_PATTERN.findall(name.lower().replace("'", ""))
+
+"""Train a classifier from labelled expense names
+
+Names that are consistently labelled the same way become merchant
+dictionary entries; every name also feeds a multinomial naive Bayes model
+over its tokens.
+
+Args:
+    samples (iterable): (expense name, expense type) pairs
+    min_merchant_count (int): How often a name must appear to enter the dictionary
+    min_merchant_agreement (float): The share of its labels that must agree
+
+Returns:
+    dict: The serializable model
+"""
+def fit(samples, min_merchant_count: int = 3, min_merchant_agreement: float = 0.9):
+    class_counts = Counter()
+    token_counts = defaultdict(Counter)
+    name_labels = defaultdict(Counter)
+
+    for name, expense_type in samples:
+        if expense_type not in EXPENSE_TYPES or not name:
+            continue
+        class_counts[expense_type] += 1
+        token_counts[expense_type].update(tokenize(name))
+        name_labels[normalize_name(name)][expense_type] += 1
+
+    merchants = {}
+    for name, labels in name_labels.items():
+        label, count = labels.most_common(1)[0]
+        total = sum(labels.values())
+        if total >= min_merchant_count and count / total >= min_merchant_agreement:
+            merchants[name] = label
+
+    vocabulary = set()
+    for counts in token_counts.values():
+        vocabulary.update(counts)
+
+    return {
+        "classes": dict(class_counts),
+        "tokens": {expense_type: dict(counts) for expense_type, counts in token_counts.items()},
+        "token_totals": {expense_type: sum(counts.values()) for expense_type, counts in token_counts.items()},
+        "vocabulary_size": len(vocabulary),
+        "merchants": merchants,
+        "samples": sum(class_counts.values())
+    }
+
+"""Write a trained model to disk
+
+Args:
+    model (dict): The model returned by fit
+    path (str): Where to write it
+
+Returns:
+    None
+"""
+def save_model(model: dict, path: str = CLASSIFIER_MODEL_PATH):
+    with open(path, "w") as file:
+        json.dump(model, file)
+
+"""Read the trained model from disk
+
+Args:
+    path (str): The model file
+
+Returns:
+    dict: The model, or None when it hasn't been trained yet
+"""
+def load_model(path: str = CLASSIFIER_MODEL_PATH):
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return None
+
+_model = load_model()
+
+"""Swap in a freshly trained model without restarting
+
+Args:
+    model (dict): The model returned by fit or load_model
+
+Returns:
+    None
+"""
+def set_model(model: dict):
+    global _model
+    _model = model
+
+"""Classify an expense name as needs, wants or savings
+
+Args:
+    name (str): The merchant or expense name
+
+Returns:
+    tuple: The expense type and its probability, or (None, 0.0) when unknown
+"""
+def classify(name: str):
+    if not name:
+        return None, 0.0
+
+    normalized = normalize_name(name)
+    learned = (_model or {}).get("merchants", {})
+    if normalized in learned:
+        return learned[normalized], 1.0
+    if normalized in MERCHANT_CATEGORIES:
+        return MERCHANT_CATEGORIES[normalized], 1.0
+    for merchant, expense_type in MERCHANT_CATEGORIES.items():
+        # "starbucks coffee 1234" is Starbucks; "taco bell" is not Bell
+        if normalized.startswith(merchant + " "):
+            return expense_type, 0.95
+
+    if not _model or not _model.get("samples"):
+        return None, 0.0
+
+    vocabulary_size = _model["vocabulary_size"] or 1
+    tokens = [token for token in tokenize(name) if any(token in counts for counts in _model["tokens"].values())]
+    if not tokens:
+        return None, 0.0
+
+    scores = {}
+    for expense_type, class_count in _model["classes"].items():
+        counts = _model["tokens"].get(expense_type, {})
+        denominator = _model["token_totals"].get(expense_type, 0) + vocabulary_size
+        score = math.log(class_count / _model["samples"])
+        for token in tokens:
+            score += math.log((counts.get(token, 0) + 1) / denominator)
+        scores[expense_type] = score
+
+    best = max(scores, key=scores.get)
+    normalizer = sum(math.exp(score - scores[best]) for score in scores.values())
+    return best, 1 / normalizer
+
+"""Pick an expense type for a name, falling back when the classifier is unsure
+
+Args:
+    name (str): The merchant or expense name
+    default (str, optional): The type returned when the classifier is unsure
+
+Returns:
+    str: The expense type, or default
+"""
+def suggest_expense_type(name: str, default: str = None):
+    expense_type, confidence = classify(name)
+    if expense_type and confidence >= CLASSIFIER_MIN_CONFIDENCE:
+        return expense_type
+    return default
@@ -0,0 +1,194 @@
+from app.models.user import ExpenseCreate
+from datetime import date
+from dotenv import load_dotenv
+from pydantic import ValidationError
+import codecs
+import csv
+import io
+import json
+import os
+import re
+
+load_dotenv()
+
+# CONSTANT: Formats accepted by POST /expenses/bulk and GET /expenses/export
+EXPENSE_IO_FORMATS = ["csv", "ndjson"]
+
+# CONSTANT: Columns written by the export, in order; the import reads the same header
+EXPENSE_EXPORT_FIELDS = ["_id", "expense-type", "expenseDate", "expenseTotal", "expense-name"]
+
+# CONSTANT: Media types of the formats
+EXPENSE_IO_MEDIA_TYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+# CONSTANT: The longest import line, in characters; longer lines are rejected as row errors
+EXPENSE_IMPORT_MAX_LINE_LENGTH = int(os.getenv("EXPENSE_IMPORT_MAX_LINE_LENGTH", "8192"))
+
+# CONSTANT: expenseDate must start with an ISO date; the rollups group by its first 7 characters
+EXPENSE_DATE_PATTERN = re.compile(r"^(\d{4}-\d{2}-\d{2})(?:[T ].*)?$")
+
+"""Pick the format of an import body
+
+Args:
+    requested (str, optional): The format query parameter
+    content_type (str, optional): The Content-Type of the request
+
+Returns:
+    str: csv or ndjson, None if it can't be told
+"""
+def detect_format(requested: str = None, content_type: str = None):
+    if requested:
+        return requested if requested in EXPENSE_IO_FORMATS else None
+    content_type = (content_type or "").split(";")[0].strip().lower()
+    for name, media_type in EXPENSE_IO_MEDIA_TYPES.items():
+        if content_type == media_type:
+            return name
+    if content_type in ("application/json", "application/jsonl"):
+        return "ndjson"
+    return None
+
+"""Split a streamed body into lines without buffering it
+
+A line longer than max_length is dropped as it arrives, so a body without
+newlines can't be buffered whole.
+
+Args:
+    chunks (AsyncIterator[bytes]): The request body
+    max_length (int): The longest line kept, in characters
+
+Yields:
+    str: Each line, without its line ending, or None in place of a line that was too long
+"""
+async def iter_lines(chunks, max_length: int = None):
+    max_length = max_length or EXPENSE_IMPORT_MAX_LINE_LENGTH
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    pending = ""
+    skipping = False
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        lines = pending.split("\n")
+        pending = lines.pop()
+        for line in lines:
+            if skipping:
+                # The end of a line already reported as too long
+                skipping = False
+                continue
+            line = line.rstrip("\r")
+            yield line if len(line) <= max_length else None
+        if len(pending) > max_length:
+            if not skipping:
+                yield None
+                skipping = True
+            pending = ""
+    pending += decoder.decode(b"", final=True)
+    if pending and not skipping:
+        pending = pending.rstrip("\r")
+        yield pending if len(pending) <= max_length else None
+
+"""Parse the rows of a streamed CSV or NDJSON body
+
+CSV bodies start with a header row naming the columns. Blank lines are
+skipped; quoted CSV fields can't span lines. Lines longer than
+EXPENSE_IMPORT_MAX_LINE_LENGTH are row errors, and a CSV header that long
+ends the import.
+
+Args:
+    chunks (AsyncIterator[bytes]): The request body
+    format (str): csv or ndjson
+
+Yields:
+    tuple: The 1-based row number and the row dict, or the row number and an error message
+"""
+async def parse_rows(chunks, format: str):
+    header = None
+    row_number = 0
+    async for line in iter_lines(chunks):
+        if line is None:
+            if format == "csv" and header is None:
+                yield 0, f"header row longer than {EXPENSE_IMPORT_MAX_LINE_LENGTH} characters"
+                return
+            row_number += 1
+            yield row_number, f"line longer than {EXPENSE_IMPORT_MAX_LINE_LENGTH} characters"
+            continue
+        if not line.strip():
+            continue
+        if format == "csv":
+            values = next(csv.reader([line]))
+            if header is None:
+                header = [value.strip() for value in values]
+                continue
+            row_number += 1
+            if len(values) != len(header):
+                yield row_number, f"expected {len(header)} columns, got {len(values)}"
+                continue
+            yield row_number, dict(zip(header, values))
+        else:
+            row_number += 1
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield row_number, f"invalid JSON: {e.msg}"
+                continue
+            if not isinstance(row, dict):
+                yield row_number, "expected a JSON object"
+                continue
+            yield row_number, row
+
+"""Validate an imported row with ExpenseCreate
+
+Args:
+    row (dict): The parsed row
+
+Returns:
+    tuple: The expense dict (by alias) and the optional _id, or None and an error message
+"""
+def validate_row(row: dict):
+    row = {key: value for key, value in row.items() if value != ""}
+    expense_id = row.pop("_id", None)
+    if expense_id is not None and not isinstance(expense_id, str):
+        return None, "_id must be a string"
+    try:
+        expense = ExpenseCreate(**row)
+    except ValidationError as e:
+        return None, "; ".join(f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in e.errors())
+    if not is_iso_date(expense.expenseDate):
+        return None, "expenseDate: expected an ISO date (YYYY-MM-DD)"
+    return (expense.dict(by_alias=True), expense_id), None
+
+"""Check that an expense date starts with a real ISO calendar date
+
+Args:
+    value (str): The expenseDate, e.g. "2024-10-05" or "2024-10-05T12:30:00"
+
+Returns:
+    bool: True when the date is valid
+"""
+def is_iso_date(value: str):
+    match = EXPENSE_DATE_PATTERN.match(value)
+    if not match:
+        return False
+    try:
+        date.fromisoformat(match.group(1))
+    except ValueError:
+        return False
+    return True
+
+"""Format exported expenses
+
+Args:
+    expenses (list): The expense documents
+    format (str): csv or ndjson
+    header (bool): Whether to start with the CSV header row
+
+Returns:
+    str: The formatted rows
+"""
+def format_rows(expenses: list, format: str, header: bool = False):
+    if format == "ndjson":
+        return "".join(json.dumps({field: expense.get(field) for field in EXPENSE_EXPORT_FIELDS}) + "\n" for expense in expenses)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    if header:
+        writer.writerow(EXPENSE_EXPORT_FIELDS)
+    for expense in expenses:
+        writer.writerow([expense.get(field, "") for field in EXPENSE_EXPORT_FIELDS])
+    return buffer.getvalue()
@@ -0,0 +1,148 @@
+from pymongo.errors import OperationFailure
+from app.db import db
+from app.utils.receipt_cache import RECEIPT_CACHE_BACKEND, RECEIPT_CACHE_TTL_SECONDS
+from app.utils.jobs import OCR_JOB_BACKEND
+from datetime import date, timedelta
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Every index the application relies on, declared in one place.
+INDEXES = [
+    # Every authenticated request and login looks a user up by email
+    {"collection": "users", "keys": [("email", 1)], "name": "email_unique", "options": {"unique": True}},
+    # GET /expenses pages, date-range filters, summaries and insights
+    {"collection": "expenses", "keys": [("user", 1), ("expenseDate", -1), ("_id", -1)], "name": "user_expenseDate"},
+    # GET /expenses?expense-type=...
+    {"collection": "expenses", "keys": [("user", 1), ("expense-type", 1), ("expenseDate", -1)], "name": "user_expenseType"},
+    # Materialized spending totals, one document per (user, month, expense-type)
+    # with a deterministic _id, read by user and month range
+    {"collection": "expense_rollups", "keys": [("user", 1), ("month", 1)], "name": "user_month"},
+    # Off-peak insights precompute looks for stale entries
+    {"collection": "insights", "keys": [("stale", 1), ("next_attempt_at", 1)], "name": "stale_next_attempt"},
+]
+
+if RECEIPT_CACHE_BACKEND == "mongo":
+    INDEXES.append({"collection": "receipt_cache", "keys": [("created_at", 1)], "name": "created_at_ttl",
+                    "options": {"expireAfterSeconds": RECEIPT_CACHE_TTL_SECONDS}})
+
+if OCR_JOB_BACKEND == "mongo":
+    INDEXES += [
+        {"collection": "ocr_jobs", "keys": [("status", 1), ("available_at", 1)], "name": "status_available_at"},
+        {"collection": "ocr_jobs", "keys": [("expires_at", 1)], "name": "expires_at_ttl", "options": {"expireAfterSeconds": 0}},
+    ]
+
+"""Create every declared index
+
+Index creation is idempotent, so this runs on every startup. A failure
+(e.g. duplicate emails blocking the unique index) is logged and reported
+instead of stopping the API.
+
+Returns:
+    dict: The names of the created indexes and the ones that failed
+"""
+async def ensure_indexes():
+    created = []
+    failed = []
+    for index in INDEXES:
+        try:
+            await db[index["collection"]].create_index(index["keys"], name=index["name"], **index.get("options", {}))
+            created.append(f"{index['collection']}.{index['name']}")
+        except OperationFailure as e:
+            logger.error(f"Failed to create index {index['collection']}.{index['name']}: {e}")
+            failed.append({"index": f"{index['collection']}.{index['name']}", "error": str(e)})
+    return {"created": created, "failed": failed}
+
+"""Compare the declared indexes with the ones that exist
+
+Returns:
+    list: The declared indexes that are missing or have different keys
+"""
+async def verify_indexes():
+    problems = []
+    existing = {}
+    for index in INDEXES:
+        collection = index["collection"]
+        if collection not in existing:
+            existing[collection] = await db[collection].index_information()
+        found = existing[collection].get(index["name"])
+        if found is None:
+            problems.append({"index": f"{collection}.{index['name']}", "problem": "missing"})
+        elif [tuple(key) for key in found["key"]] != [tuple(key) for key in index["keys"]]:
+            problems.append({"index": f"{collection}.{index['name']}", "problem": f"keys differ: {found['key']}"})
+    return problems
+
+"""List the hot queries of app/controllers/user.py for a sample user
+
+Args:
+    email (str): The user to build the queries for
+
+Returns:
+    list: (name, collection, filter, sort, limit) tuples
+"""
+def hot_queries(email: str):
+    month_ago = (date.today() - timedelta(days=30)).isoformat()
+    return [
+        ("find_user / login", "users", {"email": email}, None, 1),
+        ("get_expenses", "expenses", {"user": email}, [("expenseDate", -1), ("_id", -1)], 101),
+        ("get_expenses by type and date", "expenses",
+         {"user": email, "expense-type": "needs", "expenseDate": {"$gte": month_ago}},
+         [("expenseDate", -1), ("_id", -1)], 101),
+        ("get_expense / update_expense / delete_expense", "expenses", {"_id": "000000000000000000000000", "user": email}, None, 1),
+        ("get_expense_summary / insights window", "expenses", {"user": email, "expenseDate": {"$gte": month_ago}}, None, 0),
+        ("get_rollups", "expense_rollups", {"user": email, "count": {"$gt": 0}}, [("month", 1)], 0),
+        ("get_cached_insights", "insights", {"_id": email, "stale": False}, None, 1),
+    ]
+
+"""Summarize an explain() result
+
+Args:
+    explain (dict): The output of Cursor.explain()
+
+Returns:
+    dict: The plan stages, indexes used and documents examined
+"""
+def summarize_plan(explain: dict):
+    winning = explain.get("queryPlanner", {}).get("winningPlan", {})
+    # Slot-based engine plans nest the classic plan under queryPlan
+    winning = winning.get("queryPlan", winning)
+    stages = []
+    indexes = []
+    nodes = [winning]
+    while nodes:
+        node = nodes.pop()
+        if "stage" in node:
+            stages.append(node["stage"])
+        if "indexName" in node:
+            indexes.append(node["indexName"])
+        if "inputStage" in node:
+            nodes.append(node["inputStage"])
+        nodes.extend(node.get("inputStages", []))
+    stats = explain.get("executionStats", {})
+    return {
+        "stages": stages,
+        "indexes": indexes,
+        "collection_scan": "COLLSCAN" in stages,
+        "keys_examined": stats.get("totalKeysExamined"),
+        "docs_examined": stats.get("totalDocsExamined"),
+        "returned": stats.get("nReturned")
+    }
+
+"""Explain the hot queries for a sample user
+
+Args:
+    email (str): The user to build the queries for
+
+Returns:
+    list: One plan summary per hot query
+"""
+async def explain_hot_queries(email: str):
+    reports = []
+    for name, collection, query, sort, limit in hot_queries(email):
+        cursor = db[collection].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        if limit:
+            cursor = cursor.limit(limit)
+        reports.append({"query": name, "collection": collection, **summarize_plan(await cursor.explain())})
+    return reports
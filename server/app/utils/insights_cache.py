@@ -0,0 +1,159 @@
+from datetime import datetime, timedelta, timezone
+from dotenv import load_dotenv
+from app.db import db
+import asyncio
+import hashlib
+import json
+import logging
+import os
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Optional off-peak refresh of stale insights, e.g. INSIGHTS_PRECOMPUTE_HOURS=2-5 (local time, end exclusive)
+INSIGHTS_PRECOMPUTE_HOURS = os.getenv("INSIGHTS_PRECOMPUTE_HOURS", "")
+INSIGHTS_PRECOMPUTE_INTERVAL_SECONDS = float(os.getenv("INSIGHTS_PRECOMPUTE_INTERVAL_SECONDS", "300"))
+INSIGHTS_PRECOMPUTE_BATCH = int(os.getenv("INSIGHTS_PRECOMPUTE_BATCH", "20"))
+# A user whose refresh fails is retried after an exponential backoff capped at this
+INSIGHTS_PRECOMPUTE_MAX_BACKOFF_SECONDS = float(os.getenv("INSIGHTS_PRECOMPUTE_MAX_BACKOFF_SECONDS", "86400"))
+
+"""Fingerprint the exact input the insights are generated from
+
+Args:
+    data (dict): The data passed to get_insights_data
+
+Returns:
+    str: The SHA-256 of the canonical JSON encoding of data
+"""
+def insights_fingerprint(data: dict):
+    encoded = json.dumps(data, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+"""Get the stored insights of a user if they were generated from the same input
+
+Args:
+    email (str): The user
+    fingerprint (str): The fingerprint of the current input
+
+Returns:
+    str: The insights, or None on a miss
+"""
+async def get_cached_insights(email: str, fingerprint: str):
+    document = await db.insights.find_one({"_id": email, "fingerprint": fingerprint, "stale": False})
+    return document["insights"] if document else None
+
+"""Store freshly generated insights
+
+Args:
+    email (str): The user
+    fingerprint (str): The fingerprint of the input they were generated from
+    insights (str): The generated text
+
+Returns:
+    None
+"""
+async def store_insights(email: str, fingerprint: str, insights: str):
+    await db.insights.update_one(
+        {"_id": email},
+        {"$set": {
+            "fingerprint": fingerprint,
+            "insights": insights,
+            "stale": False,
+            "generated_at": datetime.now(timezone.utc)
+        }, "$unset": {"refresh_attempts": "", "next_attempt_at": ""}},
+        upsert=True
+    )
+
+"""Mark a user's insights as stale after their expenses or budget changed
+
+Args:
+    email (str): The user
+
+Returns:
+    None
+"""
+async def invalidate_insights(email: str):
+    await db.insights.update_one({"_id": email}, {"$set": {"stale": True}})
+
+"""Check whether the current local hour is inside the precompute window
+
+Args:
+    now (datetime, optional): The time to check, defaults to now
+
+Returns:
+    bool: True if stale insights may be refreshed now
+"""
+def in_precompute_window(now: datetime = None):
+    if not INSIGHTS_PRECOMPUTE_HOURS:
+        return False
+    start, end = (int(hour) for hour in INSIGHTS_PRECOMPUTE_HOURS.split("-"))
+    hour = (now or datetime.now()).hour
+    return start <= hour < end if start <= end else hour >= start or hour < end
+
+"""Get how long to wait before retrying a failed precompute
+
+Args:
+    attempts (int): The number of failed attempts so far
+
+Returns:
+    float: The delay in seconds
+"""
+def precompute_retry_delay(attempts: int):
+    return min(INSIGHTS_PRECOMPUTE_INTERVAL_SECONDS * 2 ** max(0, attempts - 1), INSIGHTS_PRECOMPUTE_MAX_BACKOFF_SECONDS)
+
+"""Regenerate a batch of stale insights
+
+Users whose refresh failed are skipped until their next_attempt_at, and
+the batch is taken in next_attempt_at order, so failing users can't
+starve the others.
+
+Args:
+    refresh (callable): Regenerates and stores the insights of one user by email
+    limit (int): The most users refreshed in one batch
+
+Returns:
+    int: The number of users refreshed
+"""
+async def refresh_stale_insights(refresh, limit: int = INSIGHTS_PRECOMPUTE_BATCH):
+    refreshed = 0
+    now = datetime.now(timezone.utc)
+    due = {"stale": True, "$or": [{"next_attempt_at": None}, {"next_attempt_at": {"$lte": now}}]}
+    cursor = db.insights.find(due, {"_id": 1, "refresh_attempts": 1}).sort("next_attempt_at", 1).limit(limit)
+    async for document in cursor:
+        try:
+            await refresh(document["_id"])
+            refreshed += 1
+        except Exception as e:
+            attempts = document.get("refresh_attempts", 0) + 1
+            logger.warning("Failed to precompute insights for %s (attempt %d): %s", document["_id"], attempts, e)
+            await db.insights.update_one(
+                {"_id": document["_id"]},
+                {"$set": {
+                    "refresh_attempts": attempts,
+                    "next_attempt_at": now + timedelta(seconds=precompute_retry_delay(attempts))
+                }}
+            )
+    return refreshed
+
+"""Refresh stale insights during the configured off-peak hours, until cancelled
+
+A failing batch (e.g. Mongo unreachable) is logged and retried on the next
+interval instead of ending the task.
+
+Args:
+    refresh (callable): Regenerates and stores the insights of one user by email
+
+Returns:
+    None
+"""
+async def precompute_insights_loop(refresh):
+    while True:
+        try:
+            if in_precompute_window():
+                await refresh_stale_insights(refresh)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Insights precompute batch failed")
+        await asyncio.sleep(INSIGHTS_PRECOMPUTE_INTERVAL_SECONDS)
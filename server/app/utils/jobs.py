@@ -0,0 +1,324 @@
+from datetime import datetime, timedelta, timezone
+from dotenv import load_dotenv
+from pymongo import ReturnDocument
+from app.db import db
+import asyncio
+import logging
+import os
+import secrets
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# CONSTANT: Where OCR jobs are queued: "memory" (per process) or "mongo" (shared by every API process)
+OCR_JOB_BACKEND = os.getenv("OCR_JOB_BACKEND", "memory")
+OCR_JOB_WORKERS = int(os.getenv("OCR_JOB_WORKERS", "2"))
+OCR_JOB_MAX_ATTEMPTS = int(os.getenv("OCR_JOB_MAX_ATTEMPTS", "3"))
+OCR_JOB_RETRY_BACKOFF_SECONDS = float(os.getenv("OCR_JOB_RETRY_BACKOFF_SECONDS", "2"))
+# How long finished jobs stay readable, and how long a running job may hold its lease
+OCR_JOB_RESULT_TTL_SECONDS = int(os.getenv("OCR_JOB_RESULT_TTL_SECONDS", "3600"))
+OCR_JOB_LEASE_SECONDS = int(os.getenv("OCR_JOB_LEASE_SECONDS", "300"))
+OCR_JOB_POLL_SECONDS = float(os.getenv("OCR_JOB_POLL_SECONDS", "0.5"))
+
+TERMINAL_STATUSES = ("done", "dead")
+
+# CONSTANT: The job fields returned to clients
+PUBLIC_JOB_FIELDS = ("status", "attempts", "result", "error", "created_at", "updated_at")
+
+"""Build the client view of a job
+
+Args:
+    job (dict): The stored job
+
+Returns:
+    dict: The job id, status, attempts, result and error
+"""
+def public_job(job: dict):
+    view = {"job_id": job["_id"]}
+    for field in PUBLIC_JOB_FIELDS:
+        value = job.get(field)
+        view[field] = value.isoformat() if isinstance(value, datetime) else value
+    return view
+
+"""Build a new job document
+
+Args:
+    image_bytes (bytes): The uploaded image
+
+Returns:
+    dict: The job
+"""
+def new_job(image_bytes: bytes):
+    now = datetime.now(timezone.utc)
+    return {
+        "_id": secrets.token_urlsafe(16),
+        "status": "queued",
+        "attempts": 0,
+        "image": image_bytes,
+        "text": None,
+        "result": None,
+        "error": None,
+        "created_at": now,
+        "updated_at": now,
+        "available_at": now
+    }
+
+"""Compute when a failed job may run again
+
+Args:
+    attempts (int): The number of attempts made so far
+
+Returns:
+    timedelta: The delay before the next attempt
+"""
+def retry_delay(attempts: int):
+    return timedelta(seconds=OCR_JOB_RETRY_BACKOFF_SECONDS * 2 ** max(0, attempts - 1))
+
+class MemoryJobQueue:
+    """Jobs kept in this process; they are lost on restart."""
+    def __init__(self):
+        self.jobs = {}
+        self.dead_letters = {}
+        self._ready = asyncio.Queue()
+        self._changed = {}
+
+    async def enqueue(self, image_bytes: bytes):
+        job = new_job(image_bytes)
+        self.jobs[job["_id"]] = job
+        self._ready.put_nowait(job["_id"])
+        return job
+
+    async def get(self, job_id: str):
+        return self.jobs.get(job_id)
+
+    async def claim(self):
+        job_id = await self._ready.get()
+        job = self.jobs.get(job_id)
+        if job is None:
+            return None
+        self._update(job, status="running", attempts=job["attempts"] + 1, lease=secrets.token_urlsafe(8))
+        return dict(job)
+
+    async def save_text(self, job_id: str, text: str):
+        self._update(self.jobs[job_id], text=text, image=None)
+
+    async def complete(self, claimed: dict, result: dict):
+        job = self._leased(claimed)
+        if job is None:
+            return False
+        self._update(job, status="done", result=result, error=None, text=None, lease=None)
+        self._expire_later(job["_id"])
+        return True
+
+    async def fail(self, claimed: dict, error: str, retry: bool = True):
+        job = self._leased(claimed)
+        if job is None:
+            return False
+        if retry and job["attempts"] < OCR_JOB_MAX_ATTEMPTS:
+            delay = retry_delay(job["attempts"])
+            self._update(job, status="queued", error=error, lease=None, available_at=datetime.now(timezone.utc) + delay)
+            asyncio.get_running_loop().call_later(delay.total_seconds(), self._ready.put_nowait, job["_id"])
+        else:
+            self._update(job, status="dead", error=error, lease=None)
+            self.dead_letters[job["_id"]] = job
+            self._expire_later(job["_id"])
+        return True
+
+    async def wait(self, job_id: str, timeout: float):
+        event = self._changed.setdefault(job_id, asyncio.Event())
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        event.clear()
+
+    def _leased(self, claimed: dict):
+        job = self.jobs.get(claimed["_id"])
+        if job is None or job.get("lease") != claimed["lease"]:
+            return None
+        return job
+
+    def _update(self, job: dict, **changes):
+        job.update(changes, updated_at=datetime.now(timezone.utc))
+        event = self._changed.get(job["_id"])
+        if event is not None:
+            event.set()
+
+    def _expire_later(self, job_id: str):
+        def expire():
+            self.jobs.pop(job_id, None)
+            self.dead_letters.pop(job_id, None)
+            self._changed.pop(job_id, None)
+        asyncio.get_running_loop().call_later(OCR_JOB_RESULT_TTL_SECONDS, expire)
+
+class MongoJobQueue:
+    """Jobs stored in Mongo and claimed with find_one_and_update, so any API process can run them."""
+    def __init__(self, collection, dead_letter_collection):
+        self.collection = collection
+        self.dead_letters = dead_letter_collection
+
+    async def enqueue(self, image_bytes: bytes):
+        job = new_job(image_bytes)
+        await self.collection.insert_one(job)
+        return job
+
+    async def get(self, job_id: str):
+        return await self.collection.find_one({"_id": job_id}, {"image": 0, "text": 0})
+
+    async def claim(self):
+        while True:
+            now = datetime.now(timezone.utc)
+            await self._bury_expired(now)
+            job = await self.collection.find_one_and_update(
+                {"$or": [
+                    {"status": "queued", "available_at": {"$lte": now}},
+                    # A worker that died mid-job loses its lease
+                    {"status": "running", "lease_expires_at": {"$lte": now}, "attempts": {"$lt": OCR_JOB_MAX_ATTEMPTS}}
+                ]},
+                {
+                    "$set": {"status": "running", "updated_at": now, "lease": secrets.token_urlsafe(8),
+                             "lease_expires_at": now + timedelta(seconds=OCR_JOB_LEASE_SECONDS)},
+                    "$inc": {"attempts": 1}
+                },
+                sort=[("available_at", 1)],
+                return_document=ReturnDocument.AFTER
+            )
+            if job is not None:
+                return job
+            await asyncio.sleep(OCR_JOB_POLL_SECONDS)
+
+    async def _bury_expired(self, now: datetime):
+        # A job whose last allowed attempt lost its lease crashed every worker
+        # that ran it, so it goes to the dead letters instead of another claim
+        while True:
+            dead = await self.collection.find_one_and_update(
+                {"status": "running", "lease_expires_at": {"$lte": now}, "attempts": {"$gte": OCR_JOB_MAX_ATTEMPTS}},
+                self._dead_update(now, "lease expired on the last attempt"),
+                return_document=ReturnDocument.AFTER
+            )
+            if dead is None:
+                return
+            await self._dead_letter(dead)
+
+    async def save_text(self, job_id: str, text: str):
+        await self.collection.update_one({"_id": job_id}, {"$set": {"text": text}, "$unset": {"image": ""}})
+
+    # complete and fail only match the lease of the claim, so a worker whose
+    # lease expired can't overwrite the outcome of the job's new owner
+    async def complete(self, claimed: dict, result: dict):
+        now = datetime.now(timezone.utc)
+        updated = await self.collection.update_one(
+            {"_id": claimed["_id"], "lease": claimed["lease"]},
+            {
+                "$set": {"status": "done", "result": result, "error": None, "updated_at": now,
+                         "expires_at": now + timedelta(seconds=OCR_JOB_RESULT_TTL_SECONDS)},
+                "$unset": {"text": "", "image": "", "lease": "", "lease_expires_at": ""}
+            }
+        )
+        return updated.matched_count == 1
+
+    async def fail(self, claimed: dict, error: str, retry: bool = True):
+        now = datetime.now(timezone.utc)
+        owned = {"_id": claimed["_id"], "lease": claimed["lease"]}
+        if retry and claimed["attempts"] < OCR_JOB_MAX_ATTEMPTS:
+            updated = await self.collection.update_one(
+                owned,
+                {"$set": {"status": "queued", "error": error, "updated_at": now,
+                          "available_at": now + retry_delay(claimed["attempts"])},
+                 "$unset": {"lease": "", "lease_expires_at": ""}}
+            )
+            return updated.matched_count == 1
+
+        dead = await self.collection.find_one_and_update(
+            owned,
+            self._dead_update(now, error),
+            return_document=ReturnDocument.AFTER
+        )
+        if dead is None:
+            return False
+        await self._dead_letter(dead)
+        return True
+
+    def _dead_update(self, now: datetime, error: str):
+        return {
+            "$set": {"status": "dead", "error": error, "updated_at": now,
+                     "expires_at": now + timedelta(seconds=OCR_JOB_RESULT_TTL_SECONDS)},
+            "$unset": {"lease": "", "lease_expires_at": ""}
+        }
+
+    async def _dead_letter(self, dead: dict):
+        dead.pop("expires_at", None)
+        await self.dead_letters.replace_one({"_id": dead["_id"]}, dead, upsert=True)
+
+    async def wait(self, job_id: str, timeout: float):
+        await asyncio.sleep(timeout)
+
+"""Build the job queue for the configured backend
+
+Args:
+    backend (str): "memory" or "mongo"
+
+Returns:
+    MemoryJobQueue | MongoJobQueue: The job queue
+"""
+def build_job_queue(backend: str = OCR_JOB_BACKEND):
+    if backend == "mongo":
+        return MongoJobQueue(db.ocr_jobs, db.ocr_jobs_dead)
+    if backend == "memory":
+        return MemoryJobQueue()
+    raise ValueError(f"Unknown OCR_JOB_BACKEND: {backend}")
+
+job_queue = build_job_queue()
+_workers = []
+
+class PermanentJobError(Exception):
+    """Raised by a job handler when retrying can't help (e.g. the upload isn't an image)."""
+
+"""Run jobs from the queue until cancelled
+
+Args:
+    handler (callable): Processes a claimed job; raising marks the attempt as failed
+
+Returns:
+    None
+"""
+async def job_worker(handler):
+    while True:
+        job = await job_queue.claim()
+        if job is None:
+            continue
+        try:
+            if not await job_queue.complete(job, await handler(job)):
+                logger.warning("OCR job %s lost its lease before completing", job["_id"])
+        except asyncio.CancelledError:
+            raise
+        except PermanentJobError as e:
+            await job_queue.fail(job, str(e), retry=False)
+        except Exception as e:
+            logger.warning("OCR job %s attempt %s failed: %s", job["_id"], job["attempts"], e)
+            await job_queue.fail(job, str(e) or type(e).__name__)
+
+"""Start the background job workers
+
+Args:
+    handler (callable): Processes a claimed job
+    count (int): The number of workers
+
+Returns:
+    None
+"""
+def start_job_workers(handler, count: int = OCR_JOB_WORKERS):
+    for _ in range(count):
+        _workers.append(asyncio.create_task(job_worker(handler)))
+
+"""Stop the background job workers
+
+Returns:
+    None
+"""
+async def stop_job_workers():
+    for worker in _workers:
+        worker.cancel()
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _workers.clear()
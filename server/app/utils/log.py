@@ -0,0 +1,173 @@
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from dotenv import load_dotenv
+from logging.handlers import QueueHandler, QueueListener
+from starlette.datastructures import Headers, MutableHeaders
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import uuid
+
+load_dotenv()
+
+# CONSTANT: Root log level, and per-module overrides such as "app.utils.model=DEBUG,app.utils.auth=ERROR"
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+
+# CONSTANT: Fraction of DEBUG records kept; hot paths log at DEBUG and are sampled
+LOG_DEBUG_SAMPLE_RATE = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "0.1"))
+
+# CONSTANT: uvicorn's loggers, which it configures with their own stdout handlers
+UVICORN_LOGGERS = ("uvicorn", "uvicorn.error", "uvicorn.access")
+
+# Set per request by the request id middleware
+request_id: ContextVar[str | None] = ContextVar("request_id", default=None)
+
+_listener = None
+
+class JsonFormatter(logging.Formatter):
+    """Formats records as one JSON object per line."""
+    def format(self, record: logging.LogRecord):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+class RequestIdFilter(logging.Filter):
+    """Stamps records with the id of the request that logged them.
+
+    Runs on the QueueHandler, in the logging task, since the listener
+    thread can't see the request's context.
+    """
+    def filter(self, record: logging.LogRecord):
+        record.request_id = request_id.get()
+        return True
+
+class DebugSamplingFilter(logging.Filter):
+    """Keeps a fraction of DEBUG records and every record above DEBUG.
+
+    Args:
+        rate (float): The fraction of DEBUG records kept
+    """
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord):
+        return record.levelno > logging.DEBUG or random.random() < self.rate
+
+"""Parse per-module log levels
+
+Args:
+    spec (str): Comma separated logger=LEVEL pairs
+
+Returns:
+    dict: The level name for each logger
+"""
+def parse_log_levels(spec: str):
+    levels = {}
+    for item in spec.split(","):
+        name, _, level = item.partition("=")
+        if name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+"""Route all logging through a queue drained by a background thread
+
+Records are formatted as JSON lines and written to stdout by a
+QueueListener, so logging calls on the event loop only enqueue.
+uvicorn's own handlers are removed and its loggers propagate to the
+root, so access and error lines take the same path. Calling it again
+does nothing.
+
+Returns:
+    None
+"""
+def configure_logging():
+    global _listener
+    if _listener is not None:
+        return
+
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(JsonFormatter())
+    records = queue.SimpleQueue()
+    handler = QueueHandler(records)
+    handler.addFilter(RequestIdFilter())
+    handler.addFilter(DebugSamplingFilter(LOG_DEBUG_SAMPLE_RATE))
+
+    root = logging.getLogger()
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(LOG_LEVEL)
+    for name in UVICORN_LOGGERS:
+        uvicorn_logger = logging.getLogger(name)
+        for existing in uvicorn_logger.handlers[:]:
+            uvicorn_logger.removeHandler(existing)
+        uvicorn_logger.propagate = True
+    for name, level in parse_log_levels(LOG_LEVELS).items():
+        logging.getLogger(name).setLevel(level)
+
+    _listener = QueueListener(records, stream)
+    _listener.start()
+
+"""Flush the queued records and stop the listener thread
+
+Returns:
+    None
+"""
+def shutdown_logging():
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+"""Pick the id of a request
+
+Args:
+    incoming (str, optional): The X-Request-ID sent by the client or a proxy
+
+Returns:
+    str: The incoming id when it looks sane, otherwise a new one
+"""
+def new_request_id(incoming: str = None):
+    if incoming and len(incoming) <= 64 and incoming.isprintable():
+        return incoming
+    return uuid.uuid4().hex[:16]
+
+class RequestIdMiddleware:
+    """Sets the request id for the whole request and returns it as X-Request-ID.
+
+    A plain ASGI middleware rather than an http middleware, so the id is
+    still set when uvicorn writes its access line while the response is sent.
+    Add it last so it wraps the other middleware.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        token = request_id.set(new_request_id(Headers(scope=scope).get("x-request-id")))
+
+        async def send_with_request_id(message):
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message)["X-Request-ID"] = request_id.get()
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            request_id.reset(token)
@@ -0,0 +1,38 @@
+from collections import deque
+import threading
+
+class LatencyStats:
+    """Running latency statistics with percentiles over the most recent samples.
+
+    Args:
+        window (int): The number of recent samples kept for percentiles
+    """
+    def __init__(self, window: int = 1024):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        with self._lock:
+            self.count += 1
+            self.total += seconds
+            self.max = max(self.max, seconds)
+            self._samples.append(seconds)
+
+    def percentile(self, fraction: float):
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return 0.0
+        return samples[min(len(samples) - 1, int(fraction * len(samples)))]
+
+    def stats(self):
+        return {
+            "count": self.count,
+            "avg_ms": round(self.total / self.count * 1000, 2) if self.count else 0.0,
+            "p50_ms": round(self.percentile(0.5) * 1000, 2),
+            "p95_ms": round(self.percentile(0.95) * 1000, 2),
+            "max_ms": round(self.max * 1000, 2)
+        }
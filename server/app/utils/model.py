@@ -4,10 +4,15 @@ import os
 import json
 from datetime import datetime
 import aiohttp
+from fastapi import HTTPException
+import asyncio
+import codecs
+import math
 import re
 import logging
-import ast
 import difflib
+from app.utils.classifier import suggest_expense_type
+from app.models.user import EXPENSE_TYPES
 
 load_dotenv()
 
@@ -17,6 +22,16 @@ load_dotenv()
 LLM_HOST = os.getenv("LLM_HOST")
 LLM_PORT = os.getenv("LLM_PORT")
 
+# LLM client tuning: connections kept open to the model host, in-flight request cap and timeouts
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "8"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+LLM_KEEPALIVE_SECONDS = float(os.getenv("LLM_KEEPALIVE_SECONDS", "60"))
+LLM_CONNECT_TIMEOUT_SECONDS = float(os.getenv("LLM_CONNECT_TIMEOUT_SECONDS", "5"))
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "120"))
+
+_llm_session: aiohttp.ClientSession | None = None
+_llm_semaphore: asyncio.Semaphore | None = None
+
 # LLM Prompt Context
 RECEIPT_CONTEXT = """
 You are an AI assistant that processes noisy receipt data extracted by OCR. 
@@ -36,21 +51,80 @@ Return only the JSON object, no other text or characters.
 Receipt data:
 """
 
-EXPENSE_TYPES = ["needs", "wants", "savings"]
+
+RECEIPT_BATCH_CONTEXT = """
+You are an AI assistant that processes noisy receipt data extracted by OCR.
+Several receipts follow, each introduced by "Receipt N:".
+Return ONLY a JSON array with exactly one object per receipt, in the same order, each containing:
+- expense-type (choose ONLY one from: \"needs\", \"wants\", \"savings\")
+- date (YYYY-MM-DD; use today's date if none is found)
+- total (the final amount paid)
+- expense-name (a brief name based on the contents of the receipt)
+
+Ignore unreadable characters caused by OCR errors. Return only the JSON array, no other text.
+
+Receipts:
+"""
+
+# Batched receipt parsing: receipts per prompt, how long to wait to fill a batch, and tokens per receipt
+RECEIPT_BATCH_SIZE = int(os.getenv("RECEIPT_BATCH_SIZE", "5"))
+RECEIPT_BATCH_WINDOW_SECONDS = float(os.getenv("RECEIPT_BATCH_WINDOW_SECONDS", "0.25"))
+RECEIPT_BATCH_TOKENS_PER_RECEIPT = int(os.getenv("RECEIPT_BATCH_TOKENS_PER_RECEIPT", "120"))
+
+# Upper bound on the estimated size of the insights prompt, and how many of the largest expenses it may list
+INSIGHTS_TOKEN_BUDGET = int(os.getenv("INSIGHTS_TOKEN_BUDGET", "600"))
+INSIGHTS_TOP_EXPENSES = int(os.getenv("INSIGHTS_TOP_EXPENSES", "5"))
+
+# Receipts whose local extraction scores at least this much, and found these fields, skip the LLM
+RECEIPT_FAST_PATH_REQUIRED = ("expense-type", "date", "total")
+RECEIPT_FAST_PATH_CONFIDENCE = float(os.getenv("RECEIPT_FAST_PATH_CONFIDENCE", "0.8"))
+
+# How much each extracted field contributes to the extraction confidence
+EXTRACTION_WEIGHTS = {"total": 0.45, "date": 0.2, "expense-name": 0.15, "expense-type": 0.2}
+
+AMOUNT_PATTERN = r"\$?\s*(\d{1,6}(?:,\d{3})*[.,]\d{2})\b"
+# Lines that state the amount paid, strongest first
+TOTAL_PATTERNS = [
+    re.compile(r"\b(?:GRAND\s+TOTAL|AMOUNT\s+DUE|BALANCE\s+DUE|TOTAL\s+DUE|AMOUNT\s+PAID)\b.*?" + AMOUNT_PATTERN, re.IGNORECASE),
+    re.compile(r"\bTOTAL\b.*?" + AMOUNT_PATTERN, re.IGNORECASE),
+]
+# Total-like lines that are not the amount paid (SUBTOTAL, TOTAL SAVINGS, TOTAL ITEMS...)
+NOT_TOTAL_PATTERN = re.compile(r"\b(?:SAVINGS?|SAVED|DISCOUNTS?|ITEMS?|QTY)\b|\bSUB[-\s]?TOTAL", re.IGNORECASE)
+ANY_AMOUNT_PATTERN = re.compile(AMOUNT_PATTERN)
+MONTHS = {
+    month: index + 1 for index, month in enumerate(
+        ["jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"]
+    )
+}
+DATE_PATTERNS = [
+    (re.compile(r"\b(\d{4})[-/.](\d{1,2})[-/.](\d{1,2})\b"), ("year", "month", "day")),
+    (re.compile(r"\b(\d{1,2})[-/.](\d{1,2})[-/.](\d{4})\b"), ("month", "day", "year")),
+    (re.compile(r"\b(\d{1,2})[-/.](\d{1,2})[-/.](\d{2})\b"), ("month", "day", "year")),
+    (re.compile(r"\b(jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\.?\s+(\d{1,2}),?\s+(\d{2,4})\b", re.IGNORECASE), ("month", "day", "year")),
+    (re.compile(r"\b(\d{1,2})\s+(jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\.?,?\s+(\d{2,4})\b", re.IGNORECASE), ("day", "month", "year")),
+]
+# Header lines that are not the merchant name
+NON_MERCHANT_PATTERN = re.compile(
+    r"\b(receipt|invoice|welcome|tel|phone|fax|www\.|\.com|street|st\.|ave|road|rd\.|blvd|suite|store\s*#|date|time|cashier)\b|\d{3}[-.\s]\d{3,4}",
+    re.IGNORECASE
+)
+# Keywords that settle the category without asking the LLM
+EXPENSE_TYPE_KEYWORDS = {
+    "needs": re.compile(r"\b(grocery|groceries|supermarket|market|pharmacy|drug|walmart|costco|safeway|kroger|produce|milk|bread)\b", re.IGNORECASE),
+    "wants": re.compile(r"\b(restaurant|cafe|coffee|starbucks|bar|grill|pizza|burger|cinema|theatre|theater|movie|game|toys?)\b", re.IGNORECASE),
+    "savings": re.compile(r"\b(gas|fuel|petro|shell|esso|chevron|hydro|electric|utility|utilities|water\s+bill|internet|phone\s+bill)\b", re.IGNORECASE),
+}
+
+# How often each receipt parsing path was taken
+receipt_parse_counters = {"fast_path": 0, "llm": 0}
 
 INSIGHTS_CONTEXT = """
 You are an AI assistant that provides personalized financial insights for kids and teens.
-Based on user expenses, categorize each transaction as needs, wants, or savings, and calculate the percentage that each category represents relative to total expenses. 
+You are given a summary of the user's recent spending, already split into needs, wants and savings with the percentage each category represents of total spending.
 Use these percentages to generate tailored suggestions for better budget management, offering insights to help the user achieve financial balance.
 Provide advice that encourages responsible spending and saving. 
 
-Expenses are in the format:
-{
-    "expense-type": "needs" | "wants" | "savings",
-    "expenseDate": "YYYY-MM-DD",
-    "expenseName": "Expense Name",
-    "expenseAmount": "Expense Amount"
-}
+The summary lists the total spent, each category's total and percentage, how much of the budget has been used, and the largest expenses as "date | category | name | amount".
 
 Budget is the total amount of money the user has set for their budget in dollars for the month.
 
@@ -59,17 +133,72 @@ I only want the insights worded for a 13 year old, nothing but plain text should
 User data:
 """
 
-"""Process the receipt data
+logger = logging.getLogger(__name__)
+
+"""Open the application-wide LLM client session
+
+Returns:
+    aiohttp.ClientSession: The shared session
+"""
+async def start_llm_session():
+    global _llm_session, _llm_semaphore
+    if _llm_session is None or _llm_session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=LLM_MAX_CONNECTIONS,
+            limit_per_host=LLM_MAX_CONNECTIONS,
+            keepalive_timeout=LLM_KEEPALIVE_SECONDS,
+            ttl_dns_cache=300
+        )
+        timeout = aiohttp.ClientTimeout(
+            total=LLM_TIMEOUT_SECONDS,
+            sock_connect=LLM_CONNECT_TIMEOUT_SECONDS
+        )
+        _llm_session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+        _llm_semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+    return _llm_session
+
+"""Close the application-wide LLM client session
+
+Returns:
+    None
+"""
+async def close_llm_session():
+    global _llm_session
+    if _llm_session is not None and not _llm_session.closed:
+        await _llm_session.close()
+    _llm_session = None
+
+"""Send a prompt to the LLM host through the shared session
+
+Requests beyond LLM_MAX_CONCURRENCY wait for a free slot instead of all
+hitting the model host at once. An error status from the host (e.g. 429
+or 5xx) is raised as a 502 instead of being decoded as a result.
 
 Args:
-    receipt_data (dict): The receipt data to process
-    **kwargs: Additional keyword arguments
+    payload (dict): The JSON body of the /prompt request
 
 Returns:
-    str: The processed receipt data
+    list: The decoded response of the LLM host
 """
-logging.basicConfig(level=logging.WARNING)
-logger = logging.getLogger(__name__)
+async def post_prompt(payload: dict):
+    session = await start_llm_session()
+    async with _llm_semaphore:
+        async with session.post(f"http://{LLM_HOST}:{LLM_PORT}/prompt", json=payload) as res:
+            await check_llm_response(res)
+            return await res.json()
+
+"""Raise a 502 for an error response of the LLM host
+
+Args:
+    res (aiohttp.ClientResponse): The response of the /prompt request
+
+Returns:
+    None
+"""
+async def check_llm_response(res):
+    if res.status >= 400:
+        logger.warning("LLM host returned %s: %s", res.status, (await res.text())[:200])
+        raise HTTPException(status_code=502, detail=f"LLM host returned {res.status}")
 
 def parse_json_like_string(json_like_string):
     # Remove any leading/trailing whitespace and the surrounding curly braces
@@ -88,8 +217,187 @@ def parse_json_like_string(json_like_string):
     return result
 
 
+"""Find the amount paid on a receipt
+
+Args:
+    lines (list): The lines of the OCR text
+
+Returns:
+    tuple: The total as a string with two decimals and whether it came from a total line
+"""
+def extract_total(lines: list):
+    total_lines = [line for line in lines if not NOT_TOTAL_PATTERN.search(line)]
+    for pattern in TOTAL_PATTERNS:
+        amounts = [normalize_amount(match.group(1)) for line in total_lines for match in [pattern.search(line)] if match]
+        if amounts:
+            # TOTAL TAX and similar lines are smaller than the amount paid
+            return max(amounts, key=float), True
+
+    amounts = [normalize_amount(amount) for amount in ANY_AMOUNT_PATTERN.findall("\n".join(lines))]
+    if amounts:
+        return max(amounts, key=float), False
+    return None, False
+
+"""Normalize an OCR amount such as "1,234.50" or "12,50"
+
+Args:
+    amount (str): The amount as printed
+
+Returns:
+    str: The amount with two decimals
+"""
+def normalize_amount(amount: str):
+    whole, cents = amount[:-3], amount[-2:]
+    return f"{float(whole.replace(',', '').replace('.', '') or 0) + int(cents) / 100:.2f}"
+
+"""Find the purchase date on a receipt
+
+Args:
+    text (str): The OCR text
+
+Returns:
+    str: The date in YYYY-MM-DD format, or None
+"""
+def extract_date(text: str):
+    today = datetime.now().date()
+    for pattern, order in DATE_PATTERNS:
+        for match in pattern.finditer(text):
+            parts = dict(zip(order, match.groups()))
+            try:
+                month = parts["month"]
+                month = MONTHS[month[:3].lower()] if month.isalpha() else int(month)
+                year = int(parts["year"])
+                year = year + 2000 if year < 100 else year
+                parsed = datetime(year, month, int(parts["day"])).date()
+            except (KeyError, ValueError):
+                continue
+            if parsed.year >= 2000 and (parsed - today).days <= 1:
+                return parsed.isoformat()
+    return None
+
+"""Find the merchant name at the top of a receipt
+
+Args:
+    lines (list): The lines of the OCR text
+
+Returns:
+    str: The merchant name, or None
+"""
+def extract_merchant(lines: list):
+    for line in lines[:8]:
+        line = line.strip()
+        letters = sum(character.isalpha() for character in line)
+        if letters < 3 or letters < len(line) / 2 or NON_MERCHANT_PATTERN.search(line):
+            continue
+        return " ".join(word.capitalize() for word in line.split())[:60]
+    return None
+
+"""Pick the expense type from keywords in the receipt
+
+Args:
+    text (str): The OCR text
+
+Returns:
+    str: The expense type, or None when no keyword matched
+"""
+def extract_expense_type(text: str):
+    for expense_type, pattern in EXPENSE_TYPE_KEYWORDS.items():
+        if pattern.search(text):
+            return expense_type
+    return None
+
+"""Extract the receipt fields locally with regular expressions
+
+Args:
+    receipt_text (str): The OCR text
+
+Returns:
+    dict: The receipt fields in the LLM response format, plus a confidence between 0 and 1
+        and the fields that were filled with defaults
+"""
+def extract_receipt_fields(receipt_text: str):
+    lines = [line for line in receipt_text.splitlines() if line.strip()]
+    total, from_total_line = extract_total(lines)
+    merchant = extract_merchant(lines)
+    fields = {
+        "expense-type": suggest_expense_type(merchant) or extract_expense_type(receipt_text),
+        "date": extract_date(receipt_text),
+        "total": total,
+        "expense-name": merchant
+    }
+
+    confidence = sum(weight for field, weight in EXTRACTION_WEIGHTS.items() if fields[field])
+    if total and not from_total_line:
+        # The largest amount on the receipt is only a guess at the total
+        confidence -= EXTRACTION_WEIGHTS["total"] / 2
+
+    return {
+        "expense-type": fields["expense-type"] or "needs",
+        "date": fields["date"] or datetime.now().strftime("%Y-%m-%d"),
+        "total": fields["total"] or "0.00",
+        "expense-name": fields["expense-name"] or "Unknown Expense",
+        "confidence": round(confidence, 2),
+        "missing": [field for field, value in fields.items() if not value]
+    }
+
+"""Parse a receipt with the local extractor when it is confident enough
+
+Args:
+    receipt_text (str): The OCR text
+
+Returns:
+    dict: The receipt data, or None when the LLM is needed
+"""
+def parse_receipt_locally(receipt_text: str):
+    extracted = extract_receipt_fields(receipt_text)
+    missing = extracted.pop("missing")
+    if extracted.pop("confidence") >= RECEIPT_FAST_PATH_CONFIDENCE and not set(missing) & set(RECEIPT_FAST_PATH_REQUIRED):
+        receipt_parse_counters["fast_path"] += 1
+        return extracted
+    return None
+
+"""Build the receipt data returned when nothing could be parsed
+
+Returns:
+    dict: The default receipt data
+"""
+def default_receipt_json():
+    return {
+        "expense-type": "needs",
+        "date": datetime.now().strftime("%Y-%m-%d"),
+        "total": "0.00",
+        "expense-name": "Unknown Expense"
+    }
+
+"""Fill in and correct the fields parsed from the LLM output
+
+Args:
+    receipt_json (dict): The fields parsed from the LLM output
+
+Returns:
+    dict: The receipt data
+"""
+def clean_receipt_json(receipt_json: dict):
+    if receipt_json.get("expense-type") not in EXPENSE_TYPES:
+        classified = suggest_expense_type(receipt_json.get("expense-name", ""))
+        closest_match = [classified] if classified else difflib.get_close_matches(receipt_json.get("expense-type", ""), EXPENSE_TYPES, n=1, cutoff=0.6)
+        if closest_match:
+            receipt_json["expense-type"] = closest_match[0]
+        else:
+            receipt_json["expense-type"] = "needs"  # Default to "needs" if no close match is found
+
+    return {
+        "expense-type": receipt_json.get("expense-type", "needs"),
+        "date": receipt_json.get("date", datetime.now().strftime("%Y-%m-%d")),
+        "total": receipt_json.get("total", "0.00"),
+        "expense-name": receipt_json.get("expense-name", "Unknown Expense")
+    }
+
 """Process the receipt data
 
+Tries the local extractor first and only calls the LLM when its confidence
+is below RECEIPT_FAST_PATH_CONFIDENCE.
+
 Args:
     receipt_data (dict): The receipt data to process
     **kwargs: Additional keyword arguments
@@ -98,17 +406,17 @@ Returns:
     str: The processed receipt data
 """
 async def process_receipt(receipt_data, **kwargs):
-    # logger.debug(f"Received receipt_data: {receipt_data}")
-    
     if isinstance(receipt_data, dict) and 'text' in receipt_data:
         receipt_text = receipt_data['text']
     else:
         receipt_text = receipt_data
 
-    # logger.debug(f"Extracted receipt_text: {receipt_text}")
+    extracted = parse_receipt_locally(receipt_text)
+    if extracted is not None:
+        return extracted
+    receipt_parse_counters["llm"] += 1
 
     full_prompt = RECEIPT_CONTEXT + receipt_text
-    # logger.debug(f"Full prompt: {full_prompt}")
 
     max_new_tokens = 400
     temperature = 0.3
@@ -116,69 +424,138 @@ async def process_receipt(receipt_data, **kwargs):
     top_k = 50
     top_p = 0.95
 
-    async with aiohttp.ClientSession() as session:
-        async with session.post(
-            f"http://{LLM_HOST}:{LLM_PORT}/prompt",
-            json={
-                "prompt": full_prompt,
-                "return_full_text": False,
-                "max_new_tokens": max_new_tokens,
-                "temperature": temperature,
-                "repetition_penalty": repetition_penalty,
-                "top_k": top_k,
-                "top_p": top_p,
-                **kwargs
-            }
-        ) as res:
-            response_data = await res.json()
-            generated_text = response_data[0]["generated_text"]
-    
-    # logger.debug(f"LLM Generated Text: {generated_text}")
-    
+    response_data = await post_prompt({
+        "prompt": full_prompt,
+        "return_full_text": False,
+        "max_new_tokens": max_new_tokens,
+        "temperature": temperature,
+        "repetition_penalty": repetition_penalty,
+        "top_k": top_k,
+        "top_p": top_p,
+        **kwargs
+    })
+    generated_text = response_data[0]["generated_text"]
+
     try:
         # First, try to find a JSON-like structure
         json_match = re.search(r'\{.*\}', generated_text, re.DOTALL)
         if json_match:
             json_str = json_match.group(0)
-            # logger.debug(f"Extracted JSON-like string: {json_str}")
-            
             # Use our custom parser
             receipt_json = parse_json_like_string(json_str)
-            # logger.debug(f"Parsed receipt_json: {receipt_json}")
         else:
             raise ValueError("No JSON object found in the generated text")
         
-        if receipt_json.get("expense-type") not in EXPENSE_TYPES:
-            closest_match = difflib.get_close_matches(receipt_json.get("expense-type", ""), EXPENSE_TYPES, n=1, cutoff=0.6)
-            if closest_match:
-                receipt_json["expense-type"] = closest_match[0]
-            else:
-                receipt_json["expense-type"] = "needs"  # Default to "needs" if no close match is found
-            # logger.debug(f"Corrected expense-type to: {receipt_json['expense-type']}")
-
-        cleaned_json = {
-            "expense-type": receipt_json.get("expense-type", "needs"),
-            "date": receipt_json.get("date", datetime.now().strftime("%Y-%m-%d")),
-            "total": receipt_json.get("total", "0.00"),
-            "expense-name": receipt_json.get("expense-name", "Unknown Expense")
-        }
-        
-        # logger.debug(f"Final cleaned_json: {cleaned_json}")
+        cleaned_json = clean_receipt_json(receipt_json)
         return cleaned_json
     except Exception as e:
         logger.error(f"Error parsing JSON-like string: {e}")
         logger.error(f"Problematic string: {json_str if 'json_str' in locals() else 'Not available'}")
-        default_json = {
-            "expense-type": "needs",
-            "date": datetime.now().strftime("%Y-%m-%d"),
-            "total": "0.00",
-            "expense-name": "Unknown Expense"
-        }
-        logger.debug(f"Returning default_json: {default_json}")
+        default_json = default_receipt_json()
+        logger.debug("Returning default_json: %s", default_json)
         return default_json
 
 process_receipt_data = process_receipt
 
+"""Parse several receipts with a single LLM call
+
+The model is asked for a JSON array with one object per receipt. If it
+doesn't return exactly one object per receipt, each receipt is parsed on
+its own instead.
+
+Args:
+    receipt_texts (list): The OCR texts
+    **kwargs: Additional keyword arguments
+
+Returns:
+    list: The receipt data, in the same order as receipt_texts
+"""
+async def process_receipts_batch(receipt_texts: list, **kwargs):
+    if len(receipt_texts) == 1:
+        return [await process_receipt(receipt_texts[0], **kwargs)]
+
+    receipt_parse_counters["llm"] += len(receipt_texts)
+    full_prompt = RECEIPT_BATCH_CONTEXT + "\n".join(
+        f"Receipt {index + 1}:\n{text}\n" for index, text in enumerate(receipt_texts)
+    )
+
+    response_data = await post_prompt({
+        "prompt": full_prompt,
+        "return_full_text": False,
+        "max_new_tokens": RECEIPT_BATCH_TOKENS_PER_RECEIPT * len(receipt_texts),
+        "temperature": 0.3,
+        "repetition_penalty": 1.3,
+        "top_k": 50,
+        "top_p": 0.95,
+        **kwargs
+    })
+    generated_text = response_data[0]["generated_text"]
+
+    objects = re.findall(r'\{[^{}]*\}', generated_text)
+    if len(objects) != len(receipt_texts):
+        logger.warning(f"Batch parse returned {len(objects)} objects for {len(receipt_texts)} receipts, parsing one by one")
+        receipt_parse_counters["llm"] -= len(receipt_texts)
+        return await asyncio.gather(*(process_receipt(text, **kwargs) for text in receipt_texts))
+
+    results = []
+    for json_str in objects:
+        try:
+            results.append(clean_receipt_json(parse_json_like_string(json_str)))
+        except Exception as e:
+            logger.error(f"Error parsing JSON-like string: {e}")
+            results.append(default_receipt_json())
+    return results
+
+class ReceiptBatcher:
+    """Coalesce receipts that need the LLM into batched prompts.
+
+    A batch is sent once it holds max_batch receipts, or window seconds after
+    its first receipt arrived, whichever comes first.
+
+    Args:
+        max_batch (int): The largest number of receipts per prompt
+        window (float): How long to wait for more receipts
+    """
+    def __init__(self, max_batch: int = None, window: float = None):
+        self.max_batch = max_batch or RECEIPT_BATCH_SIZE
+        self.window = RECEIPT_BATCH_WINDOW_SECONDS if window is None else window
+        self._pending = []
+        self._timer = None
+        self._tasks = set()
+
+    async def submit(self, receipt_text: str):
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((receipt_text, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.create_task(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: list):
+        try:
+            results = await process_receipts_batch([text for text, _ in batch])
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+
+    async def parse(self, receipt_text: str):
+        return parse_receipt_locally(receipt_text) or await self.submit(receipt_text)
+
 """Get the insights for the current user
 
 Args:
@@ -189,8 +566,80 @@ Returns:
     str: The processed user data
 """
 async def get_insights(user_data, **kwargs):
-    full_prompt = INSIGHTS_CONTEXT + json.dumps(user_data)
-    # logger.debug(f"Full prompt: {full_prompt}")
+    response_data = await post_prompt(build_insights_payload(user_data, **kwargs))
+    generated_text = response_data[0]["generated_text"]
+    return {"insights": generated_text}
+    
+get_insights_data = get_insights
+
+"""Estimate the number of tokens of a prompt
+
+Uses the common ~4 characters per token rule of thumb, which is close
+enough for English text to keep prompts inside a budget.
+
+Args:
+    text (str): The prompt
+
+Returns:
+    int: The estimated token count
+"""
+def estimate_tokens(text: str):
+    return math.ceil(len(text) / 4)
+
+"""Build the compact insights prompt from aggregated spending
+
+The largest expenses are dropped one by one, smallest first, until the
+prompt fits in the token budget.
+
+Args:
+    user_data (dict): window_days, budget, total, categories and top_expenses
+    token_budget (int): The largest estimated prompt size allowed
+
+Returns:
+    tuple: The prompt and its estimated token count
+"""
+def build_insights_prompt(user_data: dict, token_budget: int = INSIGHTS_TOKEN_BUDGET):
+    budget = user_data.get("budget", 0) or 0
+    total = user_data.get("total", 0)
+    lines = [
+        f"Period: last {user_data.get('window_days', 30)} days",
+        f"Total spent: ${total:.2f}",
+        f"Budget: ${budget:.2f}" + (f" ({total / budget * 100:.0f}% used)" if budget else " (not set)"),
+    ]
+    for expense_type in EXPENSE_TYPES:
+        category = user_data.get("categories", {}).get(expense_type, {})
+        lines.append(
+            f"{expense_type}: ${category.get('total', 0):.2f} "
+            f"({category.get('percentage', 0):.0f}%, {category.get('count', 0)} expenses)"
+        )
+
+    header = INSIGHTS_CONTEXT + "\n".join(lines)
+    top_expenses = [
+        f"{expense.get('expenseDate', '')} | {expense.get('expense-type', '')} | "
+        f"{str(expense.get('expense-name', ''))[:40]} | ${float(expense.get('expenseTotal', 0) or 0):.2f}"
+        for expense in user_data.get("top_expenses", [])
+    ]
+    while True:
+        prompt = header
+        if top_expenses:
+            prompt += "\nLargest expenses:\n" + "\n".join(top_expenses)
+        tokens = estimate_tokens(prompt)
+        if tokens <= token_budget or not top_expenses:
+            return prompt, tokens
+        top_expenses.pop()
+
+"""Build the /prompt request body for insights
+
+Args:
+    user_data (dict): The user data to process
+    **kwargs: Additional keyword arguments
+
+Returns:
+    dict: The request body
+"""
+def build_insights_payload(user_data, **kwargs):
+    full_prompt, prompt_tokens = build_insights_prompt(user_data)
+    logger.debug("Insights prompt is ~%d tokens", prompt_tokens)
 
     max_new_tokens = 400
     temperature = 0.8
@@ -198,23 +647,74 @@ async def get_insights(user_data, **kwargs):
     top_k = 50
     top_p = 0.95
 
-    async with aiohttp.ClientSession() as session:
+    return {
+        "prompt": full_prompt,
+        "return_full_text": False,
+        "max_new_tokens": max_new_tokens,
+        "temperature": temperature,
+        "repetition_penalty": repetition_penalty,
+        "top_k": top_k,
+        "top_p": top_p,
+        **kwargs
+    }
+
+"""Extract the text of one server-sent event line from the LLM host
+
+Args:
+    data (str): The data of the event
+
+Returns:
+    str: The generated text it carries
+"""
+def parse_stream_event(data: str):
+    try:
+        event = json.loads(data)
+    except ValueError:
+        return data
+    if isinstance(event, dict):
+        return event.get("token") or event.get("text") or event.get("generated_text") or ""
+    if isinstance(event, str):
+        return event
+    return ""
+
+"""Stream the insights for the current user as the LLM generates them
+
+The request asks the LLM host to stream. Server-sent events, chunked text
+and, for hosts that can't stream, a regular JSON response are all relayed.
+
+Args:
+    user_data (dict): The user data to process
+    **kwargs: Additional keyword arguments
+
+Yields:
+    str: The generated text, piece by piece
+"""
+async def stream_insights(user_data, **kwargs):
+    session = await start_llm_session()
+    async with _llm_semaphore:
         async with session.post(
             f"http://{LLM_HOST}:{LLM_PORT}/prompt",
-            json={
-                "prompt": full_prompt,
-                "return_full_text": False,
-                "max_new_tokens": max_new_tokens,
-                "temperature": temperature,
-                "repetition_penalty": repetition_penalty,
-                "top_k": top_k,
-                "top_p": top_p,
-                **kwargs
-            }
+            json=build_insights_payload(user_data, stream=True, **kwargs)
         ) as res:
-            response_data = await res.json()
-            generated_text = response_data[0]["generated_text"]
-            # print(generated_text)
-    return {"insights": generated_text}
-    
-get_insights_data = get_insights
\ No newline at end of file
+            await check_llm_response(res)
+            content_type = res.headers.get("Content-Type", "")
+            if content_type.startswith("application/json"):
+                response_data = await res.json()
+                yield response_data[0]["generated_text"]
+            elif content_type.startswith("text/event-stream"):
+                async for line in res.content:
+                    line = line.decode("utf-8").rstrip("\r\n")
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[5:].lstrip()
+                    if data == "[DONE]":
+                        break
+                    token = parse_stream_event(data)
+                    if token:
+                        yield token
+            else:
+                decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+                async for chunk in res.content.iter_any():
+                    text = decoder.decode(chunk)
+                    if text:
+                        yield text
\ No newline at end of file
@@ -0,0 +1,117 @@
+from concurrent.futures import ProcessPoolExecutor
+from dotenv import load_dotenv
+from fastapi import HTTPException
+from PIL import Image
+from app.utils.metrics import LatencyStats
+from app.utils.preprocess import preprocess_image, tesseract_config
+import asyncio
+import io
+import multiprocessing
+import os
+import pytesseract
+import time
+
+load_dotenv()
+
+# CONSTANT: Number of OCR worker processes and how many images may wait for one
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", str(os.cpu_count() or 2)))
+OCR_MAX_PENDING = int(os.getenv("OCR_MAX_PENDING", str(OCR_WORKERS * 4)))
+
+# CONSTANT: Seconds a client is told to wait before retrying when the pool is saturated
+OCR_RETRY_AFTER_SECONDS = os.getenv("OCR_RETRY_AFTER_SECONDS", "2")
+
+_executor: ProcessPoolExecutor | None = None
+_pending = 0
+_rejected = 0
+queue_wait_stats = LatencyStats()
+ocr_time_stats = LatencyStats()
+
+"""Preprocess an image and run Tesseract on it inside a worker process
+
+Args:
+    image_bytes (bytes): The uploaded image
+    submitted_at (float): The wall clock time the job was submitted
+
+Returns:
+    tuple: The extracted text, the time OCR started and the time it finished
+"""
+def ocr_image(image_bytes: bytes, submitted_at: float):
+    started_at = time.time()
+    image = preprocess_image(Image.open(io.BytesIO(image_bytes)))
+    text = pytesseract.image_to_string(image, config=tesseract_config())
+    return text, started_at, time.time()
+
+"""Start the OCR worker pool
+
+Workers are spawned rather than forked so they don't inherit the event loop
+or the database client threads of the API process.
+
+Returns:
+    ProcessPoolExecutor: The worker pool
+"""
+def start_ocr_pool():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=OCR_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _executor
+
+"""Stop the OCR worker pool
+
+Returns:
+    None
+"""
+def shutdown_ocr_pool():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+    _executor = None
+
+"""Extract the text of an image without blocking the event loop
+
+Args:
+    image_bytes (bytes): The uploaded image
+
+Returns:
+    str: The extracted text
+"""
+async def run_ocr(image_bytes: bytes):
+    global _pending, _rejected
+    if _pending >= OCR_MAX_PENDING:
+        _rejected += 1
+        raise HTTPException(
+            status_code=503,
+            detail="OCR workers are busy, please retry shortly",
+            headers={"Retry-After": OCR_RETRY_AFTER_SECONDS}
+        )
+
+    _pending += 1
+    try:
+        loop = asyncio.get_running_loop()
+        submitted_at = time.time()
+        text, started_at, finished_at = await loop.run_in_executor(
+            start_ocr_pool(), ocr_image, image_bytes, submitted_at
+        )
+    finally:
+        _pending -= 1
+
+    queue_wait_stats.observe(max(0.0, started_at - submitted_at))
+    ocr_time_stats.observe(finished_at - started_at)
+    return text
+
+"""Get the OCR pool metrics
+
+Returns:
+    dict: Pool size, current queue depth, rejections and latency breakdown
+"""
+def ocr_pool_stats():
+    return {
+        "workers": OCR_WORKERS,
+        "max_pending": OCR_MAX_PENDING,
+        "pending": _pending,
+        "rejected": _rejected,
+        "queue_wait": queue_wait_stats.stats(),
+        "ocr_time": ocr_time_stats.stats()
+    }
@@ -0,0 +1,96 @@
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+import asyncio
+import bcrypt
+import os
+
+load_dotenv()
+
+# CONSTANT: The bcrypt work factor for new hashes; older hashes are upgraded on login
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# CONSTANT: How many hashes may be computed at once, off the event loop
+BCRYPT_WORKERS = int(os.getenv("BCRYPT_WORKERS", str(min(4, os.cpu_count() or 1))))
+ENCODING_TYPE = os.getenv("ENCODING_TYPE", "utf-8")
+
+_executor: ThreadPoolExecutor | None = None
+
+"""Get the thread pool bcrypt runs in
+
+bcrypt releases the GIL while hashing, so threads run hashes in parallel
+while the event loop keeps serving other requests.
+
+Returns:
+    ThreadPoolExecutor: The bcrypt thread pool
+"""
+def get_password_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=BCRYPT_WORKERS, thread_name_prefix="bcrypt")
+    return _executor
+
+"""Stop the bcrypt thread pool
+
+Returns:
+    None
+"""
+def shutdown_password_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False)
+    _executor = None
+
+"""Hash a password with the configured work factor
+
+Args:
+    password (str): The plain text password
+    rounds (int): The bcrypt work factor
+
+Returns:
+    bytes: The bcrypt hash, which records its own work factor
+"""
+async def hash_password(password: str, rounds: int = BCRYPT_ROUNDS):
+    loop = asyncio.get_running_loop()
+    salt = bcrypt.gensalt(rounds)
+    return await loop.run_in_executor(get_password_executor(), bcrypt.hashpw, password.encode(ENCODING_TYPE), salt)
+
+"""Check a password against a stored hash
+
+Args:
+    password (str): The plain text password
+    hashed_password (bytes): The stored bcrypt hash
+
+Returns:
+    bool: True if the password matches
+"""
+async def verify_password(password: str, hashed_password):
+    if isinstance(hashed_password, str):
+        hashed_password = hashed_password.encode("ascii")
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_password_executor(), bcrypt.checkpw, password.encode(ENCODING_TYPE), hashed_password)
+
+"""Read the work factor of a bcrypt hash
+
+Args:
+    hashed_password (bytes): A hash such as b"$2b$12$..."
+
+Returns:
+    int: The work factor, 0 if the hash can't be parsed
+"""
+def hash_rounds(hashed_password):
+    if isinstance(hashed_password, str):
+        hashed_password = hashed_password.encode("ascii")
+    try:
+        return int(hashed_password.split(b"$")[2])
+    except (IndexError, ValueError):
+        return 0
+
+"""Check whether a hash was made with a lower work factor than configured
+
+Args:
+    hashed_password (bytes): The stored bcrypt hash
+
+Returns:
+    bool: True if the hash should be upgraded
+"""
+def needs_rehash(hashed_password):
+    return hash_rounds(hashed_password) < BCRYPT_ROUNDS
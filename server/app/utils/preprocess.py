@@ -0,0 +1,151 @@
+from dotenv import load_dotenv
+from PIL import Image, ImageOps
+import os
+
+load_dotenv()
+
+# Tunables for the image preprocessing that runs ahead of Tesseract.
+# Receipts are assumed to be printed on ~80mm paper, so the cropped receipt is
+# scaled to OCR_TARGET_DPI * OCR_RECEIPT_WIDTH_INCHES pixels wide.
+OCR_TARGET_DPI = int(os.getenv("OCR_TARGET_DPI", "300"))
+OCR_RECEIPT_WIDTH_INCHES = float(os.getenv("OCR_RECEIPT_WIDTH_INCHES", "3.15"))
+OCR_BINARIZE = os.getenv("OCR_BINARIZE", "true").lower() == "true"
+OCR_CROP_TO_CONTENT = os.getenv("OCR_CROP_TO_CONTENT", "true").lower() == "true"
+# Pixels darker than the background by this much count as content when cropping
+OCR_CROP_CONTRAST = int(os.getenv("OCR_CROP_CONTRAST", "40"))
+OCR_CROP_MARGIN = int(os.getenv("OCR_CROP_MARGIN", "10"))
+# The paper tone is this percentile of brightness, so a few glare pixels don't set it
+OCR_PAPER_PERCENTILE = float(os.getenv("OCR_PAPER_PERCENTILE", "0.95"))
+
+# Tesseract settings suited to receipts: one uniform block of text and a
+# restricted character set (no quotes, they break pytesseract's config parsing)
+OCR_PSM = int(os.getenv("OCR_PSM", "6"))
+OCR_CHAR_WHITELIST = os.getenv(
+    "OCR_CHAR_WHITELIST",
+    "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789$.,:;/-#%&@()*+="
+)
+
+"""Compute a global binarization threshold with Otsu's method
+
+Args:
+    image (Image): A grayscale image
+
+Returns:
+    int: The threshold separating ink from paper
+"""
+def otsu_threshold(image: Image.Image):
+    histogram = image.histogram()[:256]
+    total = sum(histogram)
+    weighted_total = sum(i * count for i, count in enumerate(histogram))
+    background_weight = 0
+    background_sum = 0
+    best_threshold = 127
+    best_variance = 0.0
+    for threshold, count in enumerate(histogram):
+        background_weight += count
+        if background_weight == 0:
+            continue
+        foreground_weight = total - background_weight
+        if foreground_weight == 0:
+            break
+        background_sum += threshold * count
+        background_mean = background_sum / background_weight
+        foreground_mean = (weighted_total - background_sum) / foreground_weight
+        variance = background_weight * foreground_weight * (background_mean - foreground_mean) ** 2
+        if variance > best_variance:
+            best_variance = variance
+            best_threshold = threshold
+    return best_threshold
+
+"""Find the tone below which a given share of the pixels fall
+
+Args:
+    image (Image): A grayscale image
+    fraction (float): The share of pixels, between 0 and 1
+
+Returns:
+    int: The gray level at that percentile
+"""
+def histogram_percentile(image: Image.Image, fraction: float):
+    histogram = image.histogram()[:256]
+    target = fraction * sum(histogram)
+    seen = 0
+    for value, count in enumerate(histogram):
+        seen += count
+        if seen >= target:
+            return value
+    return 255
+
+"""Crop a grayscale image to the bounding box of its dark content
+
+Args:
+    image (Image): A grayscale image
+    contrast (int): How much darker than the paper tone content must be
+    margin (int): Pixels of padding kept around the content
+    paper_percentile (float): The brightness percentile taken as the paper tone
+
+Returns:
+    Image: The cropped image, or the original one if no content was found
+"""
+def crop_to_content(image: Image.Image, contrast: int = OCR_CROP_CONTRAST, margin: int = OCR_CROP_MARGIN, paper_percentile: float = OCR_PAPER_PERCENTILE):
+    paper = histogram_percentile(image, paper_percentile)
+    mask = image.point(lambda value: 255 if value < paper - contrast else 0)
+    box = mask.getbbox()
+    if box is None:
+        return image
+    left, top, right, bottom = box
+    return image.crop((
+        max(0, left - margin),
+        max(0, top - margin),
+        min(image.width, right + margin),
+        min(image.height, bottom + margin)
+    ))
+
+"""Prepare a receipt photo for Tesseract
+
+Fixes the EXIF orientation, converts to grayscale, crops to the printed
+area, scales the receipt to the target DPI and binarizes. Cropping comes
+first so a receipt that fills only part of the photo still reaches the
+target resolution.
+
+Args:
+    image (Image): The uploaded image
+    target_dpi (int): The resolution the receipt is scaled to
+    binarize (bool): Whether to threshold the image to black and white
+    crop (bool): Whether to crop the image to its content
+
+Returns:
+    Image: The preprocessed image
+"""
+def preprocess_image(image: Image.Image, target_dpi: int = OCR_TARGET_DPI, binarize: bool = OCR_BINARIZE, crop: bool = OCR_CROP_TO_CONTENT):
+    image = ImageOps.exif_transpose(image)
+    image = ImageOps.grayscale(image)
+
+    if crop:
+        image = crop_to_content(image)
+
+    target_width = int(target_dpi * OCR_RECEIPT_WIDTH_INCHES)
+    if target_width and image.width != target_width:
+        scale = target_width / image.width
+        image = image.resize((target_width, max(1, int(image.height * scale))), Image.LANCZOS)
+
+    if binarize:
+        threshold = otsu_threshold(image)
+        image = image.point(lambda value: 255 if value > threshold else 0)
+
+    return image
+
+"""Build the Tesseract command line options for receipts
+
+Args:
+    psm (int): The page segmentation mode
+    whitelist (str): The characters Tesseract may output, empty for no restriction
+
+Returns:
+    str: The config string passed to pytesseract
+"""
+def tesseract_config(psm: int = OCR_PSM, whitelist: str = OCR_CHAR_WHITELIST):
+    config = f"--psm {psm} -c preserve_interword_spaces=1"
+    if whitelist:
+        config += f" -c tessedit_char_whitelist={whitelist}"
+    return config
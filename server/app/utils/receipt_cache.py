@@ -0,0 +1,93 @@
+from datetime import datetime, timezone
+from dotenv import load_dotenv
+from app.db import db
+from app.utils.cache import TTLCache
+import hashlib
+import os
+
+load_dotenv()
+
+# CONSTANT: Where parsed receipts are cached: "memory" (per process) or "mongo" (shared)
+RECEIPT_CACHE_BACKEND = os.getenv("RECEIPT_CACHE_BACKEND", "memory")
+RECEIPT_CACHE_SIZE = int(os.getenv("RECEIPT_CACHE_SIZE", "5000"))
+RECEIPT_CACHE_TTL_SECONDS = int(os.getenv("RECEIPT_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+
+class MemoryReceiptCache:
+    """In-process LRU cache of parsed receipts."""
+    def __init__(self, maxsize: int, ttl: int):
+        self._cache = TTLCache(maxsize, ttl)
+
+    async def get(self, key: str):
+        return self._cache.get(key)
+
+    async def set(self, key: str, value: dict):
+        self._cache.set(key, value)
+
+class MongoReceiptCache:
+    """Parsed receipts shared by every API process, expired by a TTL index."""
+    def __init__(self, collection, ttl: int):
+        self.collection = collection
+        self.ttl = ttl
+
+    async def get(self, key: str):
+        document = await self.collection.find_one({"_id": key}, {"value": 1})
+        return document["value"] if document else None
+
+    async def set(self, key: str, value: dict):
+        await self.collection.update_one(
+            {"_id": key},
+            {"$set": {"value": value, "created_at": datetime.now(timezone.utc)}},
+            upsert=True
+        )
+
+"""Build the receipt cache for the configured backend
+
+Args:
+    backend (str): "memory" or "mongo"
+
+Returns:
+    MemoryReceiptCache | MongoReceiptCache: The cache backend
+"""
+def build_receipt_cache(backend: str = RECEIPT_CACHE_BACKEND):
+    if backend == "mongo":
+        return MongoReceiptCache(db.receipt_cache, RECEIPT_CACHE_TTL_SECONDS)
+    if backend == "memory":
+        return MemoryReceiptCache(RECEIPT_CACHE_SIZE, RECEIPT_CACHE_TTL_SECONDS)
+    raise ValueError(f"Unknown RECEIPT_CACHE_BACKEND: {backend}")
+
+receipt_cache = build_receipt_cache()
+receipt_cache_counters = {"image_hits": 0, "text_hits": 0, "misses": 0}
+
+"""Build the cache key of an uploaded image
+
+Args:
+    image_bytes (bytes): The uploaded image
+
+Returns:
+    str: The cache key
+"""
+def image_key(image_bytes: bytes):
+    return "image:" + hashlib.sha256(image_bytes).hexdigest()
+
+"""Build the cache key of OCR text
+
+Whitespace and case are normalized so OCR runs that only differ in
+spacing share an entry.
+
+Args:
+    text (str): The OCR text
+
+Returns:
+    str: The cache key
+"""
+def text_key(text: str):
+    normalized = " ".join(text.lower().split())
+    return "text:" + hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+"""Get the receipt cache counters
+
+Returns:
+    dict: The backend and its hit/miss counters
+"""
+def receipt_cache_stats():
+    return {"backend": RECEIPT_CACHE_BACKEND, **receipt_cache_counters}
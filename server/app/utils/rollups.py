@@ -0,0 +1,218 @@
+from pymongo import UpdateOne
+from app.db import db
+
+# CONSTANT: Totals that differ by less than this are not reported as drift
+DRIFT_TOLERANCE = 0.005
+
+"""Build the id of a rollup document
+
+Args:
+    email (str): The owner of the expenses
+    month (str): The month in YYYY-MM format
+    expense_type (str): The expense type
+
+Returns:
+    str: The rollup document id
+"""
+def rollup_id(email: str, month: str, expense_type: str):
+    return f"{email}|{month}|{expense_type}"
+
+"""Get the amount of an expense as a float
+
+Args:
+    expense (dict): The expense document
+
+Returns:
+    float: The expense total, 0 if it can't be parsed
+"""
+def expense_amount(expense: dict):
+    try:
+        return float(expense.get("expenseTotal", 0) or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+"""Build the $inc operation that adds or removes an expense from its rollup
+
+Args:
+    email (str): The owner of the expense
+    expense (dict): The expense document
+    sign (int): 1 to add the expense, -1 to remove it
+
+Returns:
+    UpdateOne: The upsert operation
+"""
+def rollup_operation(email: str, expense: dict, sign: int = 1):
+    month = str(expense.get("expenseDate", ""))[:7]
+    expense_type = expense.get("expense-type", "")
+    return UpdateOne(
+        {"_id": rollup_id(email, month, expense_type)},
+        {
+            "$inc": {"total": sign * expense_amount(expense), "count": sign},
+            "$setOnInsert": {"user": email, "month": month, "expense-type": expense_type}
+        },
+        upsert=True
+    )
+
+"""Apply expense changes to the rollups
+
+Args:
+    email (str): The owner of the expenses
+    added (list, optional): Expenses that were created
+    removed (list, optional): Expenses that were deleted
+
+Returns:
+    None
+"""
+async def apply_rollups(email: str, added: list = (), removed: list = ()):
+    operations = [rollup_operation(email, expense, 1) for expense in added]
+    operations += [rollup_operation(email, expense, -1) for expense in removed]
+    if operations:
+        await db.expense_rollups.bulk_write(operations, ordered=False)
+
+"""Read the rollups of a user for a range of months
+
+Args:
+    email (str): The owner of the expenses
+    start_month (str, optional): The first month to include (YYYY-MM)
+    end_month (str, optional): The last month to include (YYYY-MM)
+
+Returns:
+    list: The rollup documents, ordered by month
+"""
+async def get_rollups(email: str, start_month: str = None, end_month: str = None):
+    query = {"user": email, "count": {"$gt": 0}}
+    month_range = {}
+    if start_month:
+        month_range["$gte"] = start_month
+    if end_month:
+        month_range["$lte"] = end_month
+    if month_range:
+        query["month"] = month_range
+    return await db.expense_rollups.find(query).sort("month", 1).to_list(length=None)
+
+"""List the users that have expenses or rollups
+
+Returns:
+    list: The user emails, sorted
+"""
+async def rollup_users():
+    users = set(await db.expenses.distinct("user"))
+    users.update(await db.expense_rollups.distinct("user"))
+    return sorted(users)
+
+"""Recompute the rollups of a user from the expenses collection
+
+Args:
+    email (str): The owner of the expenses
+
+Returns:
+    dict: The expected rollup documents keyed by their id
+"""
+async def compute_rollups(email: str):
+    pipeline = [
+        {"$match": {"user": email}},
+        {"$group": {
+            "_id": {"month": {"$substrBytes": ["$expenseDate", 0, 7]}, "type": "$expense-type"},
+            "total": {"$sum": {"$convert": {"input": "$expenseTotal", "to": "double", "onError": 0, "onNull": 0}}},
+            "count": {"$sum": 1}
+        }}
+    ]
+    expected = {}
+    async for row in db.expenses.aggregate(pipeline):
+        key = row["_id"]
+        expected[rollup_id(email, key["month"], key["type"])] = {
+            "user": email,
+            "month": key["month"],
+            "expense-type": key["type"],
+            "total": row["total"],
+            "count": row["count"]
+        }
+    return expected
+
+"""Compare the stored rollups of a user with rollups recomputed from the expenses
+
+Args:
+    email (str): The owner of the expenses
+
+Returns:
+    list: One entry per drifting rollup with its stored and expected totals
+"""
+async def verify_user_rollups(email: str):
+    expected = await compute_rollups(email)
+    drift = []
+    seen = set()
+    async for stored in db.expense_rollups.find({"user": email}):
+        seen.add(stored["_id"])
+        wanted = expected.get(stored["_id"], {"total": 0.0, "count": 0})
+        if stored.get("count", 0) != wanted["count"] or abs(stored.get("total", 0) - wanted["total"]) > DRIFT_TOLERANCE:
+            drift.append({
+                "_id": stored["_id"],
+                "stored": {"total": stored.get("total", 0), "count": stored.get("count", 0)},
+                "expected": {"total": wanted["total"], "count": wanted["count"]}
+            })
+    for key, wanted in expected.items():
+        if key not in seen:
+            drift.append({
+                "_id": key,
+                "stored": None,
+                "expected": {"total": wanted["total"], "count": wanted["count"]}
+            })
+    return drift
+
+"""Compare the stored rollups with rollups recomputed from the expenses
+
+Users are verified one at a time, so only one user's rollups are held in
+memory.
+
+Args:
+    email (str, optional): Only verify the rollups of this user
+
+Returns:
+    list: One entry per drifting rollup with its stored and expected totals
+"""
+async def verify_rollups(email: str = None):
+    drift = []
+    for user in [email] if email else await rollup_users():
+        drift += await verify_user_rollups(user)
+    return drift
+
+"""Overwrite the rollups of a user with values recomputed from the expenses
+
+Rollups that no longer have any expense are deleted.
+
+Args:
+    email (str): The owner of the expenses
+
+Returns:
+    dict: The number of rollups written and deleted
+"""
+async def rebuild_user_rollups(email: str):
+    expected = await compute_rollups(email)
+    operations = [
+        UpdateOne({"_id": key}, {"$set": values}, upsert=True)
+        for key, values in expected.items()
+    ]
+    if operations:
+        await db.expense_rollups.bulk_write(operations, ordered=False)
+    result = await db.expense_rollups.delete_many({"user": email, "_id": {"$nin": list(expected.keys())}})
+    return {"written": len(operations), "deleted": result.deleted_count}
+
+"""Overwrite the rollups with values recomputed from the expenses
+
+Users are rebuilt one at a time, so the stale rollup filter only ever
+lists one user's months. Expenses written while the rebuild runs can be
+lost from the totals, so run verify afterwards.
+
+Args:
+    email (str, optional): Only rebuild the rollups of this user
+
+Returns:
+    dict: The number of rollups written and deleted
+"""
+async def rebuild_rollups(email: str = None):
+    totals = {"written": 0, "deleted": 0}
+    for user in [email] if email else await rollup_users():
+        result = await rebuild_user_rollups(user)
+        totals["written"] += result["written"]
+        totals["deleted"] += result["deleted"]
+    return totals
@@ -0,0 +1,75 @@
+from contextvars import ContextVar
+from dotenv import load_dotenv
+from app.db import db
+from app.utils.cache import TTLCache
+import os
+
+load_dotenv()
+
+# CONSTANT: Size and lifetime of the process-wide user document cache
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", "10"))
+
+# CONSTANT: Fields never kept in the cache; password checks always go to the database
+USER_PROJECTION = {"hashed_password": 0, "expenses": 0}
+
+user_cache = TTLCache(USER_CACHE_SIZE, USER_CACHE_TTL_SECONDS)
+
+# Request-scoped identity map: the same user is fetched at most once per request
+_identity_map: ContextVar[dict | None] = ContextVar("user_identity_map", default=None)
+
+"""Start a fresh identity map for the current request
+
+Returns:
+    Token: The context token to pass to end_identity_map
+"""
+def begin_identity_map():
+    return _identity_map.set({})
+
+"""Drop the identity map of the current request
+
+Args:
+    token (Token): The token returned by begin_identity_map
+
+Returns:
+    None
+"""
+def end_identity_map(token):
+    _identity_map.reset(token)
+
+"""Find a user document by email, going through the identity map and the cache
+
+Args:
+    email (str): The email of the user
+
+Returns:
+    dict: The user document without the password hash, or None
+"""
+async def find_user(email: str):
+    identity_map = _identity_map.get()
+    if identity_map is not None and email in identity_map:
+        return identity_map[email]
+
+    user = user_cache.get(email)
+    if user is None:
+        user = await db.users.find_one({"email": email}, USER_PROJECTION)
+        if user is not None:
+            user_cache.set(email, user)
+
+    if identity_map is not None and user is not None:
+        identity_map[email] = user
+    return user
+
+"""Forget the cached user document after a write
+
+Args:
+    email (str): The email of the user that was modified
+
+Returns:
+    None
+"""
+def invalidate_user(email: str):
+    user_cache.invalidate(email)
+    identity_map = _identity_map.get()
+    if identity_map is not None:
+        identity_map.pop(email, None)
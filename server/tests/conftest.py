@@ -0,0 +1,25 @@
+import os
+import sys
+
+# The helpers under test import app.db, which needs these settings; Motor
+# connects lazily, so no Mongo server is contacted.
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "finance_test")
+os.environ.setdefault("SECRET_KEY", "test-secret")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "30")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+@pytest.fixture
+def mongo(monkeypatch):
+    """An in-memory database swapped in for app.db.db in every loaded module."""
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    from app import db as db_module
+    real, fake = db_module.db, mongomock_motor.AsyncMongoMockClient()[db_module.DB_NAME]
+    for name, module in list(sys.modules.items()):
+        if name.startswith("app") and getattr(module, "db", None) is real:
+            monkeypatch.setattr(module, "db", fake)
+    return fake
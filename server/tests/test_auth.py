@@ -0,0 +1,33 @@
+from datetime import timedelta
+import pytest
+from app.utils.auth import (
+    CredentialsException, create_access_token, token_cache, token_digest,
+    token_epoch, token_is_current, verify_token
+)
+
+def test_token_epoch_defaults_to_zero():
+    assert token_epoch({"sub": "a@b.co"}) == 0
+    assert token_epoch({"sub": "a@b.co", "ep": 3}) == 3
+
+def test_token_is_current_compares_epochs():
+    assert token_is_current({"ep": 0}, {})
+    assert token_is_current({"ep": 2}, {"token_epoch": 2})
+    assert not token_is_current({"ep": 1}, {"token_epoch": 2})
+    assert not token_is_current({}, {"token_epoch": 1})
+
+def test_verify_token_caches_valid_tokens():
+    token = create_access_token({"sub": "a@b.co", "ep": 1}, timedelta(minutes=5))
+    token_cache.invalidate(token_digest(token))
+    claims = verify_token(token)
+    assert claims["sub"] == "a@b.co"
+    assert token_cache.get(token_digest(token)) == claims
+
+def test_verify_token_rejects_expired_and_invalid_tokens():
+    expired = create_access_token({"sub": "a@b.co"}, timedelta(seconds=-5))
+    with pytest.raises(CredentialsException) as first:
+        verify_token(expired)
+    with pytest.raises(CredentialsException) as second:
+        verify_token("not-a-token")
+    assert first.value.status_code == 401
+    assert first.value is not second.value
+    assert token_cache.get(token_digest("not-a-token")) is None
@@ -0,0 +1,39 @@
+from app.utils import cache as cache_module
+from app.utils.cache import TTLCache
+
+def test_get_and_stats():
+    cache = TTLCache(maxsize=4, ttl=30)
+    cache.set("a", 1)
+    assert cache.get("a") == 1
+    assert cache.get("b", "missing") == "missing"
+    assert cache.stats() == {"size": 1, "maxsize": 4, "ttl": 30, "hits": 1, "misses": 1, "evictions": 0, "hit_rate": 0.5}
+
+def test_entries_expire(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(cache_module.time, "monotonic", lambda: now[0])
+    cache = TTLCache(ttl=10)
+    cache.set("a", 1)
+    cache.set("b", 2, ttl=60)
+    now[0] += 10
+    assert cache.get("a") is None
+    assert cache.get("b") == 2
+    assert len(cache) == 1
+
+def test_least_recently_used_is_evicted():
+    cache = TTLCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
+
+def test_invalidate_and_clear():
+    cache = TTLCache()
+    cache.set("a", 1)
+    assert cache.invalidate("a") is True
+    assert cache.invalidate("a") is False
+    cache.set("b", 2)
+    cache.clear()
+    assert len(cache) == 0
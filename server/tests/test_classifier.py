@@ -0,0 +1,40 @@
+import pytest
+from app.utils import classifier
+from app.utils.classifier import classify, fit, normalize_name, set_model, suggest_expense_type
+
+@pytest.fixture(autouse=True)
+def no_trained_model():
+    previous = classifier._model
+    set_model(None)
+    yield
+    set_model(previous)
+
+def test_normalize_name():
+    assert normalize_name("Trader Joe's #552") == "trader joes 552"
+    assert normalize_name("  A&W  ") == "a w"
+
+def test_known_merchants_match_exactly_or_by_leading_tokens():
+    assert classify("Costco") == ("needs", 1.0)
+    assert classify("STARBUCKS COFFEE #1234") == ("wants", 0.95)
+    assert classify("Bell Canada bill") == ("savings", 0.95)
+
+def test_merchant_names_inside_other_names_do_not_match():
+    assert classify("Taco Bell") == (None, 0.0)
+    assert classify("A W Restaurant") == (None, 0.0)
+    assert classify("Seashell Gifts") == (None, 0.0)
+
+def test_trained_model_learns_merchants_and_tokens():
+    samples = [("Corner Deli", "wants")] * 3 + [
+        ("fresh bread", "needs"), ("bread and milk", "needs"), ("milk", "needs"),
+        ("movie night", "wants"), ("movie snacks", "wants"),
+    ]
+    set_model(fit(samples))
+    assert classify("corner deli") == ("wants", 1.0)
+    expense_type, confidence = classify("milk bread")
+    assert expense_type == "needs" and confidence > 0.5
+    assert classify("unseen words") == (None, 0.0)
+
+def test_suggest_expense_type_falls_back_to_the_default():
+    assert suggest_expense_type("Walmart", default="savings") == "needs"
+    assert suggest_expense_type("Mystery Shop", default="savings") == "savings"
+    assert suggest_expense_type("", default=None) is None
@@ -0,0 +1,21 @@
+import pytest
+from fastapi import HTTPException
+from app.controllers.user import decode_expense_cursor, encode_expense_cursor, parse_date_param
+
+def test_cursor_round_trip():
+    cursor = encode_expense_cursor({"expenseDate": "2024-10-05", "_id": "66f0c0ffee0000000000abcd", "expenseTotal": 3})
+    assert decode_expense_cursor(cursor) == ("2024-10-05", "66f0c0ffee0000000000abcd")
+    assert "/" not in cursor and "+" not in cursor
+
+@pytest.mark.parametrize("cursor", ["not-base64!", "bm90IGpzb24=", "WzFd"])
+def test_bad_cursor_is_a_400(cursor):
+    with pytest.raises(HTTPException) as error:
+        decode_expense_cursor(cursor)
+    assert error.value.status_code == 400
+
+def test_parse_date_param():
+    assert parse_date_param("2024-03-05", "start") == "2024-03-05"
+    with pytest.raises(HTTPException) as error:
+        parse_date_param("03/05/2024", "start")
+    assert error.value.status_code == 400
+    assert "start" in error.value.detail
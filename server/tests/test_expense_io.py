@@ -0,0 +1,87 @@
+import asyncio
+import pytest
+from app.utils import expense_io
+from app.utils.expense_io import EXPENSE_EXPORT_FIELDS, detect_format, format_rows, parse_rows, validate_row
+
+async def stream(*chunks):
+    for chunk in chunks:
+        yield chunk
+
+def collect(chunks, format):
+    async def run():
+        return [row async for row in parse_rows(stream(*chunks), format)]
+    return asyncio.run(run())
+
+@pytest.mark.parametrize("requested, content_type, expected", [
+    ("csv", "application/x-ndjson", "csv"),
+    ("xml", None, None),
+    (None, "text/csv; charset=utf-8", "csv"),
+    (None, "application/x-ndjson", "ndjson"),
+    (None, "application/json", "ndjson"),
+    (None, None, None),
+])
+def test_detect_format(requested, content_type, expected):
+    assert detect_format(requested, content_type) == expected
+
+def test_csv_rows_split_across_chunks():
+    body = "\ufeffexpense-type,expenseDate,expenseTotal,expense-name\r\nneeds,2024-10-05,12.5,\"Rent, October\"\r\n\r\nwants,2024-10-06,3\n".encode()
+    chunks = [body[i:i + 7] for i in range(0, len(body), 7)]
+    assert collect(chunks, "csv") == [
+        (1, {"expense-type": "needs", "expenseDate": "2024-10-05", "expenseTotal": "12.5", "expense-name": "Rent, October"}),
+        (2, "expected 4 columns, got 3"),
+    ]
+
+def test_ndjson_errors_are_per_row():
+    rows = collect([b'{"expense-name": "Coffee"}\n[1, 2]\n{bad', b' json}'], "ndjson")
+    assert rows[0] == (1, {"expense-name": "Coffee"})
+    assert rows[1] == (2, "expected a JSON object")
+    assert rows[2][0] == 3 and rows[2][1].startswith("invalid JSON")
+
+def test_validate_row():
+    (expense, expense_id), error = validate_row({"_id": "abc", "expense-type": "", "expenseDate": "2024-10-05", "expenseTotal": "12.5", "expense-name": "Rent"})
+    assert error is None
+    assert expense_id == "abc"
+    assert expense == {"expense-type": None, "expenseDate": "2024-10-05", "expenseTotal": 12.5, "expense-name": "Rent"}
+
+def test_validate_row_errors():
+    assert validate_row({"_id": 5, "expenseDate": "2024-10-05", "expenseTotal": 1, "expense-name": "x"}) == (None, "_id must be a string")
+    result, error = validate_row({"expenseDate": "2024-10-05", "expenseTotal": "lots"})
+    assert result is None
+    assert "expenseTotal" in error and "expense-name" in error
+
+def test_format_rows_round_trips_through_parse_rows():
+    expenses = [{"_id": "abc", "expense-type": "needs", "expenseDate": "2024-10-05", "expenseTotal": 12.5, "expense-name": "Rent, October"}]
+    csv_rows = collect([format_rows(expenses, "csv", header=True).encode()], "csv")
+    assert csv_rows == [(1, {field: str(value) for field, value in expenses[0].items()})]
+    ndjson_rows = collect([format_rows(expenses, "ndjson").encode()], "ndjson")
+    assert ndjson_rows == [(1, {field: expenses[0][field] for field in EXPENSE_EXPORT_FIELDS})]
+
+def test_overlong_lines_are_row_errors(monkeypatch):
+    monkeypatch.setattr(expense_io, "EXPENSE_IMPORT_MAX_LINE_LENGTH", 40)
+    long_line = b'{"expense-name": "' + b"x" * 100 + b'"}\n'
+    body = b'{"expense-name": "a"}\n' + long_line + b'{"expense-name": "b"}\n' + b"y" * 100
+    chunks = [body[i:i + 16] for i in range(0, len(body), 16)]
+    assert collect(chunks, "ndjson") == [
+        (1, {"expense-name": "a"}),
+        (2, "line longer than 40 characters"),
+        (3, {"expense-name": "b"}),
+        (4, "line longer than 40 characters"),
+    ]
+
+def test_an_overlong_csv_header_ends_the_import(monkeypatch):
+    monkeypatch.setattr(expense_io, "EXPENSE_IMPORT_MAX_LINE_LENGTH", 10)
+    assert collect([b"expense-type,expenseDate\nneeds,2024-10-05\n"], "csv") == [(0, "header row longer than 10 characters")]
+
+@pytest.mark.parametrize("value, valid", [
+    ("2024-10-05", True),
+    ("2024-10-05T12:30:00", True),
+    ("2024-02-30", False),
+    ("05/10/2024", False),
+    ("2024-1-5", False),
+    ("yesterday", False),
+])
+def test_validate_row_checks_the_date(value, valid):
+    result, error = validate_row({"expenseDate": value, "expenseTotal": "1", "expense-name": "x"})
+    assert (error is None) is valid
+    if not valid:
+        assert error.startswith("expenseDate")
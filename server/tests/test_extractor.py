@@ -0,0 +1,60 @@
+from datetime import datetime, timedelta
+from app.utils.model import extract_date, extract_receipt_fields, extract_total, normalize_amount, parse_receipt_locally
+
+HARDWARE_RECEIPT = """BOB'S HARDWARE
+2024-03-05
+HAMMER 12.99
+NAILS 1.69
+SUB-TOTAL 14.68
+TOTAL 14.68
+TOTAL SAVINGS 2.00
+"""
+
+GROCERY_RECEIPT = """FRESH MARKET
+123 Main Street
+03/05/2024
+MILK 4.99
+BREAD 3.49
+SUBTOTAL 8.48
+TAX 0.00
+TOTAL 8.48
+TOTAL ITEMS 2
+"""
+
+def test_normalize_amount():
+    assert normalize_amount("1,234.50") == "1234.50"
+    assert normalize_amount("12,50") == "12.50"
+
+def test_extract_total_ignores_savings_and_subtotal_lines():
+    lines = HARDWARE_RECEIPT.splitlines()
+    assert extract_total(lines) == ("14.68", True)
+    assert extract_total(["SUB-TOTAL 9.00", "SUB TOTAL 9.00", "TOTAL DISCOUNT 1.00"]) == ("9.00", False)
+
+def test_extract_total_prefers_strong_lines_and_the_largest_total():
+    assert extract_total(["TOTAL 10.00", "AMOUNT DUE 11.50"]) == ("11.50", True)
+    assert extract_total(["TOTAL TAX 1.20", "TOTAL 21.20"]) == ("21.20", True)
+
+def test_extract_total_falls_back_to_the_largest_amount():
+    assert extract_total(["COFFEE 3.50", "MUFFIN 4.25"]) == ("4.25", False)
+    assert extract_total(["THANK YOU"]) == (None, False)
+
+def test_extract_date_formats():
+    assert extract_date("Date: 2024-03-05 10:31") == "2024-03-05"
+    assert extract_date("03/05/2024") == "2024-03-05"
+    assert extract_date("Mar 5, 2024") == "2024-03-05"
+    assert extract_date("5 March 2024") == "2024-03-05"
+    assert extract_date("no date here") is None
+
+def test_extract_date_skips_future_dates():
+    future = (datetime.now() + timedelta(days=30)).strftime("%Y-%m-%d")
+    assert extract_date(future) is None
+
+def test_receipt_without_category_needs_the_llm():
+    fields = extract_receipt_fields(HARDWARE_RECEIPT)
+    assert fields["total"] == "14.68"
+    assert "expense-type" in fields["missing"]
+    assert parse_receipt_locally(HARDWARE_RECEIPT) is None
+
+def test_complete_receipt_takes_the_fast_path():
+    parsed = parse_receipt_locally(GROCERY_RECEIPT)
+    assert parsed == {"expense-type": "needs", "date": "2024-03-05", "total": "8.48", "expense-name": "Fresh Market"}
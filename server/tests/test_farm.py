@@ -0,0 +1,27 @@
+import asyncio
+from types import SimpleNamespace
+from app.controllers import user as user_controller
+from app.controllers.user import FARM_EXPAND_COST, FARM_MAX_LEVEL, FARM_PIGS_PER_SCENE, FARM_UPGRADE_COST, farm_upgrade_cost
+
+def test_upgrade_cost_expands_at_scene_boundaries():
+    assert farm_upgrade_cost(1) == FARM_UPGRADE_COST
+    assert farm_upgrade_cost(FARM_PIGS_PER_SCENE - 1) == FARM_UPGRADE_COST
+    assert farm_upgrade_cost(FARM_PIGS_PER_SCENE) == FARM_EXPAND_COST
+    assert farm_upgrade_cost(FARM_PIGS_PER_SCENE + 1) == FARM_UPGRADE_COST
+
+def test_total_cost_to_max_level():
+    expansions = (FARM_MAX_LEVEL - 1) // FARM_PIGS_PER_SCENE
+    total = sum(farm_upgrade_cost(level) for level in range(1, FARM_MAX_LEVEL))
+    assert total == expansions * FARM_EXPAND_COST + (FARM_MAX_LEVEL - 1 - expansions) * FARM_UPGRADE_COST
+
+def level_up(mongo, document):
+    async def run():
+        await mongo.users.insert_one(document)
+        return await user_controller.level_up(SimpleNamespace(email=document["email"]))
+    return asyncio.run(run())
+
+def test_level_up_treats_a_missing_level_as_level_one(mongo):
+    assert level_up(mongo, {"email": "new@b.c"}) == {"message": "User leveled up successfully", "level": 2}
+
+def test_level_up_stops_at_the_maximum_level(mongo):
+    assert level_up(mongo, {"email": "max@b.c", "level": FARM_MAX_LEVEL}) == {"message": "User has reached the maximum level"}
@@ -0,0 +1,30 @@
+from app.utils.indexes import INDEXES, summarize_plan
+
+def test_declared_index_names_are_unique_per_collection():
+    names = [(index["collection"], index["name"]) for index in INDEXES]
+    assert len(names) == len(set(names))
+
+def test_summarize_plan_reads_classic_plans():
+    explain = {
+        "queryPlanner": {"winningPlan": {
+            "stage": "LIMIT",
+            "inputStage": {"stage": "FETCH", "inputStage": {"stage": "IXSCAN", "indexName": "user_expenseDate"}}
+        }},
+        "executionStats": {"totalKeysExamined": 10, "totalDocsExamined": 10, "nReturned": 10}
+    }
+    assert summarize_plan(explain) == {
+        "stages": ["LIMIT", "FETCH", "IXSCAN"],
+        "indexes": ["user_expenseDate"],
+        "collection_scan": False,
+        "keys_examined": 10,
+        "docs_examined": 10,
+        "returned": 10
+    }
+
+def test_summarize_plan_reads_slot_based_plans_and_collection_scans():
+    explain = {"queryPlanner": {"winningPlan": {"queryPlan": {
+        "stage": "OR", "inputStages": [{"stage": "COLLSCAN"}, {"stage": "IXSCAN", "indexName": "email_unique"}]
+    }}}}
+    summary = summarize_plan(explain)
+    assert summary["collection_scan"]
+    assert summary["indexes"] == ["email_unique"]
@@ -0,0 +1,46 @@
+import asyncio
+from datetime import datetime
+from app.utils import insights_cache
+from app.utils.insights_cache import in_precompute_window, insights_fingerprint, precompute_retry_delay
+
+def test_fingerprint_ignores_key_order():
+    assert insights_fingerprint({"a": 1, "b": [1, 2]}) == insights_fingerprint({"b": [1, 2], "a": 1})
+    assert insights_fingerprint({"a": 1}) != insights_fingerprint({"a": 2})
+
+def test_precompute_window(monkeypatch):
+    monkeypatch.setattr(insights_cache, "INSIGHTS_PRECOMPUTE_HOURS", "2-5")
+    assert in_precompute_window(datetime(2024, 1, 1, 2))
+    assert not in_precompute_window(datetime(2024, 1, 1, 5))
+    monkeypatch.setattr(insights_cache, "INSIGHTS_PRECOMPUTE_HOURS", "22-3")
+    assert in_precompute_window(datetime(2024, 1, 1, 23))
+    assert in_precompute_window(datetime(2024, 1, 1, 1))
+    assert not in_precompute_window(datetime(2024, 1, 1, 12))
+    monkeypatch.setattr(insights_cache, "INSIGHTS_PRECOMPUTE_HOURS", "")
+    assert not in_precompute_window(datetime(2024, 1, 1, 2))
+
+def test_precompute_retry_delay_backs_off_up_to_the_cap(monkeypatch):
+    monkeypatch.setattr(insights_cache, "INSIGHTS_PRECOMPUTE_INTERVAL_SECONDS", 300)
+    monkeypatch.setattr(insights_cache, "INSIGHTS_PRECOMPUTE_MAX_BACKOFF_SECONDS", 3600)
+    assert [precompute_retry_delay(attempts) for attempts in (1, 2, 3, 4, 10)] == [300, 600, 1200, 2400, 3600]
+
+def test_precompute_loop_survives_a_failing_batch(monkeypatch):
+    async def run():
+        calls = []
+        second_batch = asyncio.Event()
+
+        async def refresh_stale_insights(refresh):
+            calls.append(refresh)
+            if len(calls) == 1:
+                raise RuntimeError("mongo is down")
+            second_batch.set()
+
+        monkeypatch.setattr(insights_cache, "INSIGHTS_PRECOMPUTE_INTERVAL_SECONDS", 0)
+        monkeypatch.setattr(insights_cache, "in_precompute_window", lambda: True)
+        monkeypatch.setattr(insights_cache, "refresh_stale_insights", refresh_stale_insights)
+        task = asyncio.create_task(insights_cache.precompute_insights_loop(None))
+        await asyncio.wait_for(second_batch.wait(), 1)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        return task.cancelled()
+
+    assert asyncio.run(run())
@@ -0,0 +1,33 @@
+from app.controllers.user import build_summary_pipeline
+from app.utils.model import INSIGHTS_CONTEXT, build_insights_prompt, estimate_tokens
+
+USER_DATA = {
+    "window_days": 30,
+    "budget": 200,
+    "total": 150,
+    "categories": {"needs": {"total": 100, "percentage": 66.7, "count": 3}, "wants": {"total": 50, "percentage": 33.3, "count": 2}},
+    "top_expenses": [
+        {"expenseDate": "2024-10-0%d" % day, "expense-type": "needs", "expense-name": "Groceries %d" % day, "expenseTotal": 50 - day}
+        for day in range(1, 6)
+    ],
+}
+
+def test_prompt_states_the_window_and_budget_use():
+    prompt, tokens = build_insights_prompt(USER_DATA)
+    assert prompt.startswith(INSIGHTS_CONTEXT)
+    assert "Period: last 30 days" in prompt
+    assert "Budget: $200.00 (75% used)" in prompt
+    assert "savings: $0.00 (0%, 0 expenses)" in prompt
+    assert tokens == estimate_tokens(prompt)
+
+def test_prompt_drops_the_smallest_expenses_to_fit_the_budget():
+    full, full_tokens = build_insights_prompt(USER_DATA)
+    trimmed, tokens = build_insights_prompt(USER_DATA, token_budget=full_tokens - 1)
+    assert tokens < full_tokens
+    assert "Groceries 1" in trimmed
+    assert "Groceries 5" not in trimmed
+
+def test_insights_pipeline_has_no_series_facet():
+    pipeline = build_summary_pipeline({"user": "a@b.co"})
+    assert list(pipeline[-1]["$facet"]) == ["categories"]
+    assert list(build_summary_pipeline({"user": "a@b.co"}, "month")[-1]["$facet"]) == ["categories", "series"]
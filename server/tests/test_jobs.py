@@ -0,0 +1,97 @@
+import asyncio
+from datetime import timedelta
+import pytest
+from app.utils import jobs
+from app.utils.jobs import MemoryJobQueue, MongoJobQueue, retry_delay
+
+@pytest.fixture
+def queue_settings(monkeypatch):
+    monkeypatch.setattr(jobs, "OCR_JOB_MAX_ATTEMPTS", 2)
+    monkeypatch.setattr(jobs, "OCR_JOB_RETRY_BACKOFF_SECONDS", 0.05)
+    monkeypatch.setattr(jobs, "OCR_JOB_POLL_SECONDS", 0.01)
+
+async def claim_now(queue, timeout=0.02):
+    try:
+        return await asyncio.wait_for(queue.claim(), timeout)
+    except asyncio.TimeoutError:
+        return None
+
+def test_retry_delay_doubles():
+    assert retry_delay(1) == timedelta(seconds=jobs.OCR_JOB_RETRY_BACKOFF_SECONDS)
+    assert retry_delay(3) == 4 * retry_delay(1)
+
+def test_memory_queue_backs_off_then_dead_letters(queue_settings):
+    async def run():
+        queue = MemoryJobQueue()
+        job = await queue.enqueue(b"image")
+        claimed = await claim_now(queue)
+        assert claimed["attempts"] == 1
+        assert await queue.fail(claimed, "boom")
+        assert (await queue.get(job["_id"]))["status"] == "queued"
+        assert await claim_now(queue) is None
+        claimed = await claim_now(queue, timeout=0.2)
+        assert claimed["attempts"] == 2
+        assert await queue.fail(claimed, "boom again")
+        assert queue.dead_letters[job["_id"]]["error"] == "boom again"
+        assert await claim_now(queue, timeout=0.2) is None
+
+    asyncio.run(run())
+
+def test_memory_queue_ignores_a_stale_lease(queue_settings):
+    async def run():
+        queue = MemoryJobQueue()
+        await queue.enqueue(b"image")
+        claimed = await claim_now(queue)
+        assert not await queue.complete({**claimed, "lease": "someone-else"}, {"expense-name": "Old"})
+        assert await queue.complete(claimed, {"expense-name": "New"})
+        assert (await queue.get(claimed["_id"]))["result"] == {"expense-name": "New"}
+
+    asyncio.run(run())
+
+def test_mongo_queue_backs_off_then_dead_letters(mongo, queue_settings):
+    async def run():
+        queue = MongoJobQueue(mongo.ocr_jobs, mongo.ocr_jobs_dead)
+        job = await queue.enqueue(b"image")
+        claimed = await claim_now(queue)
+        assert await queue.fail(claimed, "boom")
+        assert (await queue.get(job["_id"]))["status"] == "queued"
+        assert await claim_now(queue) is None
+        await asyncio.sleep(0.06)
+        claimed = await claim_now(queue)
+        assert claimed["attempts"] == 2
+        assert await queue.fail(claimed, "boom again")
+        assert (await queue.get(job["_id"]))["status"] == "dead"
+        assert (await mongo.ocr_jobs_dead.find_one({"_id": job["_id"]}))["error"] == "boom again"
+
+    asyncio.run(run())
+
+def test_mongo_queue_reclaims_expired_leases_and_fences_the_old_worker(mongo, queue_settings, monkeypatch):
+    monkeypatch.setattr(jobs, "OCR_JOB_LEASE_SECONDS", -1)
+
+    async def run():
+        queue = MongoJobQueue(mongo.ocr_jobs, mongo.ocr_jobs_dead)
+        job = await queue.enqueue(b"image")
+        first = await claim_now(queue)
+        second = await claim_now(queue)
+        assert second["attempts"] == 2 and second["lease"] != first["lease"]
+        assert not await queue.complete(first, {"expense-name": "Stale"})
+        assert not await queue.fail(first, "stale worker")
+        assert await queue.complete(second, {"expense-name": "Fresh"})
+        stored = await queue.get(job["_id"])
+        assert stored["status"] == "done" and stored["result"] == {"expense-name": "Fresh"}
+
+    asyncio.run(run())
+
+def test_mongo_queue_dead_letters_a_job_that_keeps_losing_its_lease(mongo, queue_settings, monkeypatch):
+    monkeypatch.setattr(jobs, "OCR_JOB_LEASE_SECONDS", -1)
+
+    async def run():
+        queue = MongoJobQueue(mongo.ocr_jobs, mongo.ocr_jobs_dead)
+        job = await queue.enqueue(b"image")
+        await claim_now(queue)
+        await claim_now(queue)
+        assert await claim_now(queue) is None
+        assert (await queue.get(job["_id"]))["status"] == "dead"
+        assert await mongo.ocr_jobs_dead.find_one({"_id": job["_id"]}) is not None
+
+    asyncio.run(run())
@@ -0,0 +1,46 @@
+import asyncio
+import logging
+import pytest
+from app.utils import log
+from app.utils.log import RequestIdMiddleware, parse_log_levels, request_id
+
+@pytest.fixture
+def fresh_logging(monkeypatch):
+    root = logging.getLogger()
+    saved = {name: (logging.getLogger(name).handlers[:], logging.getLogger(name).propagate) for name in log.UVICORN_LOGGERS}
+    saved_root = (root.handlers[:], root.level)
+    yield
+    log.shutdown_logging()
+    root.handlers[:], root.level = saved_root[0], saved_root[1]
+    for name, (handlers, propagate) in saved.items():
+        logging.getLogger(name).handlers[:] = handlers
+        logging.getLogger(name).propagate = propagate
+
+def test_parse_log_levels():
+    assert parse_log_levels("app.utils.model=debug, ,bad,app.db=ERROR") == {"app.utils.model": "DEBUG", "app.db": "ERROR"}
+
+def test_uvicorn_loggers_go_through_the_queue(fresh_logging):
+    access = logging.getLogger("uvicorn.access")
+    access.addHandler(logging.StreamHandler())
+    access.propagate = False
+    log.configure_logging()
+    assert access.handlers == [] and access.propagate
+    assert isinstance(logging.getLogger().handlers[0], log.QueueHandler)
+
+def test_request_id_is_set_while_the_response_is_sent():
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    seen = []
+
+    async def send(message):
+        # uvicorn writes its access line from inside send
+        seen.append((message, request_id.get()))
+
+    scope = {"type": "http", "headers": [(b"x-request-id", b"abc123")]}
+    asyncio.run(RequestIdMiddleware(app)(scope, None, send))
+    start, start_id = seen[0]
+    assert (b"x-request-id", b"abc123") in start["headers"]
+    assert start_id == "abc123" and seen[1][1] == "abc123"
+    assert request_id.get() is None
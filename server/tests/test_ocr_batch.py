@@ -0,0 +1,52 @@
+import asyncio
+import json
+from datetime import datetime
+from app.controllers import ocr
+from app.utils import model
+from app.utils.receipt_cache import MemoryReceiptCache, text_key
+
+def test_batch_larger_than_ocr_workers_reaches_the_llm_as_one_call(monkeypatch):
+    calls = []
+
+    async def fake_run_ocr(image_bytes):
+        await asyncio.sleep(0)
+        return "receipt " + image_bytes.decode()
+
+    async def fake_process_receipts_batch(texts):
+        calls.append(texts)
+        await asyncio.sleep(0.01)
+        return [{"expense-name": text} for text in texts]
+
+    monkeypatch.setattr(ocr, "OCR_WORKERS", 2)
+    monkeypatch.setattr(ocr, "run_ocr", fake_run_ocr)
+    monkeypatch.setattr(ocr, "receipt_cache", MemoryReceiptCache(100, 60))
+    monkeypatch.setattr(model, "RECEIPT_BATCH_SIZE", 4)
+    monkeypatch.setattr(model, "parse_receipt_locally", lambda text: None)
+    monkeypatch.setattr(model, "process_receipts_batch", fake_process_receipts_batch)
+
+    async def run():
+        uploads = [(f"{index}.png", str(index).encode()) for index in range(4)]
+        return [json.loads(line) async for line in ocr.stream_batch(uploads)]
+
+    results = asyncio.run(run())
+    assert len(calls) == 1
+    assert sorted(calls[0]) == [f"receipt {index}" for index in range(4)]
+    assert all(result["status"] == 200 for result in results)
+
+def test_receipts_dated_today_are_not_cached(monkeypatch):
+    today = datetime.now().strftime("%Y-%m-%d")
+    parsed = {"expense-name": "Cafe", "date": today}
+
+    async def parser(text):
+        return dict(parsed)
+
+    async def run():
+        cache = MemoryReceiptCache(100, 60)
+        monkeypatch.setattr(ocr, "receipt_cache", cache)
+        await ocr.parse_receipt_text("latte 4.50", parser)
+        parsed["date"] = "2024-10-05"
+        await ocr.parse_receipt_text("muffin 3.00", parser)
+        return await cache.get(text_key("latte 4.50")), await cache.get(text_key("muffin 3.00"))
+
+    assert asyncio.run(run()) == (None, {"expense-name": "Cafe", "date": "2024-10-05"})
+    assert not ocr.is_cacheable({"expense-name": ocr.UNPARSED_EXPENSE_NAME, "date": "2024-10-05"})
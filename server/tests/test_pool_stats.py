@@ -0,0 +1,38 @@
+from types import SimpleNamespace
+from app import db
+from app.db import PoolStatsListener
+
+PRIMARY = ("db1", 27017)
+
+def check_out(listener, address=PRIMARY):
+    listener.connection_check_out_started(SimpleNamespace(address=address))
+    listener.connection_checked_out(SimpleNamespace(address=address, duration=0.002))
+
+def test_idle_checkouts_are_not_counted_as_waiting(monkeypatch):
+    monkeypatch.setattr(db, "MONGO_MAX_POOL_SIZE", 2)
+    listener = PoolStatsListener()
+    check_out(listener)
+    check_out(listener, ("db2", 27017))
+    stats = listener.stats()
+    assert stats["checked_out"] == 2
+    assert stats["checkouts_in_progress"] == 0
+    assert stats["checkouts_at_capacity"] == 0
+    assert stats["wait_time"]["count"] == 2
+
+def test_checkouts_started_on_a_full_pool_are_at_capacity(monkeypatch):
+    monkeypatch.setattr(db, "MONGO_MAX_POOL_SIZE", 2)
+    listener = PoolStatsListener()
+    check_out(listener)
+    check_out(listener)
+    listener.connection_check_out_started(SimpleNamespace(address=PRIMARY))
+    assert listener.stats()["checkouts_in_progress"] == 1
+    assert listener.stats()["checkouts_at_capacity"] == 1
+
+    listener.connection_checked_in(SimpleNamespace(address=PRIMARY))
+    listener.connection_checked_out(SimpleNamespace(address=PRIMARY, duration=0.05))
+    listener.connection_check_out_started(SimpleNamespace(address=PRIMARY))
+    listener.connection_check_out_failed(SimpleNamespace(address=PRIMARY))
+    stats = listener.stats()
+    assert stats["checkouts_in_progress"] == 0
+    assert stats["checkouts_at_capacity"] == 2
+    assert stats["checkout_failures"] == 1
@@ -0,0 +1,40 @@
+import asyncio
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from fastapi import HTTPException
+from app.utils import model
+
+def call_llm(monkeypatch, response, call=lambda: model.post_prompt({"prompt": "hi"})):
+    async def prompt(request):
+        return response()
+
+    async def run():
+        app = web.Application()
+        app.router.add_post("/prompt", prompt)
+        async with TestServer(app) as server:
+            monkeypatch.setattr(model, "LLM_HOST", server.host)
+            monkeypatch.setattr(model, "LLM_PORT", server.port)
+            try:
+                return await call()
+            finally:
+                await model.close_llm_session()
+
+    return asyncio.run(run())
+
+def test_post_prompt_decodes_the_response(monkeypatch):
+    assert call_llm(monkeypatch, lambda: web.json_response([{"generated_text": "ok"}])) == [{"generated_text": "ok"}]
+
+@pytest.mark.parametrize("status", [429, 503])
+def test_post_prompt_maps_error_statuses_to_502(monkeypatch, status):
+    with pytest.raises(HTTPException) as error:
+        call_llm(monkeypatch, lambda: web.Response(status=status, text="busy"))
+    assert error.value.status_code == 502
+
+def test_stream_insights_raises_instead_of_relaying_an_error_body(monkeypatch):
+    async def stream():
+        return [token async for token in model.stream_insights({"summary": {}})]
+
+    with pytest.raises(HTTPException) as error:
+        call_llm(monkeypatch, lambda: web.Response(status=500, text="Internal Server Error"), stream)
+    assert error.value.status_code == 502
@@ -0,0 +1,42 @@
+from PIL import Image, ImageDraw
+from app.utils.preprocess import crop_to_content, histogram_percentile, otsu_threshold, preprocess_image, tesseract_config
+
+def two_tone(dark: int, light: int, dark_pixels: int, size: int = 100):
+    image = Image.new("L", (size, 1), light)
+    for x in range(dark_pixels):
+        image.putpixel((x, 0), dark)
+    return image
+
+def test_otsu_threshold_separates_ink_from_paper():
+    threshold = otsu_threshold(two_tone(30, 220, 20))
+    assert 30 <= threshold < 220
+
+def test_histogram_percentile():
+    image = two_tone(0, 200, 90)
+    assert histogram_percentile(image, 0.5) == 0
+    assert histogram_percentile(image, 0.95) == 200
+
+def receipt_photo(glare: bool = False):
+    # A 1200x1600 photo whose printed lines cover a 241px wide strip near the middle
+    photo = Image.new("L", (1200, 1600), 180)
+    draw = ImageDraw.Draw(photo)
+    for y in range(450, 1150, 40):
+        draw.rectangle((480, y, 720, y + 12), fill=20)
+    if glare:
+        draw.rectangle((10, 10, 14, 14), fill=255)
+    return photo
+
+def test_crop_ignores_a_glare_highlight():
+    cropped = crop_to_content(receipt_photo(glare=True), margin=0)
+    assert cropped.size == (241, 693)
+
+def test_preprocess_crops_before_scaling_to_the_target_width():
+    image = preprocess_image(receipt_photo(), target_dpi=100)
+    assert image.width == 315
+    assert image.height > 800
+    histogram = image.histogram()
+    assert sum(histogram[1:255]) == 0
+
+def test_tesseract_config():
+    assert tesseract_config(6, "") == "--psm 6 -c preserve_interword_spaces=1"
+    assert tesseract_config(4, "0123").endswith("-c tessedit_char_whitelist=0123")
@@ -0,0 +1,84 @@
+import asyncio
+import pytest
+from pymongo import UpdateOne
+from app.controllers.user import is_month_aligned
+from app.utils.rollups import expense_amount, rollup_id, rollup_operation
+
+@pytest.mark.parametrize("start, end, aligned", [
+    ("2024-01-01", "2024-03-31", True),
+    ("2024-02-01", "2024-02-29", True),
+    (None, "2024-04-30", True),
+    ("2024-05-01", None, True),
+    (None, None, True),
+    ("2024-01-02", "2024-03-31", False),
+    ("2024-01-01", "2024-03-30", False),
+    ("2023-02-01", "2023-02-28", True),
+])
+def test_is_month_aligned(start, end, aligned):
+    assert is_month_aligned(start, end) is aligned
+
+def test_expense_amount_tolerates_bad_totals():
+    assert expense_amount({"expenseTotal": "12.50"}) == 12.5
+    assert expense_amount({"expenseTotal": None}) == 0.0
+    assert expense_amount({"expenseTotal": "n/a"}) == 0.0
+    assert expense_amount({}) == 0.0
+
+def test_rollup_operation_removes_with_negative_sign():
+    operation = rollup_operation("a@b.c", {"expenseDate": "2024-10-05", "expense-type": "needs", "expenseTotal": 4}, sign=-1)
+    assert operation == UpdateOne(
+        {"_id": rollup_id("a@b.c", "2024-10", "needs")},
+        {
+            "$inc": {"total": -4.0, "count": -1},
+            "$setOnInsert": {"user": "a@b.c", "month": "2024-10", "expense-type": "needs"}
+        },
+        upsert=True
+    )
+
+def test_rebuild_rollups_goes_user_by_user(mongo, monkeypatch):
+    from app.utils import rollups
+
+    # mongomock can't run the $substrBytes grouping, so recompute in Python
+    async def compute_rollups(email):
+        expected = {}
+        async for expense in mongo.expenses.find({"user": email}):
+            month = expense["expenseDate"][:7]
+            row = expected.setdefault(rollup_id(email, month, expense["expense-type"]), {
+                "user": email, "month": month, "expense-type": expense["expense-type"], "total": 0.0, "count": 0
+            })
+            row["total"] += expense_amount(expense)
+            row["count"] += 1
+        return expected
+
+    monkeypatch.setattr(rollups, "compute_rollups", compute_rollups)
+    deletes = []
+    collection_type = type(mongo.expense_rollups)
+    delete_many = collection_type.delete_many
+
+    async def spy_delete_many(self, query, *args, **kwargs):
+        deletes.append(query)
+        return await delete_many(self, query, *args, **kwargs)
+
+    monkeypatch.setattr(collection_type, "delete_many", spy_delete_many)
+
+    async def run():
+        await mongo.expenses.insert_many([
+            {"user": "a@b.c", "expenseDate": "2024-10-05", "expense-type": "needs", "expenseTotal": 4},
+            {"user": "a@b.c", "expenseDate": "2024-10-20T12:00:00", "expense-type": "needs", "expenseTotal": "6"},
+            {"user": "d@e.f", "expenseDate": "2024-11-01", "expense-type": "wants", "expenseTotal": 2},
+        ])
+        await mongo.expense_rollups.insert_many([
+            {"_id": rollup_id("a@b.c", "2024-09", "needs"), "user": "a@b.c", "month": "2024-09", "expense-type": "needs", "total": 1, "count": 1},
+            {"_id": rollup_id("gone@b.c", "2024-09", "needs"), "user": "gone@b.c", "month": "2024-09", "expense-type": "needs", "total": 1, "count": 1},
+        ])
+        assert len(await rollups.verify_rollups()) == 4
+        result = await rollups.rebuild_rollups()
+        return result, await rollups.verify_rollups(), await mongo.expense_rollups.find({}, {"_id": 1, "total": 1}).to_list(None)
+
+    result, drift, stored = asyncio.run(run())
+    assert result == {"written": 2, "deleted": 2}
+    assert drift == []
+    assert sorted((row["_id"], row["total"]) for row in stored) == [
+        (rollup_id("a@b.c", "2024-10", "needs"), 10.0),
+        (rollup_id("d@e.f", "2024-11", "wants"), 2.0),
+    ]
+    assert sorted(query["user"] for query in deletes) == ["a@b.c", "d@e.f", "gone@b.c"]
@@ -0,0 +1,36 @@
+import asyncio
+from datetime import date
+from types import SimpleNamespace
+from app.controllers import user as user_controller
+from app.models.user import ExpenseCreate
+
+def simple_state_pipeline(email, month):
+    # mongomock can't run a $lookup with let, so join the rollups by user and filter the month after
+    return [
+        {"$match": {"email": email}},
+        {"$project": user_controller.STATE_PROJECTION},
+        {"$lookup": {"from": "expense_rollups", "localField": "email", "foreignField": "user", "as": "rollups"}},
+        {"$addFields": {"rollups": {"$filter": {"input": "$rollups", "cond": {"$eq": ["$$this.month", month]}}}}}
+    ]
+
+def test_state_etag_and_not_modified(mongo, monkeypatch):
+    monkeypatch.setattr(user_controller, "build_state_pipeline", simple_state_pipeline)
+    current_user = SimpleNamespace(email="state@b.c")
+
+    async def run():
+        await mongo.users.insert_one({"email": current_user.email, "first_name": "Ada", "coins": 0, "budget": 100})
+        first = await user_controller.get_state(current_user)
+        again = await user_controller.get_state(current_user)
+        not_modified = await user_controller.get_state(current_user, f'W/"nope", {first.headers["etag"]}')
+        await user_controller.create_expense(current_user, ExpenseCreate(**{
+            "expense-type": "needs", "expenseDate": date.today().isoformat(), "expenseTotal": 12.5, "expense-name": "Groceries"
+        }))
+        changed = await user_controller.get_state(current_user, first.headers["etag"])
+        return first, again, not_modified, changed
+
+    first, again, not_modified, changed = asyncio.run(run())
+    assert first.status_code == 200 and again.headers["etag"] == first.headers["etag"]
+    assert not_modified.status_code == 304 and not_modified.body == b""
+    assert not_modified.headers["etag"] == first.headers["etag"]
+    assert changed.status_code == 200 and changed.headers["etag"] != first.headers["etag"]
+    assert b'"total":12.5' in changed.body
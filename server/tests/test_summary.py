@@ -0,0 +1,51 @@
+import asyncio
+from app.controllers.user import build_date_range, format_summary
+
+def test_format_summary_totals_and_percentages():
+    categories = [
+        {"_id": "needs", "total": 30.0, "count": 2},
+        {"_id": "wants", "total": 10.0, "count": 1},
+    ]
+    summary = format_summary(categories, [], "2024-10-01", "2024-10-31", "month")
+    assert summary["total"] == 40.0
+    assert summary["count"] == 3
+    assert summary["categories"]["needs"] == {"total": 30.0, "count": 2, "percentage": 75.0}
+    assert summary["categories"]["savings"] == {"total": 0.0, "count": 0, "percentage": 0.0}
+    assert summary["series"] == []
+
+def test_format_summary_series_is_sorted_and_filled():
+    rows = [
+        {"_id": {"period": "2024-11", "type": "wants"}, "total": 5.0},
+        {"_id": {"period": "2024-10", "type": "needs"}, "total": 2.5},
+        {"_id": {"period": "2024-10", "type": "savings"}, "total": 1.0},
+    ]
+    summary = format_summary([], rows, None, None, "month")
+    assert summary["series_type"] == "month"
+    assert summary["series"] == [
+        {"period": "2024-10", "needs": 2.5, "wants": 0.0, "savings": 1.0, "total": 3.5},
+        {"period": "2024-11", "needs": 0.0, "wants": 5.0, "savings": 0.0, "total": 5.0},
+    ]
+
+def test_empty_summary_has_no_division_by_zero():
+    summary = format_summary([], [], None, None, "week")
+    assert summary["total"] == 0
+    assert all(bucket["percentage"] == 0.0 for bucket in summary["categories"].values())
+
+def test_date_range_includes_timestamps_on_the_end_day(mongo):
+    async def run():
+        await mongo.expenses.insert_many([
+            {"_id": "before", "expenseDate": "2024-09-30T23:59:00"},
+            {"_id": "first", "expenseDate": "2024-10-01"},
+            {"_id": "last-day", "expenseDate": "2024-10-31"},
+            {"_id": "last-evening", "expenseDate": "2024-10-31T18:00:00"},
+            {"_id": "after", "expenseDate": "2024-11-01"},
+        ])
+        query = {"expenseDate": build_date_range("2024-10-01", "2024-10-31")}
+        return sorted(expense["_id"] for expense in await mongo.expenses.find(query).to_list(None))
+
+    assert asyncio.run(run()) == ["first", "last-day", "last-evening"]
+
+def test_date_range_bounds():
+    assert build_date_range() is None
+    assert build_date_range(None, "2024-02-29") == {"$lt": "2024-03-01"}
+    assert build_date_range("2024-12-01", "2024-12-31") == {"$gte": "2024-12-01", "$lt": "2025-01-01"}
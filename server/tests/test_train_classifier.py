@@ -0,0 +1,20 @@
+import asyncio
+from app.controllers.user import fill_expense_type
+from app.scripts import train_classifier
+
+def test_fill_expense_type_records_the_source():
+    assert fill_expense_type({"expense-type": "wants", "expense-name": "Cinema"})["expense-type-source"] == "user"
+    filled = fill_expense_type({"expense-type": None, "expense-name": "Cinema"})
+    assert filled["expense-type"] in ("needs", "wants", "savings")
+    assert filled["expense-type-source"] == "auto"
+
+def test_training_skips_inferred_labels(mongo):
+    async def run():
+        await mongo.expenses.insert_many([
+            {"expense-name": "Rent", "expense-type": "needs", "expense-type-source": "user"},
+            {"expense-name": "Cinema", "expense-type": "needs", "expense-type-source": "auto"},
+            {"expense-name": "Groceries", "expense-type": "needs"},
+        ])
+        return await train_classifier.load_samples()
+
+    assert sorted(asyncio.run(run())) == [("Groceries", "needs"), ("Rent", "needs")]